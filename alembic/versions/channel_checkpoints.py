@@ -0,0 +1,28 @@
+"""channel checkpoints
+
+Revision ID: channel_checkpoints
+Revises: market_type_both
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'channel_checkpoints'
+down_revision = 'market_type_both'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Создаем таблицу контрольных точек чтения каналов
+    op.create_table(
+        'channel_checkpoints',
+        sa.Column('source_channel_id', sa.String(), nullable=False),
+        sa.Column('last_message_id', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('source_channel_id')
+    )
+
+def downgrade():
+    op.drop_table('channel_checkpoints')
@@ -0,0 +1,68 @@
+"""hot path indexes
+
+Revision ID: hot_path_indexes
+Revises: spilled_messages
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'hot_path_indexes'
+down_revision = 'spilled_messages'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Перед созданием уникального ограничения удаляем повторно сохраненные
+    # сообщения, оставляя самую раннюю запись
+    op.execute("""
+        UPDATE news AS n
+        SET duplicate_of_id = d.keep_id
+        FROM (
+            SELECT id, min(id) OVER (PARTITION BY source_channel_id, message_id) AS keep_id
+            FROM news
+        ) AS d
+        WHERE n.duplicate_of_id = d.id AND d.id <> d.keep_id
+    """)
+    op.execute("""
+        DELETE FROM news AS a
+        USING news AS b
+        WHERE a.id > b.id
+          AND a.source_channel_id = b.source_channel_id
+          AND a.message_id = b.message_id
+    """)
+
+    # Индексы строим без блокировки записи в таблицы
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'uq_news_source_message', 'news',
+            ['source_channel_id', 'message_id'],
+            unique=True, postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_news_timestamp', 'news', ['timestamp'],
+            postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_news_market_target_timestamp', 'news',
+            ['market_target', 'timestamp'],
+            postgresql_concurrently=True
+        )
+        op.create_index(
+            'ix_forecasts_market_type_generated_at', 'forecasts',
+            ['market_type', sa.text('generated_at DESC')],
+            postgresql_concurrently=True
+        )
+
+    op.execute(
+        "ALTER TABLE news ADD CONSTRAINT uq_news_source_message "
+        "UNIQUE USING INDEX uq_news_source_message"
+    )
+
+def downgrade():
+    op.drop_index('ix_forecasts_market_type_generated_at', table_name='forecasts')
+    op.drop_index('ix_news_market_target_timestamp', table_name='news')
+    op.drop_index('ix_news_timestamp', table_name='news')
+    op.drop_constraint('uq_news_source_message', 'news', type_='unique')
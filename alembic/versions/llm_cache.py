@@ -0,0 +1,30 @@
+"""llm cache
+
+Revision ID: llm_cache
+Revises: update_models
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'llm_cache'
+down_revision = 'update_models'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Создаем таблицу кэша ответов LLM
+    op.create_table(
+        'llm_cache',
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('value', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index('ix_llm_cache_created_at', 'llm_cache', ['created_at'])
+
+def downgrade():
+    op.drop_index('ix_llm_cache_created_at', table_name='llm_cache')
+    op.drop_table('llm_cache')
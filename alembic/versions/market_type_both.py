@@ -0,0 +1,24 @@
+"""market type both
+
+Revision ID: market_type_both
+Revises: hot_path_indexes
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'market_type_both'
+down_revision = 'hot_path_indexes'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Новости, относящиеся к обоим рынкам, сохраняются со значением 'BOTH'
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE market_type ADD VALUE IF NOT EXISTS 'BOTH'")
+
+def downgrade():
+    # PostgreSQL не поддерживает удаление значений из enum
+    pass
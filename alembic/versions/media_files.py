@@ -0,0 +1,44 @@
+"""media files
+
+Revision ID: media_files
+Revises: work_item_albums
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'media_files'
+down_revision = 'work_item_albums'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Создаем таблицу файлов хранилища медиа
+    op.create_table(
+        'media_files',
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('path', sa.String(), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('last_used_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('content_hash')
+    )
+    op.create_index('ix_media_files_last_used_at', 'media_files', ['last_used_at'])
+    
+    # Создаем таблицу идентификаторов файлов Telegram
+    op.create_table(
+        'media_aliases',
+        sa.Column('unique_id', sa.String(), nullable=False),
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.ForeignKeyConstraint(['content_hash'], ['media_files.content_hash'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('unique_id')
+    )
+    op.create_index('ix_media_aliases_content_hash', 'media_aliases', ['content_hash'])
+
+def downgrade():
+    op.drop_index('ix_media_aliases_content_hash', table_name='media_aliases')
+    op.drop_table('media_aliases')
+    op.drop_index('ix_media_files_last_used_at', table_name='media_files')
+    op.drop_table('media_files')
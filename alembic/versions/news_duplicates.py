@@ -0,0 +1,27 @@
+"""news duplicates
+
+Revision ID: news_duplicates
+Revises: llm_cache
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'news_duplicates'
+down_revision = 'llm_cache'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Ссылка почти-дубликата на исходную новость
+    op.add_column('news', sa.Column('duplicate_of_id', sa.Integer(), nullable=True))
+    op.create_foreign_key(
+        'fk_news_duplicate_of_id', 'news', 'news',
+        ['duplicate_of_id'], ['id']
+    )
+
+def downgrade():
+    op.drop_constraint('fk_news_duplicate_of_id', 'news', type_='foreignkey')
+    op.drop_column('news', 'duplicate_of_id')
@@ -0,0 +1,29 @@
+"""spilled messages
+
+Revision ID: spilled_messages
+Revises: news_duplicates
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'spilled_messages'
+down_revision = 'news_duplicates'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Создаем таблицу сообщений, отложенных при переполнении очереди
+    op.create_table(
+        'spilled_messages',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('source_channel_id', sa.String(), nullable=False),
+        sa.Column('message_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+def downgrade():
+    op.drop_table('spilled_messages')
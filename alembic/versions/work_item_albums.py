@@ -0,0 +1,22 @@
+"""work item albums
+
+Revision ID: work_item_albums
+Revises: worker_leases
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'work_item_albums'
+down_revision = 'worker_leases'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # ID сообщений альбома, публикуемого одной новостью
+    op.add_column('work_items', sa.Column('album_message_ids', sa.String(), nullable=True))
+
+def downgrade():
+    op.drop_column('work_items', 'album_message_ids')
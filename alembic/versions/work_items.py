@@ -0,0 +1,46 @@
+"""work items
+
+Revision ID: work_items
+Revises: channel_checkpoints
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'work_items'
+down_revision = 'channel_checkpoints'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Создаем таблицу устойчивой очереди обработки сообщений
+    op.create_table(
+        'work_items',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('source_channel_id', sa.String(), nullable=False),
+        sa.Column('message_id', sa.Integer(), nullable=False),
+        sa.Column('text', sa.String(), nullable=False),
+        sa.Column('media_type', sa.String(), nullable=True),
+        sa.Column('message_date', sa.DateTime(), nullable=False),
+        sa.Column('state', sa.String(), nullable=False),
+        sa.Column('analysis', sa.String(), nullable=True),
+        sa.Column('translated_text', sa.String(), nullable=True),
+        sa.Column('news_id', sa.Integer(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('last_error', sa.String(), nullable=True),
+        sa.Column('lease_owner', sa.String(), nullable=True),
+        sa.Column('lease_expires_at', sa.DateTime(), nullable=True),
+        sa.Column('available_at', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['news_id'], ['news.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('source_channel_id', 'message_id', name='uq_work_items_source_message')
+    )
+    op.create_index('ix_work_items_state_available_at', 'work_items', ['state', 'available_at'])
+
+def downgrade():
+    op.drop_index('ix_work_items_state_available_at', table_name='work_items')
+    op.drop_table('work_items')
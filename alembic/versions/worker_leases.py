@@ -0,0 +1,30 @@
+"""worker leases
+
+Revision ID: worker_leases
+Revises: work_items
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'worker_leases'
+down_revision = 'work_items'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Создаем таблицу отметок о работе процессов-обработчиков
+    op.create_table(
+        'worker_leases',
+        sa.Column('worker_id', sa.String(), nullable=False),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('worker_id')
+    )
+    op.create_index('ix_worker_leases_heartbeat_at', 'worker_leases', ['heartbeat_at'])
+
+def downgrade():
+    op.drop_index('ix_worker_leases_heartbeat_at', table_name='worker_leases')
+    op.drop_table('worker_leases')
@@ -0,0 +1,118 @@
+import argparse
+import json
+import random
+from typing import Any, Dict, List, Optional
+
+# Части синтетических новостей
+SUBJECTS = [
+    "Apple", "Tesla", "Nvidia", "Gazprom", "Sberbank", "Microsoft", "Coinbase", "BlackRock", "Aramco",
+    "Binance", "the Federal Reserve", "the European Central Bank", "the Bank of Japan", "OPEC+",
+    "the US Treasury", "the SEC", "Chinese regulators", "a large hedge fund", "retail investors", "miners"
+]
+ACTIONS = [
+    "raised its outlook for", "cut its forecast for", "announced new rules on", "started buying",
+    "reported record demand for", "warned about liquidity in", "opened an investigation into",
+    "sold a large stake in", "signed a supply deal covering", "delayed a decision on",
+    "doubled its exposure to", "published weak data on", "approved a fund tracking", "suspended trading in"
+]
+OBJECTS = [
+    "Bitcoin", "Ethereum", "Brent crude", "gold", "the euro", "the yuan", "Solana", "US Treasuries",
+    "natural gas", "copper", "semiconductor stocks", "emerging market bonds", "stablecoins",
+    "regional banks", "lithium", "wheat futures", "the Japanese yen", "tech shares"
+]
+DETAILS = [
+    "citing {n} consecutive months of slowing growth",
+    "after prices moved {p}% within an hour",
+    "with volumes {n} times above the monthly average",
+    "ahead of the meeting scheduled for next {day}",
+    "according to a filing published on {day}",
+    "while analysts expect a {p}% correction",
+    "as spreads widened to {n} basis points",
+    "despite {n} billion dollars of outflows last week",
+    "following talks with {n} major trading partners",
+    "sending futures {p}% higher in overnight trading"
+]
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+
+def synthetic_story(rng: random.Random) -> str:
+    """Синтетическая новость из нескольких случайно составленных предложений"""
+    sentences = []
+    for _ in range(rng.randint(3, 5)):
+        detail = rng.choice(DETAILS).format(n=rng.randint(2, 90), p=f"{rng.uniform(0.2, 15):.1f}", day=rng.choice(DAYS))
+        sentence = f"{rng.choice(SUBJECTS)} {rng.choice(ACTIONS)} {rng.choice(OBJECTS)} {detail}."
+        sentences.append(sentence[0].upper() + sentence[1:])
+    return " ".join(sentences)
+
+def synthetic_corpus(
+    count: int,
+    channels: int = 4,
+    rate: float = 0.0,
+    duplicate_share: float = 0.1,
+    seed: Optional[int] = 1
+) -> List[Dict[str, Any]]:
+    """
+    Синтетический поток новостей
+
+    Args:
+        count: количество сообщений
+        channels: количество каналов-источников
+        rate: сообщений в секунду; 0 — все сообщения одним всплеском
+        duplicate_share: доля перепостов уже вышедших новостей в других каналах
+        seed: начальное значение генератора случайных чисел
+
+    Returns:
+        Сообщения с полями channel (номер канала), offset (секунды от начала) и text
+    """
+    rng = random.Random(seed)
+    stories: List[str] = []
+    corpus = []
+    offset = 0.0
+    for _ in range(count):
+        if stories and rng.random() < duplicate_share:
+            text = rng.choice(stories)
+        else:
+            text = synthetic_story(rng)
+            stories.append(text)
+        corpus.append({"channel": rng.randrange(channels), "offset": round(offset, 3), "text": text})
+        if rate > 0:
+            offset += rng.expovariate(rate)
+    return corpus
+
+def load_corpus(path: str) -> List[Dict[str, Any]]:
+    """
+    Читает записанный поток новостей из JSONL
+
+    Каждая строка — объект с полями text, channel (номер или ID канала)
+    и offset (секунды от начала записи); channel и offset необязательны.
+    """
+    corpus = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            corpus.append({
+                "channel": item.get("channel", 0),
+                "offset": float(item.get("offset", 0.0)),
+                "text": item["text"]
+            })
+    corpus.sort(key=lambda item: item["offset"])
+    return corpus
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Генерация синтетического потока новостей в JSONL")
+    parser.add_argument("output")
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--channels", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=0.0, help="сообщений в секунду, 0 — один всплеск")
+    parser.add_argument("--duplicates", type=float, default=0.1, help="доля перепостов (0..1)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    corpus = synthetic_corpus(args.messages, args.channels, args.rate, args.duplicates, args.seed)
+    with open(args.output, "w", encoding="utf-8") as file:
+        for item in corpus:
+            file.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import asyncio
+import itertools
+import re
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, Optional, Tuple
+
+# Метка сообщения корпуса, по которой публикация сопоставляется с исходным сообщением
+_MARKER_PATTERN = re.compile(r"\[bench:(\d+)\]")
+
+def mark(number: int, text: str) -> str:
+    return f"[bench:{number}] {text}"
+
+class Publications:
+    """Время первой публикации каждого сообщения корпуса"""
+
+    def __init__(self):
+        self.published: Dict[int, float] = {}
+        self.sent = 0
+
+    def record(self, text: Optional[str]):
+        self.sent += 1
+        match = _MARKER_PATTERN.search(text or "")
+        if match:
+            self.published.setdefault(int(match.group(1)), time.perf_counter())
+
+class FakeTelethonMessage:
+    """Сообщение канала с полями telethon.tl.custom.Message, которые использует парсер"""
+
+    def __init__(self, message_id: int, chat_id: int, text: str, date: Optional[datetime] = None):
+        self.id = message_id
+        self.chat_id = chat_id
+        self.text = text
+        self.caption = None
+        self.media = None
+        self.grouped_id = None
+        self.date = date or datetime.now(timezone.utc)
+
+class FakeTelegramClient:
+    """
+    Клиент Telethon без сети: отправки записываются в Publications
+
+    Доставленные сообщения каналов запоминаются, и get_messages возвращает
+    их, как Telegram, — это нужно для политики переполнения spill.
+    """
+
+    def __init__(self, publications: Publications, send_latency: float = 0.02):
+        self.publications = publications
+        self.send_latency = send_latency
+        self._ids = itertools.count(1)
+        self._messages: Dict[Tuple[int, int], FakeTelethonMessage] = {}
+
+    def deliver(self, message: FakeTelethonMessage) -> FakeTelethonMessage:
+        """Запоминает сообщение канала, доставленное парсеру"""
+        self._messages[(message.chat_id, message.id)] = message
+        return message
+
+    async def _sent(self, text: Optional[str]) -> Any:
+        await asyncio.sleep(self.send_latency)
+        self.publications.record(text)
+        return SimpleNamespace(id=next(self._ids))
+
+    async def send_message(self, entity, message: str, **kwargs) -> Any:
+        return await self._sent(message)
+
+    async def send_file(self, entity, file, caption: str = "", **kwargs) -> Any:
+        return await self._sent(caption)
+
+    async def edit_message(self, entity, message, text: str, **kwargs) -> Any:
+        await asyncio.sleep(self.send_latency)
+        return message
+
+    async def get_messages(self, entity, ids=None, **kwargs):
+        if isinstance(ids, list):
+            return [self._messages.get((int(entity), message_id)) for message_id in ids]
+        return self._messages.get((int(entity), ids))
+
+class FakeBot:
+    """Бот aiogram без сети: отправки записываются в Publications"""
+
+    def __init__(self, publications: Publications, send_latency: float = 0.02):
+        self.publications = publications
+        self.send_latency = send_latency
+        self._ids = itertools.count(1)
+
+    async def _sent(self, text: Optional[str]) -> Any:
+        await asyncio.sleep(self.send_latency)
+        self.publications.record(text)
+        return SimpleNamespace(message_id=next(self._ids))
+
+    async def send_message(self, chat_id, text: str, **kwargs) -> Any:
+        return await self._sent(text)
+
+    async def send_photo(self, chat_id, photo, caption: Optional[str] = None, **kwargs) -> Any:
+        return await self._sent(caption)
+
+    async def send_media_group(self, chat_id, media, **kwargs) -> Any:
+        return [await self._sent(getattr(media[0], "caption", None))]
+
+    async def edit_message_text(self, text: str, chat_id=None, message_id=None, **kwargs) -> Any:
+        await asyncio.sleep(self.send_latency)
+        return True
+
+class FakeAiogramMessage:
+    """Сообщение канала с полями aiogram.types.Message, которые используют обработчики"""
+
+    def __init__(self, message_id: int, chat_id: int, text: str, bot: FakeBot):
+        self.message_id = message_id
+        self.chat = SimpleNamespace(id=chat_id, type="channel")
+        self.text = text
+        self.caption = None
+        self.photo = None
+        self.media_group_id = None
+        self.date = datetime.now(timezone.utc)
+        self.bot = bot
+
+    async def answer(self, text: str, **kwargs) -> Any:
+        return await self.bot.send_message(self.chat.id, text)
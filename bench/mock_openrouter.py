@@ -0,0 +1,209 @@
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+from aiohttp import web
+
+# Темы, из которых выбирается ответ анализа
+TOPICS = ["экономика", "финансы", "акции", "геополитика", "криптовалюты", "DeFi", "блокчейн"]
+MARKET_TARGETS = ["TradFi", "Crypto", "Both"]
+
+# Стоимость токена в ответе usage, USD
+TOKEN_COST = 0.000002
+
+# Текст новости в промптах bot.openrouter_client
+_TEXT_PATTERN = re.compile(r"Текст(?: новости)?:\s*\n(.*?)(?:\n\s*\n\s*Ответ|\Z)", re.S)
+_BATCH_PATTERN = re.compile(r"### Новость (\d+)\n(.*?)(?=\n\n\s*### Новость|\n\n\s*Ответ)", re.S)
+
+def news_text(prompt: str) -> str:
+    """Текст новости из промпта"""
+    match = _TEXT_PATTERN.search(prompt)
+    return match.group(1).strip() if match else prompt.strip()
+
+def fake_analysis(text: str) -> Dict[str, Any]:
+    """Детерминированный результат анализа: одна и та же новость — один ответ"""
+    digest = zlib.crc32(text.encode("utf-8"))
+    importance = digest % 5 + 1
+    return {
+        "topic": TOPICS[digest % len(TOPICS)],
+        "confidence": round(0.6 + (digest % 40) / 100, 2),
+        "importance": importance,
+        "is_catalyst": importance == 5,
+        "market_target": MARKET_TARGETS[digest % len(MARKET_TARGETS)]
+    }
+
+def fake_translation(text: str) -> str:
+    return f"Перевод: {text}"
+
+def completion_content(prompt: str) -> str:
+    """Ответ модели на промпт в формате, который ожидает bot.openrouter_client"""
+    if "### Новость" in prompt:
+        return json.dumps([
+            {"index": int(index), **fake_analysis(text.strip())}
+            for index, text in _BATCH_PATTERN.findall(prompt)
+        ], ensure_ascii=False)
+    text = news_text(prompt)
+    if '"translation"' in prompt:
+        return json.dumps({**fake_analysis(text), "translation": fake_translation(text)}, ensure_ascii=False)
+    if "Переведи" in prompt:
+        return fake_translation(text)
+    if '"market_target"' in prompt:
+        return json.dumps(fake_analysis(text), ensure_ascii=False)
+    if "Тема:" in prompt:
+        analysis = fake_analysis(text)
+        return f"Тема: {analysis['topic']}\nУверенность: {analysis['confidence']}"
+    return "Рынок остается в боковом диапазоне, ключевых катализаторов нет."
+
+class MockOpenRouter:
+    """
+    Заглушка OpenRouter /chat/completions для нагрузочных тестов
+
+    Отвечает с задержкой latency ± jitter секунд, с вероятностью
+    rate_limit_share отвечает 429 с заголовком Retry-After. Ответы
+    строятся по промптам bot.openrouter_client и проходят его проверки,
+    в usage возвращаются токены и стоимость. Поддерживает потоковые
+    ответы (stream: true).
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.8,
+        jitter: float = 0.3,
+        rate_limit_share: float = 0.0,
+        retry_after: float = 1.0,
+        stream_chunk_chars: int = 40,
+        seed: Optional[int] = None
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_share = rate_limit_share
+        self.retry_after = retry_after
+        self.stream_chunk_chars = stream_chunk_chars
+        self._random = random.Random(seed)
+        self._runner: Optional[web.AppRunner] = None
+
+        # Статистика запросов
+        self.requests = 0
+        self.completed = 0
+        self.rate_limited = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        return {
+            "requests": self.requests,
+            "completed": self.completed,
+            "rate_limited": self.rate_limited,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "max_in_flight": self.max_in_flight
+        }
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def _usage(self, prompt: str, content: str) -> Dict[str, Any]:
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "cost": (prompt_tokens + completion_tokens) * TOKEN_COST
+        }
+
+    async def handle_completion(self, request: web.Request) -> web.StreamResponse:
+        data = await request.json()
+        self.requests += 1
+        if self._random.random() < self.rate_limit_share:
+            self.rate_limited += 1
+            return web.json_response(
+                {"error": {"code": 429, "message": "Rate limit exceeded"}},
+                status=429,
+                headers={"Retry-After": str(self.retry_after)}
+            )
+
+        prompt = "\n".join(message["content"] for message in data["messages"])
+        content = completion_content(prompt)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if data.get("stream"):
+                return await self._stream(request, data, prompt, content)
+            await asyncio.sleep(self._delay())
+        finally:
+            self.in_flight -= 1
+        self.completed += 1
+        return web.json_response({
+            "id": f"gen-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": data.get("model", ""),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": self._usage(prompt, content)
+        })
+
+    async def _stream(self, request: web.Request, data: Dict, prompt: str, content: str) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await response.write(b": OPENROUTER PROCESSING\n\n")
+        chunks = [
+            content[index:index + self.stream_chunk_chars]
+            for index in range(0, len(content), self.stream_chunk_chars)
+        ]
+        # Задержка ответа распределяется по фрагментам
+        pause = self._delay() / max(1, len(chunks))
+        for chunk in chunks:
+            await asyncio.sleep(pause)
+            payload = {"model": data.get("model", ""), "choices": [{"index": 0, "delta": {"content": chunk}}]}
+            await response.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+        payload = {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": self._usage(prompt, content)}
+        await response.write(f"data: {json.dumps(payload)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        await response.write_eof()
+        self.completed += 1
+        return response
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/api/v1/chat/completions", self.handle_completion)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 18080):
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Заглушка OpenRouter для нагрузочных тестов")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--latency", type=float, default=0.8, help="средняя задержка ответа, секунды")
+    parser.add_argument("--jitter", type=float, default=0.3, help="разброс задержки, секунды")
+    parser.add_argument("--rate-limit-share", type=float, default=0.0, help="доля ответов 429 (0..1)")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After в ответах 429, секунды")
+    args = parser.parse_args(argv)
+
+    mock = MockOpenRouter(args.latency, args.jitter, args.rate_limit_share, args.retry_after)
+    print(f"OpenRouter: http://{args.host}:{args.port}/api/v1")
+    web.run_app(mock.app(), host=args.host, port=args.port, access_log=None, print=None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+Нагрузочный тест конвейера обработки новостей
+
+Поток сообщений (синтетический или записанный) подается в парсер
+(NewsParser: очередь обработки и process_message) или в обработчики
+bot/handlers.py. OpenRouter заменяется локальной заглушкой, Telegram —
+клиентом без сети. Результат: пропускная способность, задержка от
+поступления сообщения до публикации (p50/p99) и запросы к API на новость.
+
+Пример:
+    python -m bench.run --messages 500 --rate 20 --latency 0.8 --rate-limit-share 0.05
+
+Настройки бота задаются переменными окружения, как при обычном запуске.
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+from .corpus import synthetic_corpus, load_corpus
+from .fake_telegram import (
+    Publications,
+    FakeTelethonMessage,
+    FakeTelegramClient,
+    FakeBot,
+    FakeAiogramMessage,
+    mark
+)
+from .mock_openrouter import MockOpenRouter
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# ID каналов-источников корпуса
+CHANNEL_ID_BASE = -1009000000000
+
+# Итоговые результаты обработки сообщения в метрике news_items_total
+FINAL_RESULTS = ("published", "duplicate", "skipped", "failed", "dropped")
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест обработки новостей")
+    parser.add_argument("--target", choices=["parser", "handlers"], default="parser",
+                        help="parser — NewsParser, handlers — обработчики bot/handlers.py")
+    parser.add_argument("--corpus", help="записанный поток новостей в JSONL (по умолчанию синтетический)")
+    parser.add_argument("--messages", type=int, default=200, help="количество синтетических сообщений")
+    parser.add_argument("--channels", type=int, default=4, help="количество каналов-источников")
+    parser.add_argument("--rate", type=float, default=0.0, help="сообщений в секунду, 0 — один всплеск")
+    parser.add_argument("--duplicates", type=float, default=0.1, help="доля перепостов (0..1)")
+    parser.add_argument("--speed", type=float, default=1.0, help="ускорение воспроизведения записанного потока")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.8, help="средняя задержка ответа OpenRouter, секунды")
+    parser.add_argument("--jitter", type=float, default=0.3, help="разброс задержки OpenRouter, секунды")
+    parser.add_argument("--rate-limit-share", type=float, default=0.0, help="доля ответов 429 (0..1)")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After в ответах 429, секунды")
+    parser.add_argument("--send-latency", type=float, default=0.02, help="задержка отправки в Telegram, секунды")
+    parser.add_argument("--port", type=int, default=18080, help="порт заглушки OpenRouter")
+    parser.add_argument("--database-url", help="база данных (по умолчанию новая SQLite во временном каталоге)")
+    parser.add_argument("--timeout", type=float, default=600.0, help="максимальное время прогона, секунды")
+    parser.add_argument("--json", dest="json_path", help="сохранить результаты в JSON")
+    parser.add_argument("--verbose", action="store_true", help="выводить журнал бота")
+    return parser.parse_args(argv)
+
+def configure_environment(args: argparse.Namespace, workdir: str):
+    """Настройки бота для прогона; задаются до импорта bot"""
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["OPENROUTER_API_URL"] = f"http://127.0.0.1:{args.port}/api/v1"
+    os.environ["SOURCE_CHANNEL_IDS"] = ",".join(str(CHANNEL_ID_BASE - index) for index in range(args.channels))
+    os.environ["METRICS_PORT"] = "0"
+    os.environ["MEDIA_DIR"] = os.path.join(workdir, "media")
+    for name, value in {
+        "TELEGRAM_BOT_TOKEN": "bench",
+        "TELEGRAM_API_ID": "1",
+        "TELEGRAM_API_HASH": "bench",
+        "OPENROUTER_API_KEY": "bench",
+        "TARGET_CHANNEL_ID": "-1009999999999",
+        # Повторные прогоны не должны отвечать из кэша прошлых прогонов
+        "LLM_CACHE_PERSISTENT": "false",
+        # Лимиты Telegram на публикацию измеряются отдельно, по умолчанию не ограничивают прогон
+        "PUBLISH_CHAT_MESSAGES_PER_MINUTE": "600000",
+        "PUBLISH_CHAT_BURST": "1000",
+        "PUBLISH_GLOBAL_RATE": "10000"
+    }.items():
+        os.environ.setdefault(name, value)
+
+def configure_logging(verbose: bool):
+    """Журнал бота выводится в stderr; без verbose — только ошибки и предупреждения"""
+    import structlog
+    logging.basicConfig(
+        level=logging.INFO if verbose else logging.WARNING,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        stream=sys.stderr
+    )
+    # Итоги трасс (в том числе медленных) выводятся только с verbose
+    structlog.configure(
+        wrapper_class=structlog.make_filtering_bound_logger(logging.DEBUG if verbose else logging.ERROR),
+        logger_factory=structlog.PrintLoggerFactory(sys.stderr)
+    )
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """Процентиль q (0..1) методом ближайшего ранга"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered) + 0.5)) - 1))]
+
+async def replay(corpus: List[Dict[str, Any]], speed: float, deliver) -> Dict[int, float]:
+    """
+    Передает сообщения корпуса в deliver по расписанию offset
+
+    Returns:
+        Время поступления каждого сообщения по его номеру
+    """
+    arrivals = {}
+    started = time.perf_counter()
+    for number, item in enumerate(corpus):
+        delay = started + item["offset"] / speed - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        arrivals[number] = time.perf_counter()
+        await deliver(number, item)
+    return arrivals
+
+def channel_id(item: Dict[str, Any], channels: int) -> int:
+    channel = item["channel"]
+    if isinstance(channel, int) and 0 <= channel < channels:
+        return CHANNEL_ID_BASE - channel
+    return CHANNEL_ID_BASE - zlib.crc32(str(channel).encode("utf-8")) % channels
+
+async def run_parser(corpus: List[Dict[str, Any]], args: argparse.Namespace, publications: Publications) -> Dict[int, float]:
+    """Прогон через NewsParser: очередь обработки, process_message и очередь публикаций"""
+    from bot.config import settings
+    from bot.metrics import NEWS_ITEMS
+    from bot.parser import parser
+
+    client = FakeTelegramClient(publications, args.send_latency)
+    parser.client = client
+    parser.owned = set(settings.source_channels)
+    parser.last_check = datetime.now(timezone.utc) - timedelta(minutes=1)
+    if settings.WORK_QUEUE_ENABLED:
+        await parser.work_runner.start()
+    else:
+        await parser.ingest.start()
+
+    # ID сообщений уникальны между прогонами на одной базе
+    base_id = int(time.time()) % 1000000 * 1000
+
+    async def deliver(number: int, item: Dict[str, Any]):
+        await parser.enqueue(client.deliver(FakeTelethonMessage(
+            base_id + number,
+            channel_id(item, args.channels),
+            mark(number, item["text"])
+        )))
+
+    arrivals = await replay(corpus, args.speed, deliver)
+    await parser.albums.flush()
+    while sum(NEWS_ITEMS.value(result=result) for result in FINAL_RESULTS) < len(corpus):
+        await asyncio.sleep(0.05)
+    return arrivals
+
+def load_legacy_handlers():
+    """Модуль bot/handlers.py (одноименный пакет bot/handlers перекрывает его при импорте)"""
+    spec = importlib.util.spec_from_file_location("bot.legacy_handlers", os.path.join(REPO_ROOT, "bot", "handlers.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+async def run_handlers(corpus: List[Dict[str, Any]], args: argparse.Namespace, publications: Publications) -> Dict[int, float]:
+    """Прогон через обработчик handle_message из bot/handlers.py, каждое сообщение — отдельная задача"""
+    handlers = load_legacy_handlers()
+    bot = FakeBot(publications, args.send_latency)
+    tasks = []
+    base_id = int(time.time()) % 1000000 * 1000
+
+    async def deliver(number: int, item: Dict[str, Any]):
+        message = FakeAiogramMessage(base_id + number, channel_id(item, args.channels), mark(number, item["text"]), bot)
+        tasks.append(asyncio.create_task(handlers.trace_message(
+            lambda event, data: handlers.handle_message(event),
+            message,
+            {}
+        )))
+
+    arrivals = await replay(corpus, args.speed, deliver)
+    await asyncio.gather(*tasks)
+    return arrivals
+
+def summarize(
+    target: str,
+    corpus: List[Dict[str, Any]],
+    arrivals: Dict[int, float],
+    publications: Publications,
+    elapsed: float,
+    mock: MockOpenRouter
+) -> Dict[str, Any]:
+    from bot.metrics import STAGE_SECONDS
+
+    latencies = [
+        publications.published[number] - arrival
+        for number, arrival in arrivals.items()
+        if number in publications.published
+    ]
+    stages = {}
+    for labels in STAGE_SECONDS.label_values():
+        stages[labels["stage"]] = {
+            "p50": STAGE_SECONDS.quantile(0.5, **labels),
+            "p99": STAGE_SECONDS.quantile(0.99, **labels)
+        }
+    return {
+        "target": target,
+        "messages": len(corpus),
+        "published": len(publications.published),
+        "sent": publications.sent,
+        "elapsed": elapsed,
+        "throughput": len(publications.published) / elapsed if elapsed else 0.0,
+        "latency_p50": percentile(latencies, 0.5),
+        "latency_p99": percentile(latencies, 0.99),
+        "latency_max": max(latencies) if latencies else None,
+        "api_calls": mock.requests,
+        "api_calls_per_item": mock.requests / len(corpus) if corpus else 0.0,
+        "rate_limited": mock.rate_limited,
+        "max_in_flight": mock.max_in_flight,
+        "tokens": mock.prompt_tokens + mock.completion_tokens,
+        "stages": stages
+    }
+
+def print_report(result: Dict[str, Any]):
+    def seconds(value: Optional[float]) -> str:
+        return "-" if value is None else f"{value:.3f} с"
+
+    print(f"Конвейер:                 {result['target']}")
+    print(f"Сообщений:                {result['messages']}")
+    print(f"Опубликовано:             {result['published']} (отправок в Telegram: {result['sent']})")
+    print(f"Время прогона:            {result['elapsed']:.2f} с")
+    print(f"Пропускная способность:   {result['throughput']:.2f} новостей/с")
+    print(f"Задержка до публикации:   p50 {seconds(result['latency_p50'])}, "
+          f"p99 {seconds(result['latency_p99'])}, макс. {seconds(result['latency_max'])}")
+    print(f"Запросов к API:           {result['api_calls']} ({result['api_calls_per_item']:.2f} на новость, "
+          f"429: {result['rate_limited']}, одновременно до {result['max_in_flight']})")
+    print(f"Токенов:                  {result['tokens']}")
+    if result["stages"]:
+        print("Этапы (p50 / p99):")
+        for stage, values in sorted(result["stages"].items()):
+            print(f"  {stage:<22}  {seconds(values['p50'])} / {seconds(values['p99'])}")
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from bot.database import init_db, news_writer
+    from bot.dedup import dedup_index
+    from bot.openrouter_client import init_session, close_session
+    from bot.publisher import publisher
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus(
+        args.messages, args.channels, args.rate, args.duplicates, args.seed
+    )
+    mock = MockOpenRouter(args.latency, args.jitter, args.rate_limit_share, args.retry_after, seed=args.seed)
+    await mock.start(port=args.port)
+    publications = Publications()
+    try:
+        await init_db()
+        await dedup_index.load_from_db()
+        await init_session()
+        await publisher.start()
+
+        started = time.perf_counter()
+        runner = run_parser if args.target == "parser" else run_handlers
+        arrivals = await asyncio.wait_for(runner(corpus, args, publications), args.timeout)
+        await publisher.join(args.timeout)
+        elapsed = time.perf_counter() - started
+        return summarize(args.target, corpus, arrivals, publications, elapsed, mock)
+    finally:
+        await news_writer.flush()
+        await publisher.stop()
+        await close_session()
+        await mock.stop()
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    for name in ("corpus", "json_path"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+    workdir = tempfile.mkdtemp(prefix="newsbot-bench-")
+    configure_environment(args, workdir)
+    configure_logging(args.verbose)
+    sys.path.insert(0, REPO_ROOT)
+    # Файлы сессии Telethon и медиа создаются во временном каталоге
+    os.chdir(workdir)
+    try:
+        result = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(result)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from .formatting import TELEGRAM_ALBUM_LIMIT
+
+logger = logging.getLogger(__name__)
+
+def album_key(message) -> Optional[Tuple[str, str]]:
+    """Ключ альбома сообщения (Telethon grouped_id или aiogram media_group_id) или None"""
+    group_id = getattr(message, "grouped_id", None) or getattr(message, "media_group_id", None)
+    if not group_id:
+        return None
+    chat_id = getattr(message, "chat_id", None)
+    if chat_id is None:
+        chat_id = message.chat.id
+    return str(chat_id), str(group_id)
+
+def album_text(message) -> str:
+    """Текст или подпись части альбома"""
+    return getattr(message, "text", None) or getattr(message, "caption", None) or ""
+
+def album_primary(messages: List[Any]):
+    """Часть альбома с подписью (Telegram хранит подпись только у одной части)"""
+    for message in messages:
+        if album_text(message):
+            return message
+    return messages[0]
+
+class AlbumAggregator:
+    """
+    Сборка частей альбома в одну новость
+
+    Telegram доставляет альбом отдельными сообщениями с общим grouped_id
+    (media_group_id в Bot API), подпись есть только у одной части.
+    Части накапливаются, пока в течение wait секунд не придет следующая
+    часть (или пока альбом не наберет max_size частей), после чего
+    handler получает весь альбом одним списком в порядке ID сообщений.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[Any]], Awaitable[None]],
+        wait: float,
+        max_size: int = TELEGRAM_ALBUM_LIMIT
+    ):
+        self.handler = handler
+        self.wait = wait
+        self.max_size = max_size
+        self._albums: Dict[Tuple[str, str], List[Any]] = {}
+        self._timers: Dict[Tuple[str, str], asyncio.TimerHandle] = {}
+        self._tasks = set()
+        self.albums = 0
+        self.parts = 0
+
+    @property
+    def pending(self) -> int:
+        """Количество собираемых альбомов"""
+        return len(self._albums)
+
+    def add(self, message) -> bool:
+        """
+        Добавляет часть альбома
+
+        Returns:
+            False, если сообщение не входит в альбом и обрабатывается как обычно
+        """
+        key = album_key(message)
+        if key is None:
+            return False
+
+        parts = self._albums.setdefault(key, [])
+        if any(part.id == message.id for part in parts):
+            return True
+        parts.append(message)
+        self.parts += 1
+
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        if len(parts) >= self.max_size:
+            self._flush(key)
+        else:
+            self._timers[key] = asyncio.get_running_loop().call_later(self.wait, self._flush, key)
+        return True
+
+    def _flush(self, key: Tuple[str, str]):
+        self._timers.pop(key, None)
+        parts = self._albums.pop(key, None)
+        if not parts:
+            return
+        parts.sort(key=lambda part: part.id)
+        self.albums += 1
+        task = asyncio.create_task(self._handle(parts))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _handle(self, parts: List[Any]):
+        try:
+            await self.handler(parts)
+        except Exception as e:
+            logger.error(f"Ошибка при обработке альбома из {len(parts)} частей: {e}")
+
+    async def flush(self):
+        """Передает в обработку все собираемые альбомы и ожидает их обработки"""
+        for key in list(self._albums):
+            timer = self._timers.get(key)
+            if timer is not None:
+                timer.cancel()
+            self._flush(key)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
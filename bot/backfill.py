@@ -0,0 +1,296 @@
+import asyncio
+import logging
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Union
+from sqlalchemy import select
+from .database import async_session, upsert_insert
+from .models import ChannelCheckpoint
+
+logger = logging.getLogger(__name__)
+
+class ChannelCheckpoints:
+    """
+    Контрольные точки чтения каналов-источников
+
+    Для каждого канала хранится ID сообщения, до которого включительно все
+    сообщения обработаны. Сообщения одного канала могут завершаться не по
+    порядку (живые сообщения обгоняют догружаемую историю, отложенные
+    сообщения возвращаются в очередь позже), поэтому контрольная точка
+    не продвигается дальше самого раннего еще не обработанного сообщения
+    и дальше позиции, до которой догрузка истории уже поставила сообщения
+    в очередь. Позиции сохраняются в базу раз в interval секунд.
+
+    При работе нескольких процессов канал, переданный другому обработчику,
+    освобождается через release: его позиция больше не сохраняется,
+    а сохранение в базе только увеличивает контрольную точку.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._done: Dict[str, int] = {}
+        self._pending: Dict[str, Counter] = defaultdict(Counter)
+        self._cursors: Dict[str, int] = {}
+        self._saved: Dict[str, int] = {}
+        self._released: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    async def load(self, channels: Optional[List[str]] = None):
+        """Загружает сохраненные контрольные точки всех или указанных каналов"""
+        query = select(ChannelCheckpoint.source_channel_id, ChannelCheckpoint.last_message_id)
+        if channels is not None:
+            query = query.where(ChannelCheckpoint.source_channel_id.in_(channels))
+        async with async_session() as session:
+            rows = (await session.execute(query)).all()
+        for channel, message_id in rows:
+            self._saved[channel] = max(self._saved.get(channel, 0), message_id)
+            self._done[channel] = max(self._done.get(channel, 0), message_id)
+        logger.info(f"Загружены контрольные точки {len(rows)} каналов")
+
+    async def acquire(self, channels: List[str]):
+        """Принимает каналы от другого обработчика и загружает их позиции"""
+        self._released.difference_update(channels)
+        await self.load(channels)
+
+    async def release(self, channels: List[str]):
+        """Сохраняет позиции каналов и прекращает их учет"""
+        await self.save()
+        for channel in channels:
+            self._released.add(channel)
+            self._done.pop(channel, None)
+            self._pending.pop(channel, None)
+            self._cursors.pop(channel, None)
+
+    def saved(self, channel: str) -> Optional[int]:
+        """Сохраненная контрольная точка канала"""
+        return self._saved.get(channel)
+
+    def track(self, channel: str, message_id: int):
+        """Отмечает сообщение как поставленное в обработку"""
+        if channel in self._released:
+            return
+        self._pending[channel][message_id] += 1
+
+    def done(self, channel: str, message_id: int):
+        """Отмечает сообщение как обработанное"""
+        if channel in self._released:
+            return
+        pending = self._pending.get(channel)
+        if pending is not None and message_id in pending:
+            pending[message_id] -= 1
+            if pending[message_id] <= 0:
+                del pending[message_id]
+        self._done[channel] = max(self._done.get(channel, 0), message_id)
+
+    def set_cursor(self, channel: str, message_id: int):
+        """Позиция, до которой догрузка истории поставила сообщения в очередь"""
+        self._cursors[channel] = message_id
+
+    def clear_cursor(self, channel: str):
+        self._cursors.pop(channel, None)
+
+    def position(self, channel: str) -> Optional[int]:
+        """ID сообщения, до которого включительно обработаны все сообщения канала"""
+        position = self._done.get(channel)
+        if position is None:
+            return None
+        pending = self._pending.get(channel)
+        if pending:
+            position = min(position, min(pending) - 1)
+        cursor = self._cursors.get(channel)
+        if cursor is not None:
+            position = min(position, cursor)
+        return position
+
+    async def save(self):
+        """Сохраняет продвинувшиеся контрольные точки"""
+        rows = []
+        for channel in self._done:
+            position = self.position(channel)
+            if position is not None and position > self._saved.get(channel, 0):
+                rows.append({
+                    "source_channel_id": channel,
+                    "last_message_id": position,
+                    "updated_at": datetime.utcnow()
+                })
+        if not rows:
+            return
+
+        stmt = upsert_insert(ChannelCheckpoint).values(rows)
+        # Контрольная точка не откатывается назад, даже если канал
+        # успел обработать другой процесс
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["source_channel_id"],
+            set_={
+                "last_message_id": stmt.excluded.last_message_id,
+                "updated_at": stmt.excluded.updated_at
+            },
+            where=ChannelCheckpoint.last_message_id < stmt.excluded.last_message_id
+        )
+        async with async_session() as session:
+            await session.execute(stmt)
+            await session.commit()
+        for row in rows:
+            self._saved[row["source_channel_id"]] = row["last_message_id"]
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.save()
+            except Exception as e:
+                logger.error(f"Ошибка при сохранении контрольных точек: {e}")
+
+    def start(self):
+        """Запускает периодическое сохранение контрольных точек"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Останавливает сохранение и записывает последние позиции"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.save()
+
+class BackfillEngine:
+    """
+    Догрузка истории каналов после перезапуска или простоя
+
+    Каналы читаются параллельно (не более concurrency одновременно)
+    постранично начиная с сохраненной контрольной точки (min_id), но не
+    глубже max_hours часов. Канал без контрольной точки читается
+    за последние initial_hours часов. Сообщения передаются в enqueue —
+    ограниченную очередь обработки, которая сдерживает чтение, если
+    обработка не успевает. Прогресс и оценка оставшегося времени
+    выводятся в лог раз в report_interval секунд.
+    """
+
+    def __init__(
+        self,
+        client,
+        enqueue: Callable[[Any], Awaitable[None]],
+        checkpoints: ChannelCheckpoints,
+        concurrency: int,
+        initial_hours: int,
+        max_hours: int,
+        report_interval: float
+    ):
+        self.client = client
+        self.enqueue = enqueue
+        self.checkpoints = checkpoints
+        self.concurrency = concurrency
+        self.initial_hours = initial_hours
+        self.max_hours = max_hours
+        self.report_interval = report_interval
+        self._channels: Dict[str, Dict[str, int]] = {}
+        self._started = 0.0
+        self._runs = 0
+
+    @property
+    def progress(self) -> Dict[str, float]:
+        """Прогресс догрузки: сообщений всего, обработано и оценка оставшегося времени"""
+        total = 0
+        processed = 0
+        for channel, state in self._channels.items():
+            span = max(0, state["latest"] - state["start"])
+            position = self.checkpoints.position(channel) or state["start"]
+            total += span
+            processed += min(span, max(0, position - state["start"]))
+
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        remaining = total - processed
+        return {
+            "channels": len(self._channels),
+            "fetched": sum(state["fetched"] for state in self._channels.values()),
+            "total": total,
+            "processed": processed,
+            "rate": rate,
+            "eta": remaining / rate if rate > 0 else None
+        }
+
+    def _report(self):
+        progress = self.progress
+        percent = 100 * progress["processed"] / progress["total"] if progress["total"] else 100.0
+        eta = f"{progress['eta']:.0f} с" if progress["eta"] is not None else "неизвестно"
+        logger.info(
+            f"Догрузка истории: {progress['processed']}/{progress['total']} сообщений "
+            f"({percent:.0f}%) из {progress['channels']} каналов, "
+            f"{progress['rate']:.1f} сообщений/с, осталось {eta}"
+        )
+
+    async def _report_loop(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            self._report()
+
+    @property
+    def running(self) -> bool:
+        return self._runs > 0
+
+    async def run(self, channels: List[Union[int, str]]):
+        """
+        Догружает историю каналов
+
+        Может вызываться повторно, пока предыдущая догрузка не завершена
+        (например, для каналов, перешедших от другого обработчика):
+        общий прогресс считается до завершения всех догрузок.
+        """
+        if not self._runs:
+            self._channels.clear()
+            self._started = time.monotonic()
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._reporter = asyncio.create_task(self._report_loop())
+        self._runs += 1
+        try:
+            await asyncio.gather(*(self._backfill_channel(channel, self._semaphore) for channel in channels))
+        finally:
+            self._runs -= 1
+            if not self._runs:
+                self._reporter.cancel()
+        if not self._runs:
+            self._report()
+
+    async def _backfill_channel(self, channel: Union[int, str], semaphore: asyncio.Semaphore):
+        key = None
+        try:
+            # Позицию канала определяем сразу, чтобы прогресс учитывал все каналы,
+            # а живые сообщения не сдвинули контрольную точку до начала догрузки
+            key = str(await self.client.get_peer_id(channel))
+            min_id = self.checkpoints.saved(key)
+            self.checkpoints.set_cursor(key, min_id or 0)
+            latest = await self.client.get_messages(channel, limit=1)
+            latest_id = latest[0].id if latest else 0
+            state = self._channels[key] = {
+                "start": min_id or latest_id,
+                "latest": latest_id,
+                "fetched": 0
+            }
+            if min_id is not None and latest_id <= min_id:
+                return
+
+            hours = self.max_hours if min_id is not None else self.initial_hours
+            cutoff = datetime.now(timezone.utc) - timedelta(hours=hours)
+            async with semaphore:
+                async for message in self.client.iter_messages(
+                    channel,
+                    min_id=min_id or 0,
+                    offset_date=cutoff,
+                    reverse=True
+                ):
+                    if not state["fetched"] and min_id is None:
+                        # Без контрольной точки начало догрузки известно
+                        # только по первому сообщению
+                        state["start"] = message.id - 1
+                    state["fetched"] += 1
+                    await self.enqueue(message)
+                    self.checkpoints.set_cursor(key, message.id)
+
+        except Exception as e:
+            logger.error(f"Ошибка при догрузке истории канала {channel}: {e}")
+        finally:
+            if key is not None:
+                self.checkpoints.clear_cursor(key)
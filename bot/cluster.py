@@ -0,0 +1,180 @@
+import asyncio
+import hashlib
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+from sqlalchemy import select, delete, func, or_
+from .database import async_session, upsert_insert, notify_news_saved
+from .models import News, WorkerLease
+from .formatting import NEWS_PREVIEW_LENGTH
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Режимы работы процесса
+MODE_ALL = "all"  # бот и парсер в одном процессе
+MODE_FRONT = "front"  # только бот: команды и ответы пользователям
+MODE_WORKER = "worker"  # только парсер для части каналов-источников
+MODES = (MODE_ALL, MODE_FRONT, MODE_WORKER)
+
+def rendezvous_owner(key: str, workers: Sequence[str]) -> Optional[str]:
+    """
+    Выбирает владельца ключа среди обработчиков (rendezvous hashing)
+
+    При появлении или уходе обработчика меняют владельца только
+    ключи, которые к нему переходят или от него уходят.
+    """
+    best = None
+    best_score = -1
+    for worker in workers:
+        digest = hashlib.blake2b(f"{worker}:{key}".encode("utf-8"), digest_size=8).digest()
+        score = int.from_bytes(digest, "big")
+        if score > best_score:
+            best, best_score = worker, score
+    return best
+
+class WorkerRegistry:
+    """
+    Реестр работающих обработчиков
+
+    Каждый обработчик раз в heartbeat_interval секунд обновляет свою
+    запись в таблице worker_leases. Обработчик, не обновлявший запись
+    дольше timeout секунд, считается остановленным, и его каналы
+    переходят к остальным. Время берется из часов процессов, поэтому
+    часы хостов должны быть синхронизированы.
+    """
+
+    def __init__(self, worker_id: str, heartbeat_interval: float, timeout: float):
+        self.worker_id = worker_id
+        self.heartbeat_interval = heartbeat_interval
+        self.timeout = timedelta(seconds=timeout)
+
+    async def heartbeat(self):
+        """Обновляет отметку о работе текущего обработчика"""
+        now = datetime.utcnow()
+        stmt = upsert_insert(WorkerLease).values(
+            worker_id=self.worker_id,
+            heartbeat_at=now,
+            started_at=now
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["worker_id"],
+            set_={"heartbeat_at": stmt.excluded.heartbeat_at}
+        )
+        async with async_session() as session:
+            await session.execute(stmt)
+            # Записи давно остановленных обработчиков больше не нужны
+            await session.execute(
+                delete(WorkerLease).where(WorkerLease.heartbeat_at < now - self.timeout * 10)
+            )
+            await session.commit()
+
+    async def live_workers(self) -> List[str]:
+        """Список работающих обработчиков"""
+        async with async_session() as session:
+            rows = await session.scalars(
+                select(WorkerLease.worker_id)
+                .where(WorkerLease.heartbeat_at >= datetime.utcnow() - self.timeout)
+                .order_by(WorkerLease.worker_id)
+            )
+            return list(rows)
+
+    async def leave(self):
+        """Удаляет запись обработчика, чтобы его каналы сразу перешли к остальным"""
+        async with async_session() as session:
+            await session.execute(delete(WorkerLease).where(WorkerLease.worker_id == self.worker_id))
+            await session.commit()
+
+class NewsTailer:
+    """
+    Чтение новостей, сохраненных другими процессами
+
+    Раз в interval секунд читает записи news с ID выше последнего
+    прочитанного и передает их обработчикам add_news_listener, как если бы
+    они были сохранены в текущем процессе. Транзакции разных процессов
+    могут фиксироваться не в порядке ID, поэтому пропущенные ID ниже
+    последнего прочитанного перепроверяются до gap_timeout секунд
+    (пропуск может остаться навсегда после отката транзакции).
+    Читаются только колонки, которые используют обработчики.
+    """
+
+    def __init__(self, interval: float, gap_timeout: float = 300.0, max_gaps: int = 1000):
+        self.interval = interval
+        self.gap_timeout = gap_timeout
+        self.max_gaps = max_gaps
+        self._last_id = 0
+        # Пропущенные ID и время, когда пропуск был замечен
+        self._gaps: Dict[int, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _columns(self):
+        return (
+            News.id,
+            News.original_text,
+            # Обработчикам нужно только начало перевода
+            func.substr(News.translated_text, 1, NEWS_PREVIEW_LENGTH).label("translated_text"),
+            News.topic,
+            News.importance,
+            News.is_catalyst,
+            News.market_target,
+            News.timestamp,
+            News.duplicate_of_id
+        )
+
+    def _expire_gaps(self, now: float):
+        for news_id, noticed_at in list(self._gaps.items()):
+            if now - noticed_at > self.gap_timeout:
+                del self._gaps[news_id]
+        # Самые старые пропуски отбрасываются первыми
+        while len(self._gaps) > self.max_gaps:
+            del self._gaps[min(self._gaps)]
+
+    async def poll(self):
+        """Передает обработчикам новости, появившиеся с прошлого чтения"""
+        now = time.monotonic()
+        self._expire_gaps(now)
+        condition = News.id > self._last_id
+        if self._gaps:
+            condition = or_(condition, News.id.in_(list(self._gaps)))
+        async with async_session() as session:
+            result = await session.execute(
+                select(*self._columns()).where(condition).order_by(News.id)
+            )
+            rows = [dict(row) for row in result.mappings()]
+
+        for row in rows:
+            news_id = row["id"]
+            if news_id > self._last_id:
+                # ID между прочитанными еще могут быть зафиксированы позже
+                for missing in range(max(self._last_id + 1, news_id - self.max_gaps), news_id):
+                    self._gaps[missing] = now
+                self._last_id = news_id
+            else:
+                self._gaps.pop(news_id, None)
+            notify_news_saved(row)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.error(f"Ошибка при чтении новых новостей: {e}")
+
+    async def start(self):
+        """Начинает чтение с текущей последней новости"""
+        async with async_session() as session:
+            last_id = await session.scalar(select(func.max(News.id)))
+        self._last_id = last_id or 0
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+# Создаем экземпляр чтения новостей других процессов
+news_tailer = NewsTailer(settings.NEWS_POLL_INTERVAL)
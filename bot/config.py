@@ -1,4 +1,5 @@
-from typing import List
+import socket
+from typing import List, Union
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 
@@ -20,6 +21,8 @@ class Settings(BaseSettings):
     
     # База данных
     DATABASE_URL: str
+    NEWS_WRITE_BATCH_SIZE: int = 100  # Максимум новостей в одной транзакции записи
+    NEWS_WRITE_MAX_WAIT_MS: int = 50  # Максимальная задержка записи новости, мс
     
     # Топики для анализа
     TRADFI_TOPICS: List[str] = [
@@ -46,6 +49,94 @@ class Settings(BaseSettings):
     OPENROUTER_API_KEY: str
     OPENROUTER_API_URL: str = "https://openrouter.ai/api/v1"
     OPENROUTER_MODEL: str = "anthropic/claude-3-opus-20240229"
+    OPENROUTER_TIMEOUT: float = 60.0  # Общий таймаут запроса, секунды
+    OPENROUTER_POOL_SIZE: int = 100  # Максимум соединений в пуле
+    OPENROUTER_POOL_SIZE_PER_HOST: int = 20  # Максимум соединений к одному хосту
+    OPENROUTER_KEEPALIVE_TIMEOUT: float = 75.0  # Время жизни простаивающего соединения
+    OPENROUTER_COMBINED_ANALYSIS: bool = True  # Анализ и перевод одним запросом
+    OPENROUTER_REQUESTS_PER_SECOND: float = 5.0  # Лимит запросов в секунду
+    OPENROUTER_TOKENS_PER_MINUTE: int = 200000  # Лимит токенов в минуту
+    OPENROUTER_MAX_RETRIES: int = 4  # Повторы при 429, 5xx и сетевых ошибках
+    OPENROUTER_BACKOFF_BASE: float = 1.0  # Базовая задержка перед повтором, секунды
+    OPENROUTER_BACKOFF_MAX: float = 30.0  # Максимальная задержка перед повтором, секунды
+    OPENROUTER_CIRCUIT_FAILURES: int = 5  # Отказов подряд до размыкания выключателя
+    OPENROUTER_CIRCUIT_RESET: float = 60.0  # Время до пробного запроса, секунды
+    ANALYSIS_BATCHING: bool = False  # Объединять анализ одновременно пришедших новостей в пакеты
+    ANALYSIS_BATCH_MAX_SIZE: int = 20  # Максимум новостей в пакете
+    ANALYSIS_BATCH_MAX_WAIT_MS: int = 500  # Максимальное ожидание наполнения пакета, мс
+    
+    # Кэш ответов LLM
+    LLM_CACHE_SIZE: int = 5000  # Максимум записей в памяти
+    LLM_CACHE_TTL: int = 86400  # Время жизни записи, секунды
+    LLM_CACHE_PERSISTENT: bool = True  # Хранить кэш в базе данных
+    
+    # Поиск почти-дубликатов
+    DEDUP_WINDOW_HOURS: int = 24  # Окно, в котором ищутся дубликаты
+    DEDUP_MAX_DISTANCE: int = 6  # Максимальное расстояние Хэмминга между SimHash (из 64 бит)
+    
+    # Очередь обработки входящих сообщений
+    INGEST_WORKERS: int = 4  # Количество параллельных обработчиков
+    INGEST_QUEUE_SIZE: int = 1000  # Максимальный размер очереди
+    INGEST_OVERFLOW: str = "block"  # Политика переполнения: block, drop_oldest, spill
+    ALBUM_WAIT_MS: int = 800  # Ожидание следующей части альбома, мс
+    
+    # Режим работы и распределение каналов между процессами
+    BOT_MODE: str = "all"  # all — бот и парсер в одном процессе, front — только бот, worker — только парсер
+    WORKER_ID: str = ""  # Постоянный идентификатор обработчика (по умолчанию имя хоста)
+    WORKER_HEARTBEAT_INTERVAL: float = 10.0  # Интервал отметки о работе и перераспределения каналов, секунды
+    WORKER_TIMEOUT: float = 30.0  # Время без отметки, после которого обработчик считается остановленным
+    NEWS_POLL_INTERVAL: float = 5.0  # Интервал чтения новостей, сохраненных другими процессами, секунды
+    
+    # Устойчивая очередь обработки
+    WORK_QUEUE_ENABLED: bool = False  # Хранить входящие сообщения в базе до завершения обработки
+    WORK_QUEUE_LEASE: float = 300.0  # Время аренды сообщения обработчиком, секунды
+    WORK_QUEUE_POLL_INTERVAL: float = 1.0  # Интервал опроса очереди, секунды
+    WORK_QUEUE_MAX_ATTEMPTS: int = 5  # Максимум попыток обработки сообщения
+    WORK_QUEUE_RETENTION_HOURS: int = 72  # Срок хранения завершенных сообщений, часы
+    
+    # Догрузка истории каналов
+    BACKFILL_CONCURRENCY: int = 8  # Количество каналов, читаемых одновременно
+    BACKFILL_INITIAL_HOURS: int = 1  # Глубина догрузки для канала без контрольной точки, часы
+    BACKFILL_MAX_HOURS: int = 24  # Максимальная глубина догрузки после простоя, часы
+    BACKFILL_CHECKPOINT_INTERVAL: float = 5.0  # Интервал сохранения контрольных точек, секунды
+    BACKFILL_REPORT_INTERVAL: float = 10.0  # Интервал вывода прогресса догрузки, секунды
+    
+    # Публикация в Telegram
+    PUBLISH_WORKERS: int = 2  # Количество параллельных обработчиков очереди публикаций
+    PUBLISH_CHAT_MESSAGES_PER_MINUTE: float = 20.0  # Лимит сообщений в один чат в минуту
+    PUBLISH_CHAT_BURST: int = 3  # Сообщений в один чат подряд без ожидания
+    PUBLISH_GLOBAL_RATE: float = 25.0  # Общий лимит сообщений в секунду
+    PUBLISH_MAX_RETRIES: int = 5  # Повторы публикации при временных ошибках
+    
+    # Медиафайлы
+    MEDIA_DIR: str = "media"  # Каталог хранилища медиа
+    MEDIA_STORE_MAX_MB: int = 2048  # Максимальный размер хранилища медиа, МБ
+    MEDIA_CHUNK_SIZE: int = 262144  # Размер части при скачивании медиа, байты (кратен 4096)
+    MEDIA_STORE_ENABLED: bool = False  # Сохранять медиа новостей в хранилище (news.media_path — путь к файлу)
+    MEDIA_COMPACT_INTERVAL: float = 600.0  # Интервал обслуживания хранилища, секунды
+    
+    # Потоковый перевод с постепенной публикацией
+    STREAMING_TRANSLATION: bool = False  # Публиковать перевод длинных новостей по мере генерации
+    STREAMING_MIN_LENGTH: int = 600  # Минимальная длина новости для потокового режима
+    STREAMING_FIRST_CHARS: int = 100  # Минимальный объем первой публикации, символы
+    STREAMING_EDIT_INTERVAL: float = 3.0  # Минимальный интервал между редактированиями, секунды
+    
+    # Дайджесты
+    DIGEST_TOP_PER_TOPIC: int = 5  # Максимум новостей по одной теме в дайджесте
+    
+    # Прогнозы
+    FORECAST_DEBOUNCE_SECONDS: float = 30.0  # Минимальный интервал между пересчетами прогноза по новым новостям
+    
+    # Метрики
+    METRICS_HOST: str = "127.0.0.1"  # Адрес HTTP-сервера метрик
+    METRICS_PORT: int = 9108  # Порт HTTP-сервера метрик (/metrics), 0 — выключен
+    
+    # Трассировка
+    TRACING_ENABLED: bool = True  # Трассировка обработки новостей
+    TRACE_SLOW_SECONDS: float = 10.0  # Обработка дольше порога выводится в журнал с уровнем WARNING, секунды
+    TRACE_LOG_SPANS: bool = False  # Выводить в журнал каждый спан, а не только итог трассы
+    TRACE_EXPORT_PATH: str = ""  # Файл для выгрузки спанов в формате OTLP JSON, пустая строка — выключено
+    TRACE_EXPORT_INTERVAL: float = 5.0  # Интервал записи спанов в файл, секунды
     
     # Настройки приложения
     DEBUG: bool = False
@@ -55,6 +146,23 @@ class Settings(BaseSettings):
         """Получить список ID каналов-источников"""
         return [ch.strip() for ch in self.SOURCE_CHANNEL_IDS.split(',')]
     
+    @property
+    def source_peers(self) -> List[Union[int, str]]:
+        """Каналы-источники для Telethon: числовые ID как int, имена как есть"""
+        return [int(ch) if ch.lstrip('-').isdigit() else ch for ch in self.source_channels]
+    
+    @property
+    def worker_id(self) -> str:
+        """Идентификатор обработчика"""
+        return self.WORKER_ID or socket.gethostname()
+    
+    @property
+    def parser_session(self) -> str:
+        """Имя сессии Telethon: у каждого обработчика своя"""
+        if self.BOT_MODE == "worker":
+            return f"news_parser_session_{self.worker_id}"
+        return "news_parser_session"
+    
     @property
     def api_id(self) -> int:
         """Получить API ID как целое число"""
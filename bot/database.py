@@ -1,9 +1,18 @@
+import contextvars
+from datetime import timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.dialects import postgresql, sqlite
 import logging
 from .config import settings
 from .base import Base
+from .models import News
+from .batcher import MicroBatcher
+from .metrics import registry, DB_POOL
+from .tracing import traced
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +35,16 @@ async_session = sessionmaker(
     autoflush=False
 )
 
+def collect_pool_metrics():
+    """Передает состояние пула соединений в метрики"""
+    pool = engine.pool
+    for state, method in (("size", "size"), ("checked_out", "checkedout"), ("overflow", "overflow")):
+        if hasattr(pool, method):
+            # overflow() отрицателен, пока пул не заполнен
+            DB_POOL.set(max(0, getattr(pool, method)()), state=state)
+
+registry.add_collector(collect_pool_metrics)
+
 async def init_db():
     """Инициализация базы данных"""
     try:
@@ -37,4 +56,140 @@ async def init_db():
         raise
     except Exception as e:
         logger.error(f"Неожиданная ошибка при инициализации базы данных: {e}")
-        raise 
\ No newline at end of file
+        raise
+
+def upsert_insert(table):
+    """Возвращает INSERT с поддержкой ON CONFLICT для диалекта текущей базы"""
+    if engine.dialect.name == "sqlite":
+        return sqlite.insert(table)
+    return postgresql.insert(table)
+
+def truncate_to_hour(column):
+    """Начало часа для колонки DateTime в диалекте текущей базы"""
+    if engine.dialect.name == "sqlite":
+        return func.strftime("%Y-%m-%d %H:00:00", column)
+    return func.date_trunc("hour", column)
+
+# Обработчики, вызываемые после сохранения каждой новости
+_news_listeners: List[Callable[[Dict[str, Any]], Any]] = []
+
+def add_news_listener(listener: Callable[[Dict[str, Any]], Any]):
+    """Регистрирует обработчик, получающий поля каждой сохраненной новости"""
+    _news_listeners.append(listener)
+
+def notify_news_saved(news: Dict[str, Any]):
+    """Передает сохраненную новость зарегистрированным обработчикам"""
+    for listener in _news_listeners:
+        try:
+            listener(news)
+        except Exception as e:
+            logger.error(f"Ошибка в обработчике сохраненной новости: {e}")
+
+class NewsWriter:
+    """
+    Пакетная запись новостей
+
+    Новости накапливаются до NEWS_WRITE_BATCH_SIZE штук или
+    NEWS_WRITE_MAX_WAIT_MS миллисекунд и записываются одной транзакцией
+    многострочным INSERT ... ON CONFLICT DO NOTHING. Каждый вызывающий
+    получает ID своей записи. Если пакет не удалось записать целиком,
+    новости записываются по одной, чтобы ошибка затронула только
+    вызывающего с некорректной записью.
+    """
+
+    def __init__(self, max_size: int, max_wait_ms: int):
+        self._batcher = MicroBatcher(self._write, max_size, max_wait_ms, name="news_writer")
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Количество записанных пакетов и новостей"""
+        return {"batches": self._batcher.batches, "items": self._batcher.items}
+
+    async def save(self, values: Dict[str, Any]) -> Optional[int]:
+        """
+        Добавляет новость в очередь записи и ожидает ее сохранения
+        
+        Returns:
+            ID новой записи или None, если это сообщение уже было сохранено
+        """
+        # Обработчики сохраненной новости вызываются в контексте вызывающего,
+        # чтобы их спаны попали в трассу новости
+        return await self._batcher.submit((values, contextvars.copy_context()))
+
+    async def flush(self):
+        """Записывает накопленные новости"""
+        await self._batcher.flush()
+
+    async def _write(self, items: List[Tuple[Dict[str, Any], contextvars.Context]]) -> List[Any]:
+        rows = [values for values, _ in items]
+        try:
+            results = await self._insert(rows)
+        except SQLAlchemyError as e:
+            logger.warning(f"Ошибка пакетной записи новостей, записываем по одной: {e}")
+            results = []
+            for values in rows:
+                try:
+                    results.extend(await self._insert([values]))
+                except SQLAlchemyError as row_error:
+                    results.append(row_error)
+
+        for (values, context), news_id in zip(items, results):
+            if isinstance(news_id, int):
+                context.run(notify_news_saved, {"id": news_id, **values})
+        return results
+
+    async def _insert(self, rows: List[Dict[str, Any]]) -> List[Optional[int]]:
+        """Записывает новости одной транзакцией и возвращает их ID по порядку"""
+        # Многострочный INSERT требует одинакового набора колонок
+        groups: Dict[tuple, List[Dict[str, Any]]] = {}
+        for values in rows:
+            groups.setdefault(tuple(sorted(values)), []).append(values)
+
+        ids: Dict[tuple, int] = {}
+        async with async_session() as session:
+            for group in groups.values():
+                result = await session.execute(
+                    upsert_insert(News)
+                    .values(group)
+                    .on_conflict_do_nothing(index_elements=["source_channel_id", "message_id"])
+                    .returning(News.id, News.source_channel_id, News.message_id)
+                )
+                for news_id, source_channel_id, message_id in result:
+                    ids[(source_channel_id, message_id)] = news_id
+            await session.commit()
+
+        # Повтор одного сообщения внутри пакета получает None, как и повтор из базы
+        results = []
+        for values in rows:
+            results.append(ids.pop((values["source_channel_id"], values["message_id"]), None))
+        return results
+
+# Создаем экземпляр пакетной записи новостей
+news_writer = NewsWriter(settings.NEWS_WRITE_BATCH_SIZE, settings.NEWS_WRITE_MAX_WAIT_MS)
+
+@traced("db_write")
+async def save_news(**values) -> Optional[int]:
+    """
+    Сохраняет новость и уведомляет обработчиков
+    
+    Запись выполняется пакетами через news_writer.
+    
+    Returns:
+        ID новой записи или None, если это сообщение уже было сохранено
+    """
+    timestamp = values.get("timestamp")
+    if timestamp is not None and timestamp.tzinfo is not None:
+        # Колонка timestamp хранит время UTC без часового пояса
+        values["timestamp"] = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    
+    return await news_writer.save(values)
+
+async def news_exists(source_channel_id: str, message_id: int) -> bool:
+    """Проверяет, сохранена ли уже новость из этого сообщения канала"""
+    async with async_session() as session:
+        result = await session.execute(
+            select(News.id)
+            .where(News.source_channel_id == source_channel_id, News.message_id == message_id)
+            .limit(1)
+        )
+        return result.first() is not None
@@ -0,0 +1,151 @@
+import hashlib
+import logging
+import re
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, Optional, Set, Tuple
+from sqlalchemy import select
+from .config import settings
+from .database import async_session
+from .models import News
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+SIMHASH_BITS = 64
+
+def simhash(text: str) -> int:
+    """
+    Вычисляет 64-битный SimHash текста по словам
+
+    Близкие по содержанию тексты дают хэши с небольшим расстоянием Хэмминга:
+    перефразированный заголовок или добавленная пометка вроде «BREAKING»
+    меняют лишь несколько бит.
+    """
+    tokens = _TOKEN_RE.findall(text.lower())
+
+    weights = [0] * SIMHASH_BITS
+    for token in tokens:
+        h = int.from_bytes(
+            hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(),
+            "big"
+        )
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+
+    result = 0
+    for bit in range(SIMHASH_BITS):
+        if weights[bit] > 0:
+            result |= 1 << bit
+    return result
+
+def hamming_distance(a: int, b: int) -> int:
+    """Расстояние Хэмминга между двумя хэшами"""
+    return bin(a ^ b).count("1")
+
+class NearDuplicateIndex:
+    """
+    Индекс почти-дубликатов недавних новостей на основе SimHash
+
+    Хэш делится на max_distance + 1 полос: по принципу Дирихле у двух
+    хэшей с расстоянием не больше max_distance хотя бы одна полоса совпадает,
+    поэтому кандидатов ищем по точному совпадению полос, а не перебором.
+    Записи старше окна window удаляются из индекса.
+    """
+
+    def __init__(self, window: timedelta, max_distance: int):
+        self.window = window
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.band_bits = SIMHASH_BITS // self.bands
+        self._hashes: Dict[int, int] = {}
+        self._order: Deque[Tuple[datetime, int]] = deque()
+        self._buckets: Dict[Tuple[int, int], Set[int]] = {}
+
+    def _band_keys(self, value: int):
+        mask = (1 << self.band_bits) - 1
+        for band in range(self.bands):
+            yield band, value >> (band * self.band_bits) & mask
+
+    def add(self, news_id: int, text: str, timestamp: Optional[datetime] = None):
+        """Добавляет новость в индекс"""
+        if news_id in self._hashes:
+            return
+        self.evict()
+        value = simhash(text)
+        self._hashes[news_id] = value
+        self._order.append((timestamp or datetime.utcnow(), news_id))
+        for key in self._band_keys(value):
+            self._buckets.setdefault(key, set()).add(news_id)
+
+    def add_news(self, news: Dict[str, Any]):
+        """Добавляет сохраненную новость (обработчик add_news_listener)"""
+        if news.get("duplicate_of_id") is None and news.get("original_text"):
+            self.add(news["id"], news["original_text"], news.get("timestamp"))
+
+    def find_duplicate(self, text: str) -> Optional[int]:
+        """
+        Ищет почти-дубликат текста среди недавних новостей
+
+        Returns:
+            ID исходной новости или None
+        """
+        self.evict()
+        value = simhash(text)
+        best_id = None
+        best_distance = self.max_distance + 1
+        for key in self._band_keys(value):
+            for news_id in self._buckets.get(key, ()):
+                distance = hamming_distance(value, self._hashes[news_id])
+                if distance < best_distance:
+                    best_id, best_distance = news_id, distance
+        return best_id
+
+    def evict(self):
+        """Удаляет из индекса новости старше окна"""
+        cutoff = datetime.utcnow() - self.window
+        while self._order and self._order[0][0] < cutoff:
+            _, news_id = self._order.popleft()
+            value = self._hashes.pop(news_id, None)
+            if value is None:
+                continue
+            for key in self._band_keys(value):
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(news_id)
+                    if not bucket:
+                        del self._buckets[key]
+
+    async def load_from_db(self):
+        """Перестраивает индекс по новостям из базы за окно"""
+        try:
+            self._hashes.clear()
+            self._order.clear()
+            self._buckets.clear()
+
+            time_ago = datetime.utcnow() - self.window
+            async with async_session() as session:
+                result = await session.execute(
+                    select(News.id, News.original_text, News.timestamp)
+                    .where(
+                        News.timestamp >= time_ago,
+                        News.duplicate_of_id.is_(None)
+                    )
+                    .order_by(News.timestamp)
+                )
+                for news_id, text, timestamp in result:
+                    self.add(news_id, text, timestamp)
+
+            logger.info(f"Индекс дубликатов загружен: {len(self._hashes)} новостей")
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке индекса дубликатов: {e}")
+
+    def __len__(self):
+        return len(self._hashes)
+
+# Создаем экземпляр индекса
+dedup_index = NearDuplicateIndex(
+    window=timedelta(hours=settings.DEDUP_WINDOW_HOURS),
+    max_distance=settings.DEDUP_MAX_DISTANCE
+)
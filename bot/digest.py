@@ -0,0 +1,302 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+from sqlalchemy import select, func
+from .database import async_session, truncate_to_hour
+from .models import News, DigestLog
+from .formatting import NEWS_PREVIEW_LENGTH, format_digest
+from .singleflight import SingleFlight
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+DIGEST_PERIODS = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1)
+}
+
+BUCKET_SIZE = timedelta(hours=1)
+
+# Сколько отдается из кэша дайджест со скользящим окном, секунды
+ROLLING_CACHE_SECONDS = 60
+
+def news_preview():
+    """Начало перевода новости, вычисляемое на стороне базы"""
+    return func.substr(News.translated_text, 1, NEWS_PREVIEW_LENGTH)
+
+def _hour_start(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.replace(minute=0, second=0, microsecond=0)
+
+def _parse_hour(value) -> datetime:
+    # SQLite возвращает начало часа строкой, PostgreSQL — датой
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return _hour_start(value)
+
+def _empty_bucket() -> Dict[str, Any]:
+    return {"news_count": 0, "topics": {}}
+
+def _top_items(items: Iterable[Dict[str, Any]], per_topic: int) -> List[Dict[str, Any]]:
+    return sorted(items, key=lambda item: (item["importance"], item["timestamp"]), reverse=True)[:per_topic]
+
+async def load_digest_buckets(since: datetime, until: datetime, per_topic: int) -> Dict[datetime, Dict[str, Any]]:
+    """
+    Загружает часовые корзины дайджеста за интервал [since, until)
+
+    Количество новостей по часам и темам и лучшие per_topic новостей каждой
+    темы за час (по важности, затем по времени) вычисляются в базе данных:
+    в приложение передаются только счетчики и короткие фрагменты текста.
+    Почти-дубликаты в дайджест не попадают.
+    """
+    conditions = (
+        News.timestamp >= since,
+        News.timestamp < until,
+        News.duplicate_of_id.is_(None)
+    )
+    hour = truncate_to_hour(News.timestamp)
+
+    async with async_session() as session:
+        counts = (await session.execute(
+            select(hour.label("hour"), News.topic, func.count(News.id))
+            .where(*conditions)
+            .group_by(hour, News.topic)
+        )).all()
+
+        ranked = (
+            select(
+                hour.label("hour"),
+                News.topic,
+                news_preview().label("preview"),
+                News.importance,
+                News.is_catalyst,
+                News.timestamp,
+                func.row_number().over(
+                    partition_by=(hour, News.topic),
+                    order_by=(News.importance.desc(), News.timestamp.desc())
+                ).label("rank")
+            )
+            .where(*conditions, News.topic.is_not(None))
+            .subquery()
+        )
+        rows = (await session.execute(
+            select(
+                ranked.c.hour,
+                ranked.c.topic,
+                ranked.c.preview,
+                ranked.c.importance,
+                ranked.c.is_catalyst,
+                ranked.c.timestamp
+            ).where(ranked.c.rank <= per_topic)
+        )).all()
+
+    buckets: Dict[datetime, Dict[str, Any]] = {}
+    start = _hour_start(since)
+    while start < until:
+        buckets[start] = _empty_bucket()
+        start += BUCKET_SIZE
+
+    for hour_value, topic, count in counts:
+        bucket = buckets.setdefault(_parse_hour(hour_value), _empty_bucket())
+        bucket["news_count"] += count
+        if topic:
+            bucket["topics"].setdefault(topic, {"count": 0, "items": []})["count"] += count
+
+    for hour_value, topic, preview, importance, is_catalyst, timestamp in rows:
+        bucket = buckets.setdefault(_parse_hour(hour_value), _empty_bucket())
+        bucket["topics"].setdefault(topic, {"count": 0, "items": []})["items"].append({
+            "text": preview or "",
+            "importance": importance or 0,
+            "is_catalyst": bool(is_catalyst),
+            "timestamp": timestamp
+        })
+
+    return buckets
+
+def merge_digest_buckets(buckets: Iterable[Dict[str, Any]], per_topic: int) -> Dict[str, Any]:
+    """Сводит часовые корзины в дайджест за период"""
+    news_count = 0
+    counts: Dict[str, int] = defaultdict(int)
+    items: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for bucket in buckets:
+        news_count += bucket["news_count"]
+        for topic, data in bucket["topics"].items():
+            counts[topic] += data["count"]
+            items[topic].extend(data["items"])
+
+    topics = [
+        {"topic": topic, "count": count, "items": _top_items(items[topic], per_topic)}
+        for topic, count in sorted(counts.items(), key=lambda pair: -pair[1])
+    ]
+    return {"news_count": news_count, "topics": topics}
+
+class DigestMaterializer:
+    """
+    Предварительно рассчитанные дайджесты
+
+    Новости агрегируются в часовые корзины, из которых собираются дайджесты
+    за час, день и неделю. При сохранении новости пересчитывается только
+    ее корзина, готовые дайджесты отдаются из кэша, пока не появятся новые
+    новости или не начнется следующий час. Одновременные запросы одного
+    периода объединяются в одно вычисление.
+
+    Граница дня и недели выравнивается по началу часа. Дайджест за час
+    считается по скользящему окну последних 60 минут прямо в базе и
+    отдается из кэша не дольше ROLLING_CACHE_SECONDS секунд.
+
+    В журнал DigestLog записываются только дайджесты, отправленные
+    пользователям (log_delivery), расчеты по расписанию считаются
+    в materializations.
+    """
+
+    def __init__(self, per_topic: int):
+        self.per_topic = per_topic
+        self._buckets: Dict[datetime, Dict[str, Any]] = {}
+        self._generations: Dict[datetime, int] = defaultdict(int)
+        self._version = 0
+        self._cache: Dict[str, Dict[str, Any]] = {}
+        self._flight = SingleFlight()
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.materializations = 0
+
+    def add_news(self, news: Dict[str, Any]):
+        """Учитывает сохраненную новость (обработчик add_news_listener)"""
+        if news.get("duplicate_of_id"):
+            return
+        start = _hour_start(news.get("timestamp") or datetime.utcnow())
+        self._buckets.pop(start, None)
+        self._generations[start] += 1
+        self._version += 1
+
+    @staticmethod
+    def _is_rolling(period: str) -> bool:
+        # Окно не длиннее корзины собирается не из корзин, а прямо по базе
+        return DIGEST_PERIODS[period] <= BUCKET_SIZE
+
+    def _window(self, period: str, now: datetime) -> List[datetime]:
+        start = _hour_start(now - DIGEST_PERIODS[period])
+        current = _hour_start(now)
+        starts = []
+        while start <= current:
+            starts.append(start)
+            start += BUCKET_SIZE
+        return starts
+
+    async def _load_missing(self, starts: List[datetime]):
+        missing = [start for start in starts if start not in self._buckets]
+        if not missing:
+            return
+        generations = {start: self._generations[start] for start in missing}
+        buckets = await load_digest_buckets(missing[0], missing[-1] + BUCKET_SIZE, self.per_topic)
+        for start in missing:
+            # Корзина могла устареть, пока шел запрос
+            if self._generations[start] == generations[start]:
+                self._buckets[start] = buckets.get(start, _empty_bucket())
+
+    async def _materialize(self, period: str) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        version = self._version
+        if self._is_rolling(period):
+            window_start = now - DIGEST_PERIODS[period]
+            buckets = (await load_digest_buckets(window_start, now, self.per_topic)).values()
+        else:
+            starts = self._window(period, now)
+            window_start = starts[0]
+            await self._load_missing(starts)
+            buckets = (self._buckets.get(start, _empty_bucket()) for start in starts)
+
+        digest = merge_digest_buckets(buckets, self.per_topic)
+        entry = {
+            "digest": digest,
+            "text": format_digest(period, digest),
+            "version": version,
+            "window_start": window_start,
+            "generated_at": now
+        }
+        self._cache[period] = entry
+        self.materializations += 1
+
+        logger.info(
+            f"Дайджест за {period} рассчитан: {digest['news_count']} новостей, "
+            f"{len(digest['topics'])} тем"
+        )
+        return entry
+
+    async def get(self, period: str) -> Dict[str, Any]:
+        """
+        Возвращает дайджест за период
+
+        Returns:
+            Словарь с данными дайджеста (digest), готовым текстом (text)
+            и временем расчета (generated_at)
+        """
+        entry = self._cache.get(period)
+        if entry and self._is_fresh(period, entry, datetime.utcnow()):
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        return await self._flight.do(period, lambda: self._materialize(period))
+
+    def _is_fresh(self, period: str, entry: Dict[str, Any], now: datetime) -> bool:
+        if entry["version"] != self._version:
+            return False
+        if self._is_rolling(period):
+            return (now - entry["generated_at"]).total_seconds() < ROLLING_CACHE_SECONDS
+        return entry["window_start"] == self._window(period, now)[0]
+
+    async def log_delivery(self, period: str, entry: Dict[str, Any]):
+        """Записывает отправленный пользователю дайджест в журнал DigestLog"""
+        digest = entry["digest"]
+        async with async_session() as session:
+            session.add(DigestLog(
+                period=period,
+                news_count=digest["news_count"],
+                topics_count=len(digest["topics"]),
+                generated_at=datetime.utcnow()
+            ))
+            await session.commit()
+
+    def _evict(self, now: datetime):
+        oldest = _hour_start(now - max(DIGEST_PERIODS.values()))
+        for start in [start for start in self._buckets if start < oldest]:
+            del self._buckets[start]
+        for start in [start for start in self._generations if start < oldest]:
+            del self._generations[start]
+
+    async def refresh(self):
+        """Пересчитывает дайджесты всех периодов"""
+        self._evict(datetime.utcnow())
+        for period in DIGEST_PERIODS:
+            try:
+                await self.get(period)
+            except Exception as e:
+                logger.error(f"Ошибка при расчете дайджеста за {period}: {e}")
+
+    async def _run(self):
+        while True:
+            await self.refresh()
+            # Следующий пересчет — в начале следующего часа
+            now = datetime.utcnow()
+            await asyncio.sleep((_hour_start(now) + BUCKET_SIZE - now).total_seconds() + 1)
+
+    def start(self):
+        """Запускает пересчет дайджестов по расписанию"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Останавливает пересчет дайджестов"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+# Создаем экземпляр материализатора дайджестов
+digest_materializer = DigestMaterializer(settings.DIGEST_TOP_PER_TOPIC)
@@ -1,116 +1,323 @@
+import asyncio
+import json
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
-from sqlalchemy import select, func
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import select, func, case, or_
 from .database import async_session
 from .models import News, Forecast
 from .config import settings
+from .digest import news_preview
+from .formatting import NEWS_PREVIEW_LENGTH
+from .singleflight import SingleFlight
+from .tracing import traced
 
 logger = logging.getLogger(__name__)
 
+# Окна прогноза: длительность окна и размер корзины кольцевого буфера
+FORECAST_WINDOWS = {
+    "hour": (timedelta(hours=1), timedelta(minutes=1)),
+    "day": (timedelta(days=1), timedelta(minutes=15)),
+    "week": (timedelta(weeks=1), timedelta(hours=1))
+}
+
+MARKETS = ("TRADFI", "CRYPTO")
+
+# Числовое представление уверенности для колонки Forecast.confidence
+CONFIDENCE_SCORES = {
+    "low": 0.3,
+    "medium": 0.6,
+    "high": 0.9
+}
+
+def _to_naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def news_direction(topic: Optional[str], original_text: str, tradfi_topics) -> int:
+    """Направление влияния новости на рынок: 1 — позитивное, -1 — негативное"""
+    if topic in tradfi_topics:
+        return 1 if "positive" in original_text.lower() else -1
+    return 1 if "bullish" in original_text.lower() else -1
+
+def is_key_news(importance: int, is_catalyst: bool) -> bool:
+    """Входит ли новость в список ключевых для прогноза"""
+    return importance >= 4 or bool(is_catalyst)
+
+def news_direction_expr(tradfi_topics):
+    """SQL-выражение, вычисляющее news_direction на стороне базы"""
+    text = func.lower(News.original_text)
+    return case(
+        (News.topic.in_(list(tradfi_topics)), case((text.contains("positive"), 1), else_=-1)),
+        else_=case((text.contains("bullish"), 1), else_=-1)
+    )
+
+def is_key_news_expr():
+    """SQL-условие is_key_news"""
+    return or_(News.importance >= 4, News.is_catalyst.is_(True))
+
+class _Bucket:
+    __slots__ = ("weight", "weighted_sum", "key_news")
+
+    def __init__(self):
+        self.weight = 0
+        self.weighted_sum = 0
+        self.key_news: List[Dict[str, Any]] = []
+
+class RollingWindow:
+    """
+    Скользящее окно с накопленными суммами по корзинам
+
+    Окно разбито на корзины размером bucket_size. Добавление новости
+    и получение сумм выполняются за O(1) относительно числа новостей:
+    суммы окна поддерживаются инкрементально, а при сдвиге окна
+    вычитаются суммы устаревших корзин. Граница окна определяется
+    с точностью до одной корзины.
+    """
+
+    def __init__(self, span: timedelta, bucket_size: timedelta):
+        self.span = span
+        self.bucket_size = bucket_size.total_seconds()
+        self._buckets: Dict[int, _Bucket] = {}
+        self._oldest = None
+        self.weight = 0
+        self.weighted_sum = 0
+
+    def _index(self, timestamp: datetime) -> int:
+        return int(timestamp.replace(tzinfo=timezone.utc).timestamp() // self.bucket_size)
+
+    def expire(self, now: datetime):
+        """Удаляет корзины, вышедшие за пределы окна"""
+        cutoff = self._index(now - self.span)
+        if self._oldest is None:
+            return
+        for index in range(self._oldest, cutoff + 1):
+            bucket = self._buckets.pop(index, None)
+            if bucket is not None:
+                self.weight -= bucket.weight
+                self.weighted_sum -= bucket.weighted_sum
+        if self._buckets:
+            self._oldest = max(self._oldest, cutoff + 1)
+        else:
+            self._oldest = None
+
+    def add(self, timestamp: datetime, weight: int, direction: int, key_item: Optional[Dict]):
+        """Добавляет новость в окно"""
+        now = datetime.utcnow()
+        self.expire(now)
+        index = self._index(timestamp)
+        if index <= self._index(now - self.span):
+            return
+
+        bucket = self._buckets.get(index)
+        if bucket is None:
+            bucket = self._buckets[index] = _Bucket()
+            self._oldest = index if self._oldest is None else min(self._oldest, index)
+        bucket.weight += weight
+        bucket.weighted_sum += weight * direction
+        if key_item is not None:
+            bucket.key_news.append(key_item)
+        self.weight += weight
+        self.weighted_sum += weight * direction
+
+    def snapshot(self) -> Tuple[int, int, List[Dict[str, Any]]]:
+        """Суммарный вес, взвешенная сумма направлений и ключевые новости окна"""
+        self.expire(datetime.utcnow())
+        key_news = []
+        for index in sorted(self._buckets):
+            key_news.extend(self._buckets[index].key_news)
+        return self.weight, self.weighted_sum, key_news
+
+class RollingForecastEngine:
+    """
+    Инкрементальный расчет данных для прогноза
+
+    Для каждого рынка и окна (hour/day/week) поддерживает скользящие суммы,
+    которые обновляются при сохранении каждой новости. Полное чтение
+    новостей из базы выполняется только при запуске.
+    """
+
+    def __init__(self, tradfi_topics):
+        self.tradfi_topics = set(tradfi_topics)
+        self.ready = False
+        self._windows = {
+            (market, period): RollingWindow(span, bucket_size)
+            for market in MARKETS
+            for period, (span, bucket_size) in FORECAST_WINDOWS.items()
+        }
+
+    @traced("forecast_update")
+    def add_news(self, news: Dict[str, Any]):
+        """Учитывает сохраненную новость (обработчик add_news_listener)"""
+        if news.get("duplicate_of_id") or not news.get("importance"):
+            return
+        market_target = news.get("market_target")
+        markets = MARKETS if market_target == "BOTH" else (market_target,)
+        if not set(markets) <= set(MARKETS):
+            return
+
+        timestamp = _to_naive_utc(news.get("timestamp") or datetime.utcnow())
+        importance = news["importance"]
+        if "direction" in news:
+            direction = news["direction"]
+        else:
+            direction = news_direction(news.get("topic"), news["original_text"], self.tradfi_topics)
+        key_item = None
+        if is_key_news(importance, news.get("is_catalyst")):
+            key_item = {
+                "id": news["id"],
+                "text": (news.get("translated_text") or "")[:NEWS_PREVIEW_LENGTH],
+                "importance": importance,
+                "is_catalyst": bool(news.get("is_catalyst"))
+            }
+
+        for market in markets:
+            for period in FORECAST_WINDOWS:
+                self._windows[(market, period)].add(timestamp, importance, direction, key_item)
+
+    def snapshot(self, period: str, market_type: str) -> Tuple[int, int, List[Dict[str, Any]]]:
+        """Данные окна для рынка и периода"""
+        return self._windows[(market_type, period)].snapshot()
+
+    async def load_from_db(self):
+        """Заполняет окна новостями из базы за последнюю неделю"""
+        try:
+            time_ago = datetime.utcnow() - max(span for span, _ in FORECAST_WINDOWS.values())
+            async with async_session() as session:
+                result = await session.stream(
+                    select(
+                        News.id,
+                        News.timestamp,
+                        news_preview().label("translated_text"),
+                        news_direction_expr(self.tradfi_topics).label("direction"),
+                        News.importance,
+                        News.is_catalyst,
+                        News.market_target
+                    ).where(
+                        News.timestamp >= time_ago,
+                        News.duplicate_of_id.is_(None)
+                    ).order_by(News.timestamp)
+                )
+                count = 0
+                async for row in result.mappings():
+                    self.add_news(dict(row))
+                    count += 1
+
+            self.ready = True
+            logger.info(f"Окна прогноза загружены: {count} новостей")
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке окон прогноза: {e}")
+
+# Создаем экземпляр движка прогноза
+forecast_engine = RollingForecastEngine(settings.TRADFI_TOPICS)
+
 class MarketForecast:
     def __init__(self):
         self.tradfi_topics = set(settings.TRADFI_TOPICS)
         self.crypto_topics = set(settings.CRYPTO_TOPICS)
-    
+
+    async def _aggregate_from_db(self, time_ago: datetime, market_type: str) -> Tuple[int, int, List[Dict]]:
+        """Расчет данных для прогноза агрегирующими запросами к базе"""
+        conditions = (
+            News.timestamp >= time_ago,
+            News.market_target.in_([market_type, "BOTH"]),
+            News.duplicate_of_id.is_(None)
+        )
+        async with async_session() as session:
+            # Суммарный вес и взвешенная сумма направлений
+            total_weight, weighted_sum = (await session.execute(
+                select(
+                    func.coalesce(func.sum(News.importance), 0),
+                    func.coalesce(func.sum(News.importance * news_direction_expr(self.tradfi_topics)), 0)
+                ).where(*conditions)
+            )).one()
+
+            # Важные новости
+            rows = (await session.execute(
+                select(News.id, news_preview(), News.importance, News.is_catalyst)
+                .where(*conditions, is_key_news_expr())
+                .order_by(News.timestamp)
+            )).all()
+
+        key_news = [
+            {
+                "id": news_id,
+                "text": text or "",
+                "importance": importance,
+                "is_catalyst": bool(is_catalyst)
+            }
+            for news_id, text, importance, is_catalyst in rows
+        ]
+        return int(total_weight), int(weighted_sum), key_news
+
     async def generate_forecast(self, period: str, market_type: str) -> Optional[Dict]:
         """
         Генерирует прогноз для указанного рынка и периода
-        
+
         Args:
-            period: 'hour' или 'day'
-            market_type: 'TradFi' или 'Crypto'
+            period: 'hour', 'day' или 'week'
+            market_type: 'TRADFI' или 'CRYPTO'
         """
         try:
-            # Определяем временной интервал
+            if period not in FORECAST_WINDOWS:
+                period = "day"
             now = datetime.utcnow()
-            if period == "hour":
-                time_ago = now - timedelta(hours=1)
-            else:  # day
-                time_ago = now - timedelta(days=1)
-            
+
+            # Используем инкрементальные окна, а до их загрузки — запрос к базе
+            if forecast_engine.ready and market_type in MARKETS:
+                total_weight, weighted_sum, key_news = forecast_engine.snapshot(period, market_type)
+            else:
+                span, _ = FORECAST_WINDOWS[period]
+                total_weight, weighted_sum, key_news = await self._aggregate_from_db(now - span, market_type)
+
+            # Определяем состояние рынка
+            if total_weight == 0:
+                return None
+
+            sentiment = weighted_sum / total_weight
+
+            if sentiment > 0.3:
+                state = "bullish"
+            elif sentiment < -0.3:
+                state = "bearish"
+            else:
+                state = "neutral"
+
+            # Определяем уверенность
+            if len(key_news) >= 3:
+                confidence = "high"
+            elif len(key_news) >= 1:
+                confidence = "medium"
+            else:
+                confidence = "low"
+
+            # Сохраняем прогноз
             async with async_session() as session:
-                # Получаем новости за период
-                stmt = select(News).where(
-                    News.timestamp >= time_ago,
-                    News.market_target.in_([market_type, "Both"])
-                )
-                result = await session.execute(stmt)
-                news_list = result.scalars().all()
-                
-                if not news_list:
-                    return None
-                
-                # Анализируем новости
-                total_weight = 0
-                weighted_sum = 0
-                key_news = []
-                
-                for news in news_list:
-                    weight = news.importance
-                    total_weight += weight
-                    
-                    # Определяем направление влияния
-                    if news.topic in self.tradfi_topics:
-                        direction = 1 if "positive" in news.original_text.lower() else -1
-                    else:
-                        direction = 1 if "bullish" in news.original_text.lower() else -1
-                    
-                    weighted_sum += weight * direction
-                    
-                    # Добавляем важные новости
-                    if news.importance >= 4 or news.is_catalyst:
-                        key_news.append({
-                            "text": news.translated_text,
-                            "importance": news.importance,
-                            "is_catalyst": news.is_catalyst
-                        })
-                
-                # Определяем состояние рынка
-                if total_weight == 0:
-                    return None
-                
-                sentiment = weighted_sum / total_weight
-                
-                if sentiment > 0.3:
-                    state = "bullish"
-                elif sentiment < -0.3:
-                    state = "bearish"
-                else:
-                    state = "neutral"
-                
-                # Определяем уверенность
-                if len(key_news) >= 3:
-                    confidence = "high"
-                elif len(key_news) >= 1:
-                    confidence = "medium"
-                else:
-                    confidence = "low"
-                
-                # Сохраняем прогноз
                 forecast = Forecast(
                     market_type=market_type,
                     period=period,
                     state=state,
-                    confidence=confidence,
-                    key_news=str(key_news),
+                    confidence=CONFIDENCE_SCORES[confidence],
+                    key_news_ids=json.dumps([news["id"] for news in key_news]),
                     generated_at=now
                 )
                 session.add(forecast)
                 await session.commit()
-                
-                return {
-                    "market_type": market_type,
-                    "period": period,
-                    "state": state,
-                    "confidence": confidence,
-                    "key_news": key_news
-                }
-                
+
+            return {
+                "market_type": market_type,
+                "period": period,
+                "state": state,
+                "confidence": confidence,
+                "key_news": key_news
+            }
+
         except Exception as e:
             logger.error(f"Ошибка при генерации прогноза: {e}")
             return None
-    
+
     async def get_latest_forecast(self, market_type: str) -> Optional[Dict]:
         """Получает последний прогноз для указанного рынка"""
         try:
@@ -118,21 +325,92 @@ class MarketForecast:
                 stmt = select(Forecast).where(
                     Forecast.market_type == market_type
                 ).order_by(Forecast.generated_at.desc()).limit(1)
-                
+
                 result = await session.execute(stmt)
                 forecast = result.scalar_one_or_none()
-                
+
                 if forecast:
+                    confidence = min(
+                        CONFIDENCE_SCORES,
+                        key=lambda level: abs(CONFIDENCE_SCORES[level] - forecast.confidence)
+                    )
                     return {
                         "market_type": forecast.market_type,
                         "period": forecast.period,
                         "state": forecast.state,
-                        "confidence": forecast.confidence,
-                        "key_news": eval(forecast.key_news),
+                        "confidence": confidence,
+                        "key_news_ids": json.loads(forecast.key_news_ids or "[]"),
                         "generated_at": forecast.generated_at
                     }
                 return None
-                
+
         except Exception as e:
             logger.error(f"Ошибка при получении прогноза: {e}")
-            return None 
\ No newline at end of file
+            return None
+
+class ForecastRefresher:
+    """
+    Объединение и отложенный запуск пересчета прогнозов
+
+    Одновременные запросы прогноза для одного рынка и периода выполняются
+    одним вычислением. Пересчет по новым важным новостям выполняется
+    не чаще раза в interval секунд: новости, пришедшие в течение интервала,
+    учитываются одним пересчетом в его конце.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._flight = SingleFlight()
+        self._last_run: Dict[Tuple[str, str], float] = {}
+        self._scheduled: Dict[Tuple[str, str], asyncio.Task] = {}
+        self.requested = 0
+        self.generated = 0
+
+    async def generate(self, period: str, market_type: str) -> Optional[Dict]:
+        """Генерирует прогноз, присоединяясь к уже идущему вычислению"""
+        key = (period, market_type)
+
+        async def run():
+            self._last_run[key] = time.monotonic()
+            self.generated += 1
+            return await MarketForecast().generate_forecast(period, market_type)
+
+        return await self._flight.do(key, run)
+
+    def request(self, period: str, market_target: str):
+        """Запрашивает пересчет прогноза после новой новости"""
+        markets = MARKETS if market_target == "BOTH" else (market_target,)
+        for market in markets:
+            key = (period, market)
+            self.requested += 1
+            if key in self._scheduled:
+                continue
+            last_run = self._last_run.get(key)
+            delay = 0.0 if last_run is None else max(0.0, last_run + self.interval - time.monotonic())
+            self._scheduled[key] = asyncio.create_task(self._run_later(key, delay))
+
+    async def _run_later(self, key: Tuple[str, str], delay: float):
+        if delay:
+            await asyncio.sleep(delay)
+        # Новости, пришедшие во время расчета, запланируют следующий пересчет
+        self._scheduled.pop(key, None)
+        await self.generate(*key)
+
+    @traced("forecast_update")
+    def add_news(self, news: Dict[str, Any]):
+        """Пересчитывает прогноз после важной новости (обработчик add_news_listener)"""
+        if news.get("duplicate_of_id") or not news.get("importance"):
+            return
+        if is_key_news(news["importance"], news.get("is_catalyst")) and news.get("market_target"):
+            self.request("day", news["market_target"])
+
+    async def stop(self):
+        """Отменяет запланированные пересчеты"""
+        tasks = list(self._scheduled.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._scheduled.clear()
+
+# Создаем экземпляр планировщика прогнозов
+forecast_refresher = ForecastRefresher(settings.FORECAST_DEBOUNCE_SECONDS)
@@ -0,0 +1,86 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Ограничения Telegram на длину текста сообщения и подписи к медиа
+TELEGRAM_TEXT_LIMIT = 4096
+TELEGRAM_CAPTION_LIMIT = 1024
+TELEGRAM_ALBUM_LIMIT = 10  # медиа в одном альбоме
+
+# Длина фрагмента новости в дайджестах и прогнозах
+NEWS_PREVIEW_LENGTH = 100
+
+_SENTENCE_END_RE = re.compile(r"[.!?…](?:[\"»)\]]*)(?=\s)")
+
+def format_news_post(translated: str, analysis: Optional[Dict]) -> str:
+    """Формирует текст публикации новости в целевом канале"""
+    if not analysis:
+        return f"📰 {translated}"
+    return (
+        f"📰 {translated}\n\n"
+        f"Тема: {analysis['topic']}\n"
+        f"Важность: {analysis['importance']}/5\n"
+        f"Катализатор: {'Да' if analysis['is_catalyst'] else 'Нет'}"
+    )
+
+def format_digest(period: str, digest: Dict) -> str:
+    """Формирует текст дайджеста новостей за период"""
+    text = f"📰 Дайджест новостей за {period}:\n\n"
+    for topic in digest["topics"]:
+        text += f"📌 {topic['topic']} ({topic['count']}):\n"
+        for item in topic["items"]:
+            text += f"- {item['text']}...\n"
+            if item["importance"] >= 4:
+                text += "  ⚠️ Важная новость!\n"
+            if item["is_catalyst"]:
+                text += "  🔥 Катализатор рынка!\n"
+        text += "\n"
+    return text
+
+def complete_sentences(text: str) -> str:
+    """Возвращает начало текста, состоящее только из законченных предложений"""
+    end = 0
+    for match in _SENTENCE_END_RE.finditer(text):
+        end = match.end()
+    return text[:end].strip()
+
+def split_caption(
+    text: str,
+    caption_limit: int = TELEGRAM_CAPTION_LIMIT,
+    limit: int = TELEGRAM_TEXT_LIMIT
+) -> Tuple[str, List[str]]:
+    """
+    Делит текст на подпись к медиа и продолжение
+
+    Returns:
+        Подпись не длиннее caption_limit и части продолжения для отдельных
+        сообщений (пустой список, если текст помещается в подпись)
+    """
+    text = text.strip()
+    if len(text) <= caption_limit:
+        return text, []
+    caption = split_text(text, caption_limit)[0]
+    return caption, split_text(text[len(caption):], limit)
+
+def split_text(text: str, limit: int) -> List[str]:
+    """
+    Разбивает текст на части не длиннее limit символов
+
+    Разрыв ищется по абзацам, затем по концам предложений, затем по пробелам.
+    """
+    parts = []
+    text = text.strip()
+    while len(text) > limit:
+        chunk = text[:limit]
+        cut = chunk.rfind("\n\n")
+        if cut < limit // 2:
+            sentence_end = complete_sentences(chunk + " ")
+            cut = len(sentence_end) if len(sentence_end) >= limit // 2 else -1
+        if cut < limit // 2:
+            cut = chunk.rfind(" ")
+        if cut <= 0:
+            cut = limit
+        parts.append(text[:cut].strip())
+        text = text[cut:].strip()
+    if text:
+        parts.append(text)
+    return parts
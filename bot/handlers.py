@@ -1,19 +1,31 @@
+import asyncio
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
+from typing import List
 from aiogram import Router, F
-from aiogram.types import Message
+from aiogram.types import Message, InputMediaPhoto
 from aiogram.filters import Command
 from sqlalchemy import select, func
-from .database import async_session
+from .database import async_session, save_news, news_exists
 from .models import News, DigestLog, Forecast
-from .openrouter_client import analyze_news_full, translate_news
-from .forecast import MarketForecast
+from .openrouter_client import analyze_and_translate_news, analyze_news_full, ProviderUnavailableError
+from .formatting import TELEGRAM_ALBUM_LIMIT, TELEGRAM_TEXT_LIMIT, format_news_post, split_caption, split_text
+from .progressive import ProgressivePublisher, stream_translation
+from .publisher import publisher, publish_priority
+from .albums import AlbumAggregator, album_primary
+from .media_handler import media_handler
+from .metrics import stage_latency_report
+from .tracing import trace_message
+from .forecast import forecast_refresher
+from .digest import DIGEST_PERIODS, digest_materializer
 from .config import settings
 
 logger = logging.getLogger(__name__)
 
 def register_handlers(dp: Router):
     """Настройка обработчиков команд"""
+    # Каждое входящее сообщение обрабатывается в своей трассе
+    dp.message.outer_middleware(trace_message)
     dp.message.register(cmd_start, Command(commands=["start"]))
     dp.message.register(cmd_help, Command(commands=["help"]))
     dp.message.register(cmd_status, Command(commands=["status"]))
@@ -71,6 +83,11 @@ async def cmd_status(message: Message):
                 f"⏰ Время сервера: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC"
             )
             
+            # Длительность этапов обработки по последним новостям
+            latency = stage_latency_report()
+            if latency:
+                status_text += f"\n\n⏱ Длительность этапов:\n{latency}"
+            
             await message.answer(status_text)
             
     except Exception as e:
@@ -84,63 +101,23 @@ async def cmd_digest(message: Message):
         args = message.text.split()
         period = args[1] if len(args) > 1 else "day"
         
-        if period not in ["hour", "day", "week"]:
+        if period not in DIGEST_PERIODS:
             await message.answer(
                 "❌ Неверный период. Используйте: hour, day, week"
             )
             return
         
-        # Вычисляем время начала периода
-        now = datetime.utcnow()
-        if period == "hour":
-            time_ago = now - timedelta(hours=1)
-        elif period == "day":
-            time_ago = now - timedelta(days=1)
-        else:  # week
-            time_ago = now - timedelta(weeks=1)
+        # Берем рассчитанный дайджест
+        entry = await digest_materializer.get(period)
         
-        async with async_session() as session:
-            # Получаем новости за период
-            stmt = select(News).where(News.timestamp >= time_ago)
-            result = await session.execute(stmt)
-            news_list = result.scalars().all()
-            
-            if not news_list:
-                await message.answer("📭 Нет новостей за указанный период")
-                return
-            
-            # Группируем новости по темам
-            topics = {}
-            for news in news_list:
-                if news.topic:
-                    if news.topic not in topics:
-                        topics[news.topic] = []
-                    topics[news.topic].append(news)
-            
-            # Формируем дайджест
-            digest_text = f"📰 Дайджест новостей за {period}:\n\n"
-            for topic, news in topics.items():
-                digest_text += f"📌 {topic}:\n"
-                for n in news:
-                    digest_text += f"- {n.translated_text[:100]}...\n"
-                    if n.importance >= 4:
-                        digest_text += "  ⚠️ Важная новость!\n"
-                    if n.is_catalyst:
-                        digest_text += "  🔥 Катализатор рынка!\n"
-                digest_text += "\n"
-            
-            # Сохраняем лог дайджеста
-            log = DigestLog(
-                period=period,
-                news_count=len(news_list),
-                topics_count=len(topics),
-                generated_at=now
-            )
-            session.add(log)
-            await session.commit()
-            
-            # Отправляем дайджест
-            await message.answer(digest_text)
+        if not entry["digest"]["news_count"]:
+            await message.answer("📭 Нет новостей за указанный период")
+            return
+        
+        # Отправляем дайджест
+        for part in split_text(entry["text"], TELEGRAM_TEXT_LIMIT):
+            await message.answer(part)
+        await digest_materializer.log_delivery(period, entry)
             
     except Exception as e:
         logger.error(f"Ошибка при генерации дайджеста: {e}")
@@ -160,8 +137,7 @@ async def cmd_forecast(message: Message):
             return
         
         # Генерируем прогноз
-        forecast = MarketForecast()
-        result = await forecast.generate_forecast("day", market_type)
+        result = await forecast_refresher.generate("day", market_type)
         
         if not result:
             await message.answer("📭 Недостаточно данных для прогноза")
@@ -193,109 +169,200 @@ async def handle_message(message: Message):
         if str(message.chat.id) not in settings.SOURCE_CHANNEL_IDS:
             return
         
-        # Анализируем новость
-        analysis = await analyze_news_full(message.text)
+        # Длинные новости переводим потоком и публикуем по мере перевода
+        if settings.STREAMING_TRANSLATION and len(message.text) >= settings.STREAMING_MIN_LENGTH:
+            await publish_streaming(message)
+            return
+        
+        # Анализируем и переводим новость
+        analysis, translated = await analyze_and_translate_news(message.text)
+        
         if not analysis:
             logger.error("Не удалось проанализировать новость")
             return
         
-        # Переводим новость
-        translated = await translate_news(message.text)
         if not translated:
             logger.error("Не удалось перевести новость")
             return
         
-        async with async_session() as session:
-            # Сохраняем новость
-            news = News(
-                source_channel_id=message.chat.id,
-                message_id=message.message_id,
-                original_text=message.text,
-                translated_text=translated,
-                topic=analysis["topic"],
-                confidence=analysis["confidence"],
-                importance=analysis["importance"],
-                is_catalyst=analysis["is_catalyst"],
-                market_target=analysis["market_target"],
-                timestamp=datetime.utcnow()
-            )
-            session.add(news)
-            await session.commit()
-            
-            # Публикуем в целевой канал
-            if translated:
-                await message.bot.send_message(
-                    chat_id=settings.TARGET_CHANNEL_ID,
-                    text=f"📰 {translated}\n\n"
-                         f"Тема: {analysis['topic']}\n"
-                         f"Важность: {analysis['importance']}/5\n"
-                         f"Катализатор: {'Да' if analysis['is_catalyst'] else 'Нет'}"
-                )
-            
-            # Если новость важная или катализатор, обновляем прогноз
-            if analysis["importance"] >= 4 or analysis["is_catalyst"]:
-                forecast = MarketForecast()
-                await forecast.generate_forecast("day", analysis["market_target"])
-            
+        # Сохраняем новость
+        news_id = await save_news(
+            source_channel_id=str(message.chat.id),
+            message_id=message.message_id,
+            original_text=message.text,
+            translated_text=translated,
+            topic=analysis["topic"],
+            confidence=analysis["confidence"],
+            importance=analysis["importance"],
+            is_catalyst=analysis["is_catalyst"],
+            market_target=analysis["market_target"],
+            timestamp=datetime.utcnow()
+        )
+        
+        # Повторно обработанное сообщение уже было опубликовано
+        if news_id is None:
+            return
+        
+        # Публикуем в целевой канал через очередь публикаций
+        publisher.submit(
+            settings.TARGET_CHANNEL_ID,
+            [lambda: message.bot.send_message(
+                chat_id=settings.TARGET_CHANNEL_ID,
+                text=format_news_post(translated, analysis)
+            )],
+            publish_priority(analysis)
+        )
+        
     except Exception as e:
         logger.error(f"Ошибка при обработке сообщения: {e}")
 
-async def handle_photo(message: Message):
-    """Обработчик фотографий"""
+async def publish_streaming(message: Message):
+    """
+    Публикует длинную новость с потоковым переводом
+    
+    Публикация идет до сохранения новости, поэтому повторно доставленное
+    сообщение проверяется заранее, а новость сохраняется и без анализа.
+    """
+    source_channel_id = str(message.chat.id)
+    if await news_exists(source_channel_id, message.message_id):
+        logger.info(f"Сообщение {message.message_id} из {source_channel_id} уже обработано")
+        return
+    
+    progressive = ProgressivePublisher(
+        send=lambda content: publisher.call(
+            settings.TARGET_CHANNEL_ID,
+            lambda: message.bot.send_message(
+                chat_id=settings.TARGET_CHANNEL_ID,
+                text=content
+            )
+        ),
+        edit=lambda sent, content: message.bot.edit_message_text(
+            text=content,
+            chat_id=settings.TARGET_CHANNEL_ID,
+            message_id=sent.message_id
+        )
+    )
+    analysis_task = asyncio.create_task(analyze_news_full(message.text))
     try:
-        # Проверяем, что сообщение из нужного канала
-        if str(message.chat.id) not in settings.SOURCE_CHANNEL_IDS:
+        translated = await stream_translation(message.text, progressive)
+        if not translated:
+            logger.error("Не удалось перевести новость")
             return
         
+        # Перевод уже в канале: без анализа публикация завершается как есть
+        try:
+            analysis = await analysis_task
+        except ProviderUnavailableError as e:
+            logger.warning(f"OpenRouter недоступен для анализа: {e}")
+            analysis = None
+        if not analysis:
+            logger.error("Не удалось проанализировать новость, публикуем без анализа")
+        await progressive.finish(format_news_post(translated, analysis))
+    finally:
+        analysis_task.cancel()
+    
+    # Новость сохраняется и без анализа, чтобы не опубликовать ее повторно
+    analysis = analysis or {}
+    await save_news(
+        source_channel_id=source_channel_id,
+        message_id=message.message_id,
+        original_text=message.text,
+        translated_text=translated,
+        topic=analysis.get("topic"),
+        confidence=analysis.get("confidence"),
+        importance=analysis.get("importance"),
+        is_catalyst=analysis.get("is_catalyst", False),
+        market_target=analysis.get("market_target"),
+        timestamp=datetime.utcnow()
+    )
+
+async def handle_photo(message: Message):
+    """Обработчик фотографий"""
+    # Проверяем, что сообщение из нужного канала
+    if str(message.chat.id) not in settings.SOURCE_CHANNEL_IDS:
+        return
+    
+    # Части альбома обрабатываются вместе, когда собраны все части
+    if photo_albums.add(message):
+        return
+    await process_photos([message])
+
+async def process_photos(messages: List[Message]):
+    """Анализирует подпись и публикует фото или альбом одной новостью"""
+    message = album_primary(messages)
+    try:
         caption = message.caption or ""
         if not caption:
             return
         
-        # Анализируем новость
-        analysis = await analyze_news_full(caption)
+        # Анализируем и переводим новость, фото сохраняем в хранилище параллельно
+        if settings.MEDIA_STORE_ENABLED:
+            (analysis, translated), media_path = await asyncio.gather(
+                analyze_and_translate_news(caption),
+                media_handler.handle_media(message)
+            )
+        else:
+            analysis, translated = await analyze_and_translate_news(caption)
+            media_path = None
         if not analysis:
             logger.error("Не удалось проанализировать новость")
             return
         
-        # Переводим новость
-        translated = await translate_news(caption)
         if not translated:
             logger.error("Не удалось перевести новость")
             return
         
-        async with async_session() as session:
-            # Сохраняем новость
-            news = News(
-                source_channel_id=message.chat.id,
-                message_id=message.message_id,
-                original_text=caption,
-                translated_text=translated,
-                topic=analysis["topic"],
-                confidence=analysis["confidence"],
-                importance=analysis["importance"],
-                is_catalyst=analysis["is_catalyst"],
-                market_target=analysis["market_target"],
-                media_path=message.photo[-1].file_id,
-                timestamp=datetime.utcnow()
-            )
-            session.add(news)
-            await session.commit()
-            
-            # Публикуем в целевой канал
-            if translated:
-                await message.bot.send_photo(
+        # Сохраняем новость
+        news_id = await save_news(
+            source_channel_id=str(message.chat.id),
+            message_id=message.message_id,
+            original_text=caption,
+            translated_text=translated,
+            topic=analysis["topic"],
+            confidence=analysis["confidence"],
+            importance=analysis["importance"],
+            is_catalyst=analysis["is_catalyst"],
+            market_target=analysis["market_target"],
+            media_path=media_path or message.photo[-1].file_id,
+            timestamp=datetime.utcnow()
+        )
+        
+        # Повторно обработанное сообщение уже было опубликовано
+        if news_id is None:
+            return
+        
+        # Публикуем фото (альбом) с текстом в подписи через очередь публикаций
+        if translated:
+            caption, rest = split_caption(format_news_post(translated, analysis))
+            if len(messages) > 1:
+                steps = []
+                for index in range(0, len(messages), TELEGRAM_ALBUM_LIMIT):
+                    media = [
+                        InputMediaPhoto(
+                            media=part.photo[-1].file_id,
+                            caption=caption if index == 0 and position == 0 else None
+                        )
+                        for position, part in enumerate(messages[index:index + TELEGRAM_ALBUM_LIMIT])
+                    ]
+                    steps.append(lambda media=media: message.bot.send_media_group(
+                        chat_id=settings.TARGET_CHANNEL_ID,
+                        media=media
+                    ))
+            else:
+                steps = [lambda: message.bot.send_photo(
                     chat_id=settings.TARGET_CHANNEL_ID,
                     photo=message.photo[-1].file_id,
-                    caption=f"📰 {translated}\n\n"
-                            f"Тема: {analysis['topic']}\n"
-                            f"Важность: {analysis['importance']}/5\n"
-                            f"Катализатор: {'Да' if analysis['is_catalyst'] else 'Нет'}"
-                )
-            
-            # Если новость важная или катализатор, обновляем прогноз
-            if analysis["importance"] >= 4 or analysis["is_catalyst"]:
-                forecast = MarketForecast()
-                await forecast.generate_forecast("day", analysis["market_target"])
-            
+                    caption=caption
+                )]
+            for part in rest:
+                steps.append(lambda part=part: message.bot.send_message(
+                    chat_id=settings.TARGET_CHANNEL_ID,
+                    text=part
+                ))
+            publisher.submit(settings.TARGET_CHANNEL_ID, steps, publish_priority(analysis))
+        
     except Exception as e:
-        logger.error(f"Ошибка при обработке фото: {e}") 
\ No newline at end of file
+        logger.error(f"Ошибка при обработке фото: {e}")
+
+# Создаем экземпляр сборщика альбомов
+photo_albums = AlbumAggregator(process_photos, wait=settings.ALBUM_WAIT_MS / 1000)
\ No newline at end of file
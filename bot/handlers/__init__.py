@@ -1,8 +1,11 @@
 from aiogram import Dispatcher
 from . import status, digest, post
+from ..tracing import trace_message
 
 def register_handlers(dp: Dispatcher):
     """Регистрация всех обработчиков"""
+    # Каждое входящее сообщение обрабатывается в своей трассе
+    dp.message.outer_middleware(trace_message)
     dp.include_router(status.router)
     dp.include_router(digest.router)
     dp.include_router(post.router) 
\ No newline at end of file
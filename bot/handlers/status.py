@@ -6,6 +6,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..database import async_session
 from ..models import News, DigestLog
+from ..metrics import stage_latency_report
 
 router = Router()
 
@@ -26,4 +27,9 @@ async def cmd_status(message: Message):
             f"📨 Отправлено дайджестов: {digest_count}"
         )
         
+        # Длительность этапов обработки по последним новостям
+        latency = stage_latency_report()
+        if latency:
+            response += f"\n\n⏱ Длительность этапов:\n{latency}"
+        
         await message.answer(response) 
\ No newline at end of file
@@ -0,0 +1,241 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from sqlalchemy import select, delete, func
+from .database import async_session
+from .models import SpilledMessage
+
+logger = logging.getLogger(__name__)
+
+# Политики переполнения очереди
+OVERFLOW_BLOCK = "block"  # ждать освобождения места (обратное давление на источник)
+OVERFLOW_DROP_OLDEST = "drop_oldest"  # вытеснять самое старое сообщение в очереди
+OVERFLOW_SPILL = "spill"  # сохранять сообщение в базу и дочитывать позже
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_SPILL)
+
+class IngestionQueue:
+    """
+    Ограниченная очередь входящих сообщений с пулом обработчиков
+
+    Каждый канал закреплен за одним обработчиком, поэтому сообщения
+    одного канала обрабатываются строго по порядку, а разные каналы —
+    параллельно. Размер очереди ограничен, при переполнении применяется
+    одна из политик OVERFLOW_POLICIES.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Any], Awaitable[None]],
+        workers: int,
+        max_size: int,
+        overflow: str = OVERFLOW_BLOCK,
+        fetch_messages: Optional[Callable[[str, List[int]], Awaitable[List[Any]]]] = None,
+        on_drop: Optional[Callable[[Any], None]] = None,
+        on_missing: Optional[Callable[[str, int], None]] = None,
+        name: str = "ingest"
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Неизвестная политика переполнения: {overflow}")
+        if overflow == OVERFLOW_SPILL and fetch_messages is None:
+            raise ValueError("Для политики spill нужна функция fetch_messages")
+
+        self.handler = handler
+        self.workers = workers
+        self.max_size = max_size
+        self.overflow = overflow
+        self.fetch_messages = fetch_messages
+        self.on_drop = on_drop
+        self.on_missing = on_missing
+        self.name = name
+        self._queues = [
+            asyncio.Queue(maxsize=max(1, max_size // workers))
+            for _ in range(workers)
+        ]
+        self._tasks: List[asyncio.Task] = []
+        self._parked_tasks = set()
+        self._spilled = 0
+
+        # Статистика стадии
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.parked = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def depth(self) -> int:
+        """Текущее количество сообщений в очереди"""
+        return sum(q.qsize() for q in self._queues)
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        """Статистика очереди: глубина, время ожидания и счетчики"""
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "pending_spill": self._spilled,
+            "parked": len(self._parked_tasks),
+            "avg_wait": self.total_wait / self.processed if self.processed else 0.0,
+            "max_wait": self.max_wait
+        }
+
+    async def start(self):
+        """Запускает обработчики очереди"""
+        if self._tasks:
+            return
+        for index in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(index)))
+        if self.overflow == OVERFLOW_SPILL:
+            self._spilled = await self._count_spilled()
+            self._tasks.append(asyncio.create_task(self._drain_spill()))
+        logger.info(f"Очередь {self.name} запущена: {self.workers} обработчиков")
+
+    async def stop(self):
+        """Останавливает обработчики очереди"""
+        tasks = [*self._tasks, *self._parked_tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._parked_tasks.clear()
+
+    def park(self, message, delay: float):
+        """
+        Откладывает сообщение и возвращает его в очередь через delay секунд
+
+        Используется, когда внешний сервис временно недоступен.
+        """
+        async def requeue():
+            await asyncio.sleep(delay)
+            await self.put(message)
+
+        task = asyncio.create_task(requeue())
+        self._parked_tasks.add(task)
+        task.add_done_callback(self._parked_tasks.discard)
+        self.parked += 1
+
+    async def join(self):
+        """Ожидает обработки всех сообщений в очереди"""
+        for queue in self._queues:
+            await queue.join()
+
+    def _queue_for(self, message) -> asyncio.Queue:
+        return self._queues[hash(message.chat_id) % self.workers]
+
+    async def put(self, message):
+        """Добавляет сообщение в очередь с учетом политики переполнения"""
+        queue = self._queue_for(message)
+
+        if self.overflow == OVERFLOW_SPILL and (self._spilled or queue.full()):
+            # Пока в базе есть отложенные сообщения, новые тоже откладываем,
+            # чтобы не нарушить порядок внутри канала
+            await self._spill(message)
+            return
+
+        if queue.full() and self.overflow == OVERFLOW_DROP_OLDEST:
+            _, dropped = queue.get_nowait()
+            queue.task_done()
+            self.dropped += 1
+            logger.warning(
+                f"Очередь {self.name} переполнена, сообщение {dropped.id} "
+                f"из {dropped.chat_id} отброшено"
+            )
+            if self.on_drop is not None:
+                self.on_drop(dropped)
+
+        await queue.put((time.monotonic(), message))
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, self.depth)
+
+    async def _worker(self, index: int):
+        queue = self._queues[index]
+        while True:
+            enqueued_at, message = await queue.get()
+            try:
+                wait = time.monotonic() - enqueued_at
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+                await self.handler(message)
+            except Exception as e:
+                logger.error(f"Ошибка в обработчике очереди {self.name}: {e}")
+            finally:
+                self.processed += 1
+                queue.task_done()
+
+    async def _spill(self, message):
+        async with async_session() as session:
+            session.add(SpilledMessage(
+                source_channel_id=str(message.chat_id),
+                message_id=message.id
+            ))
+            await session.commit()
+        self._spilled += 1
+        self.spilled += 1
+
+    async def _count_spilled(self) -> int:
+        async with async_session() as session:
+            return await session.scalar(select(func.count(SpilledMessage.id)))
+
+    async def _drain_spill(self, batch_size: int = 50):
+        """Возвращает отложенные сообщения в очередь, когда в ней есть место"""
+        while True:
+            try:
+                if not self._spilled or self.depth > self.max_size // 2:
+                    await asyncio.sleep(1)
+                    continue
+
+                async with async_session() as session:
+                    rows = (await session.execute(
+                        select(SpilledMessage)
+                        .order_by(SpilledMessage.id)
+                        .limit(batch_size)
+                    )).scalars().all()
+                    if not rows:
+                        self._spilled = 0
+                        continue
+
+                    # Группируем по каналам, сохраняя порядок
+                    by_channel: Dict[str, List[SpilledMessage]] = {}
+                    for row in rows:
+                        by_channel.setdefault(row.source_channel_id, []).append(row)
+
+                    for channel_id, channel_rows in by_channel.items():
+                        message_ids = [row.message_id for row in channel_rows]
+                        messages = await self.fetch_messages(channel_id, message_ids)
+                        for message_id, message in zip(message_ids, messages):
+                            if message is None:
+                                # Удаленное или недоступное сообщение больше не придет:
+                                # его нужно освободить, чтобы не держать контрольную точку
+                                self.dropped += 1
+                                logger.warning(
+                                    f"Отложенное сообщение {message_id} из {channel_id} недоступно, пропускаем"
+                                )
+                                if self.on_missing is not None:
+                                    self.on_missing(channel_id, message_id)
+                                continue
+                            queue = self._queue_for(message)
+                            await queue.put((time.monotonic(), message))
+                            self.enqueued += 1
+
+                        # Строки удаляются по каналам, чтобы ошибка следующего
+                        # канала не поставила эти сообщения в очередь повторно
+                        await session.execute(
+                            delete(SpilledMessage).where(
+                                SpilledMessage.id.in_([row.id for row in channel_rows])
+                            )
+                        )
+                        await session.commit()
+                        self._spilled = max(0, self._spilled - len(channel_rows))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка при чтении отложенных сообщений: {e}")
+                await asyncio.sleep(5)
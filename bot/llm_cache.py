@@ -0,0 +1,177 @@
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+from sqlalchemy import delete
+from .config import settings
+from .database import async_session
+from .models import LLMCacheEntry
+from .metrics import LLM_CACHE_REQUESTS
+from .singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def normalize_text(text: str) -> str:
+    """Нормализует текст для кэширования: регистр и пробельные символы"""
+    return _WHITESPACE_RE.sub(" ", text).strip().lower()
+
+def make_cache_key(text: str, model: str, prompt_version: str, *parts: str) -> str:
+    """
+    Формирует ключ кэша по содержимому запроса
+
+    Args:
+        text: Текст новости
+        model: Модель OpenRouter
+        prompt_version: Версия промпта
+        parts: Дополнительные параметры запроса (например, стиль перевода)
+    """
+    payload = "\x1f".join([normalize_text(text), model, prompt_version, *parts])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class LLMCache:
+    """
+    Двухуровневый кэш ответов LLM
+
+    Первый уровень — LRU в памяти процесса с ограничением размера и TTL.
+    Второй уровень (необязательный) — таблица llm_cache в базе данных,
+    переживающая перезапуски бота. Одновременные промахи с одним ключом
+    в get_or_compute объединяются в один запрос к LLM.
+    """
+
+    def __init__(self, max_size: int, ttl: int, persistent: bool):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.persistent = persistent
+        self._entries: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Возвращает значение из кэша или None"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                LLM_CACHE_REQUESTS.inc(result="hit")
+                return value
+            del self._entries[key]
+
+        if self.persistent:
+            value = await self._get_persistent(key)
+            if value is not None:
+                self._put(key, value)
+                self.persistent_hits += 1
+                LLM_CACHE_REQUESTS.inc(result="hit")
+                return value
+
+        self.misses += 1
+        LLM_CACHE_REQUESTS.inc(result="miss")
+        return None
+
+    async def set(self, key: str, value: Any):
+        """Сохраняет значение в кэш"""
+        self._put(key, value)
+        if self.persistent:
+            await self._set_persistent(key, value)
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool] = lambda value: value is not None
+    ) -> Any:
+        """
+        Возвращает значение из кэша или вычисляет его через compute
+
+        Пока значение по ключу вычисляется, повторные вызовы с тем же ключом
+        ожидают его, а не вызывают compute заново. В кэш сохраняются
+        только значения, для которых cacheable возвращает True.
+        """
+        return await self._flight.do(key, lambda: self._get_or_compute(key, compute, cacheable))
+
+    async def _get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool]
+    ) -> Any:
+        value = await self.get(key)
+        if value is not None:
+            return value
+        value = await compute()
+        if cacheable(value):
+            await self.set(key, value)
+        return value
+
+    def _put(self, key: str, value: Any):
+        self._entries[key] = (time.time() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def _get_persistent(self, key: str) -> Optional[Any]:
+        try:
+            async with async_session() as session:
+                entry = await session.get(LLMCacheEntry, key)
+                if entry is None:
+                    return None
+                if entry.created_at < datetime.utcnow() - timedelta(seconds=self.ttl):
+                    return None
+                return json.loads(entry.value)
+        except Exception as e:
+            logger.error(f"Ошибка при чтении кэша LLM из базы: {e}")
+            return None
+
+    async def _set_persistent(self, key: str, value: Any):
+        try:
+            async with async_session() as session:
+                await session.merge(LLMCacheEntry(
+                    key=key,
+                    value=json.dumps(value, ensure_ascii=False),
+                    created_at=datetime.utcnow()
+                ))
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Ошибка при записи кэша LLM в базу: {e}")
+
+    async def purge_expired(self):
+        """Удаляет из базы устаревшие записи кэша"""
+        if not self.persistent:
+            return
+        try:
+            async with async_session() as session:
+                await session.execute(
+                    delete(LLMCacheEntry).where(
+                        LLMCacheEntry.created_at < datetime.utcnow() - timedelta(seconds=self.ttl)
+                    )
+                )
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Ошибка при очистке кэша LLM: {e}")
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Счетчики попаданий и промахов кэша"""
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses
+        }
+
+# Создаем экземпляр кэша
+llm_cache = LLMCache(
+    max_size=settings.LLM_CACHE_SIZE,
+    ttl=settings.LLM_CACHE_TTL,
+    persistent=settings.LLM_CACHE_PERSISTENT
+)
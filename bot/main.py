@@ -5,26 +5,81 @@ from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
 from .config import settings
-from .database import init_db
+from .database import init_db, add_news_listener, news_writer
+from .forecast import forecast_engine, forecast_refresher
+from .digest import digest_materializer
 from .handlers import register_handlers
-from .parser import start_parser
+from .openrouter_client import init_session, close_session
+from .llm_cache import llm_cache
+from .media_store import media_store
+from .media_handler import media_handler
+from .parser import parser, start_parser
+from .dedup import dedup_index
+from .cluster import news_tailer, MODES, MODE_ALL, MODE_FRONT, MODE_WORKER
+from .metrics import metrics_server
+from .tracing import tracer, TraceIdFilter
 
 # Настройка логирования
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    format="%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s",
     stream=sys.stdout
 )
+# Записи журнала о новости помечаются ID ее трассы
+for handler in logging.getLogger().handlers:
+    handler.addFilter(TraceIdFilter())
 
 logger = logging.getLogger(__name__)
 
 async def main():
     """Основная функция запуска бота"""
+    if settings.BOT_MODE not in MODES:
+        raise ValueError(f"Неизвестный режим работы BOT_MODE={settings.BOT_MODE}, допустимы: {', '.join(MODES)}")
     try:
         # Инициализируем базу данных
         await init_db()
         logger.info("База данных инициализирована")
         
+        # Запускаем HTTP-сервер метрик
+        await metrics_server.start()
+        
+        # Запускаем выгрузку спанов трассировки
+        tracer.start()
+        
+        # Удаляем устаревшие записи кэша LLM
+        await llm_cache.purge_expired()
+        
+        # Загружаем индекс хранилища медиа и запускаем его обслуживание
+        if settings.MEDIA_STORE_ENABLED:
+            await media_store.load()
+            media_store.start()
+        
+        if settings.BOT_MODE == MODE_WORKER:
+            # Обработчик без бота: индекс дубликатов пополняется и новостями
+            # других обработчиков
+            add_news_listener(dedup_index.add_news)
+            await news_tailer.start()
+            await init_session()
+            logger.info(f"Обработчик {settings.worker_id} запущен")
+            await start_parser()
+            return
+        
+        # Загружаем окна прогноза и подписываем их на новые новости
+        await forecast_engine.load_from_db()
+        add_news_listener(forecast_engine.add_news)
+        add_news_listener(forecast_refresher.add_news)
+        
+        # Запускаем пересчет дайджестов по новым новостям и по расписанию
+        add_news_listener(digest_materializer.add_news)
+        digest_materializer.start()
+        
+        # Новости сохраняют процессы-обработчики, читаем их из базы
+        if settings.BOT_MODE == MODE_FRONT:
+            await news_tailer.start()
+        
+        # Открываем пул соединений к OpenRouter
+        await init_session()
+        
         # Создаем бота
         bot = Bot(
             token=settings.TELEGRAM_BOT_TOKEN,
@@ -39,8 +94,9 @@ async def main():
         logger.info("Обработчики зарегистрированы")
         
         # Запускаем парсер в отдельной задаче
-        asyncio.create_task(start_parser())
-        logger.info("Парсер запущен")
+        if settings.BOT_MODE == MODE_ALL:
+            asyncio.create_task(start_parser())
+            logger.info("Парсер запущен")
         
         # Запускаем бота
         logger.info("Бот запущен")
@@ -49,6 +105,20 @@ async def main():
     except Exception as e:
         logger.error(f"Ошибка при запуске бота: {e}")
         raise
+    finally:
+        await news_tailer.stop()
+        if settings.BOT_MODE in (MODE_ALL, MODE_WORKER):
+            await parser.stop()
+        # Дописываем накопленные новости
+        await news_writer.flush()
+        await digest_materializer.stop()
+        await forecast_refresher.stop()
+        if settings.MEDIA_STORE_ENABLED:
+            await media_store.stop()
+        await media_handler.close()
+        await close_session()
+        await metrics_server.stop()
+        await tracer.stop()
 
 if __name__ == "__main__":
     try:
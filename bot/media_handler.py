@@ -1,66 +1,147 @@
-import os
+import asyncio
 import aiohttp
 import structlog
-from typing import Optional, List
+from typing import AsyncIterator, Optional, List, Tuple
+from telethon import utils
+from telethon.tl.types import MessageMediaPhoto, MessageMediaDocument
 from aiogram.types import Message
 from .config import settings
+from .media_store import MediaStore, media_store
 
 logger = structlog.get_logger()
 
+# Расширения файлов по типу медиа
+MEDIA_SUFFIXES = {
+    "photo": ".jpg",
+    "video": ".mp4",
+    "animation": ".mp4",
+    "document": ""
+}
+
+def telethon_unique_id(media) -> Optional[str]:
+    """Постоянный идентификатор медиа Telethon (не меняется при пересылке)"""
+    if isinstance(media, MessageMediaPhoto) and media.photo:
+        return f"photo:{media.photo.id}"
+    if isinstance(media, MessageMediaDocument) and media.document:
+        return f"document:{media.document.id}"
+    return None
+
 class MediaHandler:
-    def __init__(self):
-        self.media_dir = "media"
-        os.makedirs(self.media_dir, exist_ok=True)
-    
+    """
+    Передача медиафайлов
+
+    Медиа пересылается по file_id без скачивания. Если файл нужно
+    сохранить, он скачивается по частям и записывается в хранилище
+    с адресацией по содержимому, не удерживая весь файл в памяти.
+    """
+
+    def __init__(self, store: MediaStore = media_store):
+        self.store = store
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Одна сессия на все скачивания, чтобы переиспользовать соединения
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=None, sock_read=60)
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def media_reference(self, message: Message) -> Optional[Tuple[str, str, str]]:
+        """Тип медиа, file_id и file_unique_id сообщения"""
+        if message.photo:
+            # Фото с максимальным разрешением
+            photo = message.photo[-1]
+            return "photo", photo.file_id, photo.file_unique_id
+        for kind in ("video", "animation", "document"):
+            media = getattr(message, kind)
+            if media:
+                return kind, media.file_id, media.file_unique_id
+        return None
+
+    async def relay(self, message: Message, chat_id: str, caption: Optional[str] = None):
+        """Отправляет медиа сообщения в чат по file_id, не скачивая файл"""
+        reference = self.media_reference(message)
+        if reference is None:
+            return None
+        kind, file_id, _ = reference
+        send = getattr(message.bot, f"send_{kind}")
+        return await send(chat_id, file_id, caption=caption)
+
     async def handle_media(self, message: Message) -> Optional[str]:
-        """Обрабатывает медиафайлы из сообщения"""
+        """Сохраняет медиафайл сообщения в хранилище и возвращает путь к нему"""
         try:
-            if message.photo:
-                # Получаем фото с максимальным разрешением
-                photo = message.photo[-1]
-                file_id = photo.file_id
-                file = await message.bot.get_file(file_id)
-                file_path = file.file_path
-                
-                # Скачиваем файл
-                file_url = f"https://api.telegram.org/file/bot{settings.TELEGRAM_BOT_TOKEN}/{file_path}"
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(file_url) as response:
-                        if response.status == 200:
-                            # Сохраняем файл
-                            file_name = f"{file_id}.jpg"
-                            file_path = os.path.join(self.media_dir, file_name)
-                            with open(file_path, "wb") as f:
-                                f.write(await response.read())
-                            return file_path
-            
-            return None
+            reference = self.media_reference(message)
+            if reference is None:
+                return None
+            kind, file_id, file_unique_id = reference
             
+            # Файл, уже сохраненный из другого сообщения, не скачиваем
+            unique_id = f"bot:{file_unique_id}"
+            path = self.store.lookup(unique_id)
+            if path is not None:
+                return path
+            file = await message.bot.get_file(file_id)
+
+            # Скачиваем файл по частям сразу в хранилище
+            file_url = f"https://api.telegram.org/file/bot{settings.TELEGRAM_BOT_TOKEN}/{file.file_path}"
+            async with self._get_session().get(file_url) as response:
+                if response.status != 200:
+                    logger.error("Failed to download media", status=response.status)
+                    return None
+                stored = await self.store.put_stream(
+                    response.content.iter_chunked(settings.MEDIA_CHUNK_SIZE),
+                    MEDIA_SUFFIXES[kind],
+                    unique_id
+                )
+            return stored["path"]
+
         except Exception as e:
             logger.error("Error handling media", error=str(e))
             return None
+
+    async def store_from_client(self, client, media) -> Optional[str]:
+        """Сохраняет медиа Telethon в хранилище, скачивая его по частям"""
+        try:
+            unique_id = telethon_unique_id(media)
+            if unique_id is not None:
+                path = self.store.lookup(unique_id)
+                if path is not None:
+                    return path
+            chunks: AsyncIterator[bytes] = client.iter_download(media, request_size=settings.MEDIA_CHUNK_SIZE)
+            stored = await self.store.put_stream(chunks, utils.get_extension(media), unique_id)
+            return stored["path"]
+        except Exception as e:
+            logger.error("Error storing media", error=str(e))
+            return None
     
     async def download_media(self, file_path: str) -> Optional[bytes]:
         """Скачивает медиафайл по URL"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(file_path) as response:
-                    if response.status == 200:
-                        return await response.read()
-                    else:
-                        logger.error("Failed to download media", 
-                                   status=response.status)
-                        return None
+            async with self._get_session().get(file_path) as response:
+                if response.status == 200:
+                    return await response.read()
+                else:
+                    logger.error("Failed to download media", 
+                               status=response.status)
+                    return None
         except Exception as e:
             logger.error("Error downloading media", error=str(e))
             return None
     
     async def handle_media_group(self, messages: List[Message]) -> List[str]:
-        """Обрабатывает группу медиафайлов (альбом)"""
-        media_urls = []
-        for message in messages:
-            if message.media_group_id:
-                url = await self.handle_media(message)
-                if url:
-                    media_urls.append(url)
-        return media_urls 
\ No newline at end of file
+        """Обрабатывает группу медиафайлов (альбом), части скачиваются параллельно"""
+        results = await asyncio.gather(*(
+            self.handle_media(message)
+            for message in messages
+            if message.media_group_id
+        ))
+        return [url for url in results if url]
+
+# Создаем экземпляр обработчика медиа
+media_handler = MediaHandler()
@@ -0,0 +1,302 @@
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+from sqlalchemy import select, delete, update, bindparam
+from .config import settings
+from .database import async_session, upsert_insert
+from .models import MediaFile, MediaAlias
+
+logger = logging.getLogger(__name__)
+
+# Недописанные файлы моложе этого возраста могут еще записываться, секунды
+PARTIAL_FILE_TTL = 3600
+
+class MediaStore:
+    """
+    Хранилище медиафайлов с адресацией по содержимому
+
+    Файл сохраняется под именем SHA-256 своего содержимого
+    (root/ab/abcdef...), поэтому одинаковые файлы из разных сообщений
+    хранятся один раз. Файл записывается по частям по мере скачивания,
+    запись выполняется в отдельном потоке и не блокирует цикл событий.
+
+    Метаданные файлов хранятся в таблице media_files, идентификаторы
+    файлов Telegram (file_unique_id или ID медиа Telethon) — в таблице
+    media_aliases: по ним уже сохраненный файл находится без скачивания.
+    Когда общий размер превышает max_bytes, удаляются давно
+    не использованные файлы. Раз в compact_interval секунд сохраняется
+    время использования файлов и удаляются файлы без записи в индексе.
+    Пути в news.media_path на вытесненные файлы остаются в базе,
+    хранилище работает как кэш с ограниченным объемом.
+    """
+
+    def __init__(self, root: str, max_bytes: int, compact_interval: float):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.compact_interval = compact_interval
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._aliases: Dict[str, str] = {}
+        self._touched: Set[str] = set()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.total_bytes = 0
+        self.stored = 0
+        self.deduplicated = 0
+        self.alias_hits = 0
+        self.evicted = 0
+
+    def _path(self, content_hash: str, suffix: str = "") -> str:
+        return os.path.join(self.root, content_hash[:2], f"{content_hash}{suffix}")
+
+    async def load(self):
+        """Загружает индекс хранилища и удаляет записи о пропавших файлах"""
+        os.makedirs(self.root, exist_ok=True)
+        async with async_session() as session:
+            files = (await session.execute(
+                select(MediaFile.content_hash, MediaFile.path, MediaFile.size, MediaFile.last_used_at)
+            )).all()
+            aliases = (await session.execute(select(MediaAlias.unique_id, MediaAlias.content_hash))).all()
+
+        exists = await asyncio.to_thread(lambda: {row.content_hash: os.path.exists(row.path) for row in files})
+        missing = [content_hash for content_hash, found in exists.items() if not found]
+        self._files = {
+            row.content_hash: {
+                "path": row.path,
+                "size": row.size,
+                "used": row.last_used_at.replace(tzinfo=timezone.utc).timestamp() if row.last_used_at else 0.0
+            }
+            for row in files
+            if exists[row.content_hash]
+        }
+        self._aliases = {unique_id: content_hash for unique_id, content_hash in aliases if content_hash in self._files}
+        self.total_bytes = sum(item["size"] for item in self._files.values())
+        if missing:
+            await self._delete_rows(missing)
+        logger.info(
+            f"Хранилище медиа: {len(self._files)} файлов, {self.total_bytes / 2**20:.1f} МБ"
+            f"{f', удалено {len(missing)} записей о пропавших файлах' if missing else ''}"
+        )
+
+    def get(self, content_hash: str) -> Optional[str]:
+        """Путь к файлу по хэшу содержимого или None"""
+        item = self._files.get(content_hash)
+        if item is None:
+            return None
+        item["used"] = time.time()
+        self._touched.add(content_hash)
+        return item["path"]
+
+    def lookup(self, unique_id: str) -> Optional[str]:
+        """Путь к уже сохраненному файлу по идентификатору файла Telegram или None"""
+        content_hash = self._aliases.get(unique_id)
+        if content_hash is None:
+            return None
+        path = self.get(content_hash)
+        if path is not None:
+            self.alias_hits += 1
+        return path
+
+    async def put_stream(
+        self,
+        chunks: AsyncIterator[bytes],
+        suffix: str = "",
+        unique_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Сохраняет файл, получаемый по частям
+
+        Args:
+            chunks: части содержимого файла
+            suffix: расширение файла
+            unique_id: идентификатор файла Telegram для поиска без скачивания
+
+        Returns:
+            Словарь с хэшем содержимого, путем и размером файла
+        """
+        os.makedirs(self.root, exist_ok=True)
+        hasher = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+        file = os.fdopen(fd, "wb")
+        try:
+            async for chunk in chunks:
+                hasher.update(chunk)
+                size += len(chunk)
+                await asyncio.to_thread(file.write, chunk)
+            await asyncio.to_thread(file.close)
+        except BaseException:
+            file.close()
+            os.unlink(temp_path)
+            raise
+
+        content_hash = hasher.hexdigest()
+        async with self._lock:
+            path = self.get(content_hash)
+            if path is not None:
+                # Такой файл уже есть (например, тот же файл из другого канала)
+                os.unlink(temp_path)
+                self.deduplicated += 1
+            else:
+                path = self._path(content_hash, suffix)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temp_path, path)
+                self._files[content_hash] = {"path": path, "size": size, "used": time.time()}
+                self.total_bytes += size
+                self.stored += 1
+                await self._insert(content_hash, path, size)
+                await self._evict(keep=content_hash)
+            if unique_id is not None and unique_id not in self._aliases:
+                self._aliases[unique_id] = content_hash
+                await self._insert_alias(unique_id, content_hash)
+        return {"hash": content_hash, "path": path, "size": size}
+
+    async def _insert(self, content_hash: str, path: str, size: int):
+        now = datetime.utcnow()
+        async with async_session() as session:
+            await session.execute(
+                upsert_insert(MediaFile)
+                .values(content_hash=content_hash, path=path, size=size, created_at=now, last_used_at=now)
+                .on_conflict_do_nothing(index_elements=["content_hash"])
+            )
+            await session.commit()
+
+    async def _insert_alias(self, unique_id: str, content_hash: str):
+        async with async_session() as session:
+            await session.execute(
+                upsert_insert(MediaAlias)
+                .values(unique_id=unique_id, content_hash=content_hash)
+                .on_conflict_do_nothing(index_elements=["unique_id"])
+            )
+            await session.commit()
+
+    async def _delete_rows(self, hashes: List[str]):
+        async with async_session() as session:
+            await session.execute(delete(MediaAlias).where(MediaAlias.content_hash.in_(hashes)))
+            await session.execute(delete(MediaFile).where(MediaFile.content_hash.in_(hashes)))
+            await session.commit()
+
+    async def _evict(self, keep: Optional[str] = None):
+        """Удаляет давно не использованные файлы, пока размер хранилища выше лимита"""
+        if self.total_bytes <= self.max_bytes:
+            return
+        evicted = []
+        for content_hash, item in sorted(self._files.items(), key=lambda pair: pair[1]["used"]):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if content_hash == keep:
+                continue
+            try:
+                await asyncio.to_thread(os.unlink, item["path"])
+            except FileNotFoundError:
+                pass
+            del self._files[content_hash]
+            self._touched.discard(content_hash)
+            self.total_bytes -= item["size"]
+            evicted.append(content_hash)
+
+        if evicted:
+            evicted_set = set(evicted)
+            self._aliases = {
+                unique_id: content_hash
+                for unique_id, content_hash in self._aliases.items()
+                if content_hash not in evicted_set
+            }
+            await self._delete_rows(evicted)
+            self.evicted += len(evicted)
+            logger.info(f"Из хранилища медиа вытеснено {len(evicted)} файлов")
+
+    def _orphans(self) -> List[str]:
+        """
+        Файлы хранилища на диске без записи в индексе и давно брошенные
+        недописанные файлы; прочие файлы каталога не трогаются
+        """
+        known = {item["path"] for item in self._files.values()}
+        now = time.time()
+        orphans = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                if name.endswith(".part"):
+                    if now - os.path.getmtime(path) > PARTIAL_FILE_TTL:
+                        orphans.append(path)
+                elif path not in known and len(name.partition(".")[0]) == 64:
+                    orphans.append(path)
+        return orphans
+
+    async def compact(self):
+        """Сохраняет время использования файлов, соблюдает лимит и удаляет лишние файлы"""
+        touched, self._touched = self._touched, set()
+        rows = [
+            {"key": content_hash, "used": datetime.utcfromtimestamp(self._files[content_hash]["used"])}
+            for content_hash in touched
+            if content_hash in self._files
+        ]
+        if rows:
+            async with async_session() as session:
+                await session.execute(
+                    update(MediaFile.__table__)
+                    .where(MediaFile.__table__.c.content_hash == bindparam("key"))
+                    .values(last_used_at=bindparam("used")),
+                    rows
+                )
+                await session.commit()
+
+        async with self._lock:
+            await self._evict()
+            orphans = await asyncio.to_thread(self._orphans)
+            for path in orphans:
+                try:
+                    await asyncio.to_thread(os.unlink, path)
+                except FileNotFoundError:
+                    pass
+        if orphans:
+            logger.info(f"Из хранилища медиа удалено {len(orphans)} файлов без записи в индексе")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.compact_interval)
+            try:
+                await self.compact()
+            except Exception as e:
+                logger.error(f"Ошибка при обслуживании хранилища медиа: {e}")
+
+    def start(self):
+        """Запускает периодическое обслуживание хранилища"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Останавливает обслуживание и сохраняет время использования файлов"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.compact()
+        except Exception as e:
+            logger.error(f"Ошибка при обслуживании хранилища медиа: {e}")
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        """Статистика хранилища: файлы, размер, дубликаты и вытеснения"""
+        return {
+            "files": len(self._files),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "stored": self.stored,
+            "deduplicated": self.deduplicated,
+            "alias_hits": self.alias_hits,
+            "evicted": self.evicted
+        }
+
+# Создаем экземпляр хранилища медиа
+media_store = MediaStore(
+    settings.MEDIA_DIR,
+    settings.MEDIA_STORE_MAX_MB * 2**20,
+    settings.MEDIA_COMPACT_INTERVAL
+)
@@ -0,0 +1,307 @@
+import bisect
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple
+from aiohttp import web
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм длительности, секунды
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Количество последних наблюдений для расчета процентилей
+QUANTILE_WINDOW = 1024
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric:
+    """Базовый класс метрики с набором меток"""
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+            *self.samples()
+        ]
+
+class Counter(Metric):
+    """Монотонно растущий счетчик"""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+            for key, value in sorted(self._values.items())
+        ]
+
+class Gauge(Metric):
+    """Текущее значение (глубина очереди, занятые соединения)"""
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = float(value)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+            for key, value in sorted(self._values.items())
+        ]
+
+class Histogram(Metric):
+    """
+    Гистограмма длительностей
+
+    Кроме корзин для Prometheus хранит последние QUANTILE_WINDOW
+    наблюдений по каждому набору меток для расчета процентилей.
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+        self._recent: Dict[Tuple[str, ...], Deque[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            self._sums[key] = 0.0
+            self._recent[key] = deque(maxlen=QUANTILE_WINDOW)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[key] += value
+        self._recent[key].append(value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Измеряет длительность блока with"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """Процентиль q (0..1) по последним наблюдениям или None"""
+        recent = self._recent.get(self._key(labels))
+        if not recent:
+            return None
+        ordered = sorted(recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def label_values(self) -> List[Dict[str, str]]:
+        """Наборы меток, по которым есть наблюдения"""
+        return [dict(zip(self.labelnames, key)) for key in sorted(self._counts)]
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key in sorted(self._counts):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), self._counts[key]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labelnames, key, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {self._sums[key]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """
+    Набор метрик процесса
+
+    Значения, которые удобнее снимать в момент запроса (глубины очередей,
+    соединения пула), обновляются функциями add_collector перед выводом.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        """Регистрирует функцию, обновляющую метрики перед выводом"""
+        self._collectors.append(collector)
+
+    def collect(self):
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.error(f"Ошибка при сборе метрик: {e}")
+
+    def render(self) -> str:
+        """Метрики в текстовом формате Prometheus"""
+        self.collect()
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# Создаем экземпляр набора метрик
+registry = MetricsRegistry()
+
+# Метрики обработки новостей
+STAGE_SECONDS = registry.histogram(
+    "news_stage_seconds",
+    "Длительность этапов обработки новости",
+    ["stage"]
+)
+NEWS_ITEMS = registry.counter(
+    "news_items_total",
+    "Сообщения каналов-источников по результату обработки",
+    ["result"]
+)
+
+# Метрики OpenRouter
+OPENROUTER_REQUESTS = registry.counter(
+    "openrouter_requests_total",
+    "Запросы к OpenRouter по модели и результату",
+    ["model", "status"]
+)
+OPENROUTER_SECONDS = registry.histogram(
+    "openrouter_request_seconds",
+    "Длительность запросов к OpenRouter",
+    ["model"]
+)
+OPENROUTER_TOKENS = registry.counter(
+    "openrouter_tokens_total",
+    "Токены OpenRouter по модели (prompt, completion)",
+    ["model", "kind"]
+)
+OPENROUTER_COST = registry.counter(
+    "openrouter_cost_usd_total",
+    "Стоимость запросов к OpenRouter по модели, USD",
+    ["model"]
+)
+LLM_CACHE_REQUESTS = registry.counter(
+    "llm_cache_requests_total",
+    "Обращения к кэшу ответов LLM (hit, miss)",
+    ["result"]
+)
+
+# Очереди и ресурсы
+QUEUE_DEPTH = registry.gauge(
+    "queue_depth",
+    "Количество элементов в очереди",
+    ["queue"]
+)
+DB_POOL = registry.gauge(
+    "db_pool_connections",
+    "Соединения пула базы данных (size, checked_out, overflow)",
+    ["state"]
+)
+
+def stage_latency_report() -> str:
+    """Процентили p50/p95 длительности этапов обработки для /status"""
+    lines = []
+    for labels in STAGE_SECONDS.label_values():
+        p50 = STAGE_SECONDS.quantile(0.5, **labels)
+        p95 = STAGE_SECONDS.quantile(0.95, **labels)
+        lines.append(f"{labels['stage']}: p50 {p50 * 1000:.0f} мс, p95 {p95 * 1000:.0f} мс")
+    return "\n".join(lines)
+
+class MetricsServer:
+    """HTTP-сервер с адресом /metrics в текстовом формате Prometheus"""
+
+    def __init__(self, metrics: MetricsRegistry, host: str, port: int):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(
+            text=self.metrics.render(),
+            content_type="text/plain",
+            charset="utf-8",
+            headers={"X-Content-Type-Options": "nosniff"}
+        )
+
+    async def start(self):
+        """Запускает сервер, если задан порт"""
+        if not self.port or self._runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Метрики доступны на http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+# Создаем экземпляр сервера метрик
+metrics_server = MetricsServer(registry, settings.METRICS_HOST, settings.METRICS_PORT)
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Boolean, DateTime, ForeignKey, Enum, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from .base import Base
 
@@ -16,9 +16,19 @@ class News(Base):
     confidence = Column(Float)
     importance = Column(Integer)  # 1-5
     is_catalyst = Column(Boolean, default=False)
-    market_target = Column(Enum("TRADFI", "CRYPTO", name="market_type"))
+    market_target = Column(Enum("TRADFI", "CRYPTO", "BOTH", name="market_type"))
     media_path = Column(String)
     timestamp = Column(DateTime, default=datetime.utcnow)
+    duplicate_of_id = Column(Integer, ForeignKey("news.id"))  # Исходная новость для почти-дубликатов
+    
+    __table_args__ = (
+        # Повторная обработка того же сообщения не создает дубликат
+        UniqueConstraint("source_channel_id", "message_id", name="uq_news_source_message"),
+        # Дайджесты выбирают новости за период
+        Index("ix_news_timestamp", "timestamp"),
+        # Прогнозы выбирают новости рынка за период
+        Index("ix_news_market_target_timestamp", "market_target", "timestamp"),
+    )
     
     def __repr__(self):
         return f"<News(id={self.id}, topic={self.topic}, importance={self.importance})>"
@@ -41,12 +51,117 @@ class Forecast(Base):
     __tablename__ = "forecasts"
     
     id = Column(Integer, primary_key=True)
-    market_type = Column(Enum("TRADFI", "CRYPTO", name="market_type"), nullable=False)
+    market_type = Column(Enum("TRADFI", "CRYPTO", "BOTH", name="market_type"), nullable=False)
     period = Column(String, nullable=False)  # hour, day, week
     state = Column(String, nullable=False)  # bullish, bearish, neutral
     confidence = Column(Float, nullable=False)
     key_news_ids = Column(String)  # JSON array of news IDs
     generated_at = Column(DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        # Последний прогноз по рынку
+        Index("ix_forecasts_market_type_generated_at", market_type, generated_at.desc()),
+    )
+    
+    def __repr__(self):
+        return f"<Forecast(id={self.id}, market_type={self.market_type}, state={self.state})>"
+
+class LLMCacheEntry(Base):
+    """Модель записи кэша ответов LLM"""
+    __tablename__ = "llm_cache"
+    
+    key = Column(String(64), primary_key=True)  # sha256 от текста, модели и версии промпта
+    value = Column(String, nullable=False)  # JSON с результатом
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f"<LLMCacheEntry(key={self.key}, created_at={self.created_at})>"
+
+class SpilledMessage(Base):
+    """Модель сообщения, отложенного при переполнении очереди обработки"""
+    __tablename__ = "spilled_messages"
+    
+    id = Column(Integer, primary_key=True)
+    source_channel_id = Column(String, nullable=False)
+    message_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<SpilledMessage(id={self.id}, source_channel_id={self.source_channel_id}, message_id={self.message_id})>"
+
+class ChannelCheckpoint(Base):
+    """Модель контрольной точки чтения канала-источника"""
+    __tablename__ = "channel_checkpoints"
+    
+    source_channel_id = Column(String, primary_key=True)
+    last_message_id = Column(Integer, nullable=False)  # Все сообщения до этого ID обработаны
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<ChannelCheckpoint(source_channel_id={self.source_channel_id}, last_message_id={self.last_message_id})>"
+
+class WorkItem(Base):
+    """Модель сообщения в устойчивой очереди обработки"""
+    __tablename__ = "work_items"
+    
+    id = Column(Integer, primary_key=True)
+    source_channel_id = Column(String, nullable=False)
+    message_id = Column(Integer, nullable=False)
+    text = Column(String, nullable=False)
+    media_type = Column(String)  # photo, document, album
+    album_message_ids = Column(String)  # JSON-список ID сообщений альбома
+    message_date = Column(DateTime, nullable=False)
+    state = Column(String, nullable=False, default="received")  # received, analyzed, translated, published, skipped, failed
+    analysis = Column(String)  # JSON с результатом анализа
+    translated_text = Column(String)
+    news_id = Column(Integer, ForeignKey("news.id"))
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String)
+    lease_owner = Column(String)  # Обработчик, взявший сообщение
+    lease_expires_at = Column(DateTime)  # После истечения аренды сообщение снова доступно
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # Не выдавать раньше этого времени
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        UniqueConstraint("source_channel_id", "message_id", name="uq_work_items_source_message"),
+        # Выбор доступных сообщений обработчиками
+        Index("ix_work_items_state_available_at", "state", "available_at"),
+    )
+    
+    def __repr__(self):
+        return f"<WorkItem(id={self.id}, message_id={self.message_id}, state={self.state})>"
+
+class WorkerLease(Base):
+    """Модель отметки о работе процесса-обработчика"""
+    __tablename__ = "worker_leases"
+    
+    worker_id = Column(String, primary_key=True)
+    heartbeat_at = Column(DateTime, nullable=False, index=True)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<WorkerLease(worker_id={self.worker_id}, heartbeat_at={self.heartbeat_at})>"
+
+class MediaFile(Base):
+    """Модель файла в хранилище медиа"""
+    __tablename__ = "media_files"
+    
+    content_hash = Column(String(64), primary_key=True)  # SHA-256 содержимого
+    path = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f"<MediaFile(content_hash={self.content_hash}, size={self.size})>"
+
+class MediaAlias(Base):
+    """Модель соответствия идентификатора файла Telegram файлу хранилища"""
+    __tablename__ = "media_aliases"
+    
+    unique_id = Column(String, primary_key=True)  # file_unique_id Bot API или ID медиа Telethon
+    content_hash = Column(String(64), ForeignKey("media_files.content_hash", ondelete="CASCADE"), nullable=False, index=True)
+    
     def __repr__(self):
-        return f"<Forecast(id={self.id}, market_type={self.market_type}, state={self.state})>" 
\ No newline at end of file
+        return f"<MediaAlias(unique_id={self.unique_id}, content_hash={self.content_hash})>"
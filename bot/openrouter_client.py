@@ -1,76 +1,226 @@
 import aiohttp
+import asyncio
 import logging
 import json
-from typing import Tuple, Optional, Dict
+import time
+from typing import Any, AsyncIterator, List, Tuple, Optional, Dict
 from .config import settings
+from .batcher import MicroBatcher
+from .rate_limiter import AdaptiveRateLimiter, CircuitBreaker, backoff_delay
+from .llm_cache import llm_cache, make_cache_key
+from .tracing import traced
+from .metrics import OPENROUTER_REQUESTS, OPENROUTER_SECONDS, OPENROUTER_TOKENS, OPENROUTER_COST
 
 logger = logging.getLogger(__name__)
 
+# Допустимые значения целевого рынка в ответе модели и их нормализованный вид
+MARKET_TARGETS = {
+    "TRADFI": "TRADFI",
+    "CRYPTO": "CRYPTO",
+    "BOTH": "BOTH"
+}
+
+# Версия промптов анализа и перевода; при изменении промптов ее нужно
+# увеличить, чтобы не использовать закэшированные ответы старого формата
+PROMPT_VERSION = "2"
+
+# HTTP-статусы, при которых запрос имеет смысл повторить
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+class ProviderUnavailableError(Exception):
+    """OpenRouter временно недоступен, запрос нужно повторить позже"""
+
+# Общая сессия с пулом соединений к OpenRouter
+_session: Optional[aiohttp.ClientSession] = None
+
+# Ограничение частоты запросов и выключатель для OpenRouter
+rate_limiter = AdaptiveRateLimiter(
+    requests_per_second=settings.OPENROUTER_REQUESTS_PER_SECOND,
+    tokens_per_minute=settings.OPENROUTER_TOKENS_PER_MINUTE
+)
+circuit_breaker = CircuitBreaker(
+    failure_threshold=settings.OPENROUTER_CIRCUIT_FAILURES,
+    reset_timeout=settings.OPENROUTER_CIRCUIT_RESET
+)
+
+async def init_session() -> aiohttp.ClientSession:
+    """
+    Создает общую HTTP-сессию с пулом keep-alive соединений к OpenRouter
+
+    Вызывается один раз при старте бота, повторный вызов возвращает
+    уже открытую сессию.
+    """
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=settings.OPENROUTER_POOL_SIZE,
+            limit_per_host=settings.OPENROUTER_POOL_SIZE_PER_HOST,
+            keepalive_timeout=settings.OPENROUTER_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=settings.OPENROUTER_TIMEOUT),
+            headers={
+                "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
+                "Content-Type": "application/json"
+            }
+        )
+        logger.info("HTTP-сессия OpenRouter создана")
+    return _session
+
+async def get_session() -> aiohttp.ClientSession:
+    """Возвращает общую HTTP-сессию, создавая её при необходимости"""
+    if _session is None or _session.closed:
+        return await init_session()
+    return _session
+
+async def close_session():
+    """Закрывает общую HTTP-сессию"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+        logger.info("HTTP-сессия OpenRouter закрыта")
+    _session = None
+
+def _record_usage(model: str, usage: Dict):
+    """Учитывает токены и стоимость запроса в метриках"""
+    OPENROUTER_TOKENS.inc(usage.get("prompt_tokens") or 0, model=model, kind="prompt")
+    OPENROUTER_TOKENS.inc(usage.get("completion_tokens") or 0, model=model, kind="completion")
+    if usage.get("cost"):
+        OPENROUTER_COST.inc(float(usage["cost"]), model=model)
+
+def _estimate_tokens(data: Dict) -> int:
+    """Грубая оценка числа входных токенов запроса"""
+    return sum(len(message["content"]) for message in data["messages"]) // 4
+
+async def chat_completion(data: Dict) -> Optional[Dict]:
+    """
+    Отправляет запрос к /chat/completions
+
+    Запрос проходит через ограничитель частоты, при 429, 5xx и сетевых
+    ошибках повторяется с экспоненциальной задержкой и джиттером.
+    После исчерпания попыток засчитывается отказ выключателя.
+
+    Returns:
+        JSON ответа или None, если API отклонил запрос (ошибка не временная)
+
+    Raises:
+        ProviderUnavailableError: OpenRouter недоступен (выключатель разомкнут
+        или все попытки завершились временными ошибками)
+    """
+    if not circuit_breaker.allow():
+        raise ProviderUnavailableError(
+            f"Выключатель разомкнут, повтор через {circuit_breaker.retry_in():.0f} с"
+        )
+
+    session = await get_session()
+    estimated_tokens = _estimate_tokens(data)
+    model = data.get("model", "")
+    # Просим OpenRouter вернуть стоимость запроса в usage
+    data = {**data, "usage": {"include": True}}
+    last_error = None
+
+    for attempt in range(settings.OPENROUTER_MAX_RETRIES + 1):
+        await rate_limiter.acquire(estimated_tokens)
+        retry_after = 0.0
+        started = time.perf_counter()
+        try:
+            async with session.post(
+                f"{settings.OPENROUTER_API_URL}/chat/completions",
+                json=data
+            ) as response:
+                OPENROUTER_REQUESTS.inc(model=model, status=response.status)
+                if response.status == 200:
+                    result = await response.json()
+                    OPENROUTER_SECONDS.observe(time.perf_counter() - started, model=model)
+                    rate_limiter.on_success(response.headers)
+                    circuit_breaker.record_success()
+                    usage = result.get("usage") or {}
+                    if usage.get("total_tokens"):
+                        rate_limiter.record_usage(estimated_tokens, usage["total_tokens"])
+                    _record_usage(model, usage)
+                    return result
+
+                if response.status == 429:
+                    retry_after = rate_limiter.on_rate_limited(response.headers)
+                elif response.status not in RETRYABLE_STATUSES:
+                    logger.error(f"Ошибка API OpenRouter: {response.status} {await response.text()}")
+                    return None
+
+                last_error = f"HTTP {response.status}"
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            last_error = str(e) or type(e).__name__
+            OPENROUTER_REQUESTS.inc(model=model, status="error")
+
+        if attempt < settings.OPENROUTER_MAX_RETRIES:
+            delay = max(
+                retry_after,
+                backoff_delay(attempt, settings.OPENROUTER_BACKOFF_BASE, settings.OPENROUTER_BACKOFF_MAX)
+            )
+            logger.warning(
+                f"Временная ошибка OpenRouter ({last_error}), "
+                f"повтор {attempt + 1} через {delay:.1f} с"
+            )
+            await asyncio.sleep(delay)
+
+    circuit_breaker.record_failure()
+    raise ProviderUnavailableError(f"OpenRouter недоступен: {last_error}")
+
+@traced("analysis")
 async def analyze_news(text: str) -> Tuple[Optional[str], Optional[float]]:
     """
     Анализирует текст новости и определяет её тему
-    
+
     Args:
         text: Текст новости для анализа
-        
+
     Returns:
         Tuple[Optional[str], Optional[float]]: Тема новости и уровень уверенности
     """
     try:
-        async with aiohttp.ClientSession() as session:
-            headers = {
-                "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            
-            # Формируем промпт для анализа
-            prompt = f"""
-            Проанализируй следующий текст новости и определи:
-            1. Тематику (из списка: {', '.join(settings.TRADFI_TOPICS + settings.CRYPTO_TOPICS)})
-            2. Уровень уверенности в определении темы (от 0 до 1)
-            
-            Текст новости:
-            {text}
-            
-            Ответ должен быть в формате:
-            Тема: [тема]
-            Уверенность: [число от 0 до 1]
-            """
-            
-            data = {
-                "model": settings.OPENROUTER_MODEL,
-                "messages": [
-                    {"role": "user", "content": prompt}
-                ]
-            }
-            
-            async with session.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers=headers,
-                json=data
-            ) as response:
-                if response.status != 200:
-                    logger.error(f"Ошибка API OpenRouter: {response.status}")
-                    return None, None
-                
-                result = await response.json()
-                content = result["choices"][0]["message"]["content"]
-                
-                # Парсим ответ
-                topic = None
-                confidence = None
-                
-                for line in content.split("\n"):
-                    if line.startswith("Тема:"):
-                        topic = line.replace("Тема:", "").strip()
-                    elif line.startswith("Уверенность:"):
-                        try:
-                            confidence = float(line.replace("Уверенность:", "").strip())
-                        except ValueError:
-                            confidence = None
-                
-                return topic, confidence
-                
+        # Формируем промпт для анализа
+        prompt = f"""
+        Проанализируй следующий текст новости и определи:
+        1. Тематику (из списка: {', '.join(settings.TRADFI_TOPICS + settings.CRYPTO_TOPICS)})
+        2. Уровень уверенности в определении темы (от 0 до 1)
+
+        Текст новости:
+        {text}
+
+        Ответ должен быть в формате:
+        Тема: [тема]
+        Уверенность: [число от 0 до 1]
+        """
+
+        data = {
+            "model": settings.OPENROUTER_MODEL,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ]
+        }
+
+        result = await chat_completion(data)
+        if result is None:
+            return None, None
+
+        content = result["choices"][0]["message"]["content"]
+
+        # Парсим ответ
+        topic = None
+        confidence = None
+
+        for line in content.split("\n"):
+            if line.startswith("Тема:"):
+                topic = line.replace("Тема:", "").strip()
+            elif line.startswith("Уверенность:"):
+                try:
+                    confidence = float(line.replace("Уверенность:", "").strip())
+                except ValueError:
+                    confidence = None
+
+        return topic, confidence
+
     except Exception as e:
         logger.error(f"Ошибка при анализе новости: {e}")
         return None, None
@@ -79,201 +229,467 @@ class OpenRouterClient:
     def __init__(self):
         self.api_key = settings.OPENROUTER_API_KEY
         self.api_url = settings.OPENROUTER_API_URL
-        self.headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-    
+
     async def analyze_text(self, text: str) -> Tuple[Optional[str], Optional[float]]:
         """Анализирует текст и возвращает тематику, важность и другие параметры"""
         prompt = f"""
         Проанализируй следующий текст новости и определи:
         1. Тематику (из списка: {', '.join(settings.TRADFI_TOPICS + settings.CRYPTO_TOPICS)})
         2. Уровень уверенности в определении темы (от 0 до 1)
-        
+
         Текст новости:
         {text}
-        
+
         Ответ должен быть в формате:
         Тема: [тема]
         Уверенность: [число от 0 до 1]
         """
-        
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(
-                    f"{self.api_url}/chat/completions",
-                    headers=self.headers,
-                    json={
-                        "model": "anthropic/claude-3-opus-20240229",
-                        "messages": [{"role": "user", "content": prompt}]
-                    }
-                ) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        content = result["choices"][0]["message"]["content"]
-                        
-                        # Парсим ответ
-                        topic = None
-                        confidence = None
-                        
-                        for line in content.split("\n"):
-                            if line.startswith("Тема:"):
-                                topic = line.replace("Тема:", "").strip()
-                            elif line.startswith("Уверенность:"):
-                                try:
-                                    confidence = float(line.replace("Уверенность:", "").strip())
-                                except ValueError:
-                                    confidence = None
-                        
-                        return topic, confidence
-                    else:
-                        logger.error("OpenRouter API error", 
-                                   status=response.status,
-                                   text=await response.text())
-                        return None, None
-            except Exception as e:
-                logger.error("OpenRouter API request failed", error=str(e))
+
+        try:
+            result = await chat_completion({
+                "model": "anthropic/claude-3-opus-20240229",
+                "messages": [{"role": "user", "content": prompt}]
+            })
+            if result is None:
                 return None, None
-    
+
+            content = result["choices"][0]["message"]["content"]
+
+            # Парсим ответ
+            topic = None
+            confidence = None
+
+            for line in content.split("\n"):
+                if line.startswith("Тема:"):
+                    topic = line.replace("Тема:", "").strip()
+                elif line.startswith("Уверенность:"):
+                    try:
+                        confidence = float(line.replace("Уверенность:", "").strip())
+                    except ValueError:
+                        confidence = None
+
+            return topic, confidence
+        except Exception as e:
+            logger.error(f"OpenRouter API request failed: {e}")
+            return None, None
+
     async def translate_text(self, text: str, style: str = "business") -> Optional[str]:
         """Переводит текст на русский язык с учетом стиля"""
         prompt = f"""
         Переведи следующий текст на русский язык, используя {style} стиль:
-        
+
         {text}
         """
-        
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(
-                    f"{self.api_url}/chat/completions",
-                    headers=self.headers,
-                    json={
-                        "model": "anthropic/claude-3-opus-20240229",
-                        "messages": [{"role": "user", "content": prompt}]
-                    }
-                ) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        return result["choices"][0]["message"]["content"]
-                    else:
-                        logger.error("OpenRouter API translation error",
-                                   status=response.status,
-                                   text=await response.text())
-                        return None
-            except Exception as e:
-                logger.error("OpenRouter API translation request failed", error=str(e))
-                return None 
-
-async def analyze_news_full(text: str) -> Dict:
+
+        try:
+            result = await chat_completion({
+                "model": "anthropic/claude-3-opus-20240229",
+                "messages": [{"role": "user", "content": prompt}]
+            })
+            if result is None:
+                return None
+            return result["choices"][0]["message"]["content"]
+        except Exception as e:
+            logger.error(f"OpenRouter API translation request failed: {e}")
+            return None
+
+def parse_json_content(content: str) -> Optional[Any]:
+    """Извлекает JSON из ответа модели, в том числе обернутый в markdown-блок"""
+    content = content.strip()
+    if content.startswith("```"):
+        content = content.strip("`")
+        if content.startswith("json"):
+            content = content[len("json"):]
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        return None
+
+def validate_analysis(data: Any) -> Optional[Dict]:
+    """
+    Проверяет и нормализует результат анализа новости
+
+    Returns:
+        Dict с полями topic, confidence, importance, is_catalyst, market_target
+        или None, если ответ модели не соответствует формату
+    """
+    if not isinstance(data, dict):
+        return None
+    try:
+        topic = data["topic"]
+        confidence = float(data["confidence"])
+        importance = int(data["importance"])
+        is_catalyst = data["is_catalyst"]
+        market_target = MARKET_TARGETS.get(str(data["market_target"]).upper())
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    if isinstance(is_catalyst, str):
+        is_catalyst = is_catalyst.strip().lower() == "true"
+    if (
+        not isinstance(topic, str) or not topic
+        or not 0 <= confidence <= 1
+        or not 1 <= importance <= 5
+        or not isinstance(is_catalyst, bool)
+        or market_target is None
+    ):
+        return None
+
+    return {
+        "topic": topic,
+        "confidence": confidence,
+        "importance": importance,
+        "is_catalyst": is_catalyst,
+        "market_target": market_target
+    }
+
+@traced("analysis")
+async def analyze_news_full(text: str) -> Optional[Dict]:
     """
     Расширенный анализ новости
-    
+
     Returns:
         Dict с полями:
         - topic: тема новости
         - confidence: уверенность (0-1)
         - importance: важность (1-5)
         - is_catalyst: является ли катализатором
-        - market_target: TradFi/Crypto/Both
+        - market_target: TRADFI/CRYPTO/BOTH
+        или None, если анализ не удался
     """
     try:
-        async with aiohttp.ClientSession() as session:
-            headers = {
-                "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            
-            prompt = f"""
-            Проанализируй следующую новость и определи:
-            1. Тематику (из списка: {', '.join(settings.TRADFI_TOPICS + settings.CRYPTO_TOPICS)})
-            2. Уровень уверенности в определении темы (от 0 до 1)
-            3. Важность новости (от 1 до 5, где 5 - максимально важная)
-            4. Является ли новость катализатором рынка (True/False)
-            5. Целевая рыночная область (TradFi/Crypto/Both)
-            
-            Текст новости:
-            {text}
-            
-            Ответ должен быть в формате JSON:
-            {{
-                "topic": "тема",
-                "confidence": 0.95,
-                "importance": 4,
-                "is_catalyst": true,
-                "market_target": "TradFi"
-            }}
-            """
-            
-            data = {
-                "model": settings.OPENROUTER_MODEL,
-                "messages": [{"role": "user", "content": prompt}]
-            }
-            
-            async with session.post(
-                f"{settings.OPENROUTER_API_URL}/chat/completions",
-                headers=headers,
-                json=data
-            ) as response:
-                if response.status != 200:
-                    logger.error(f"Ошибка API OpenRouter: {response.status}")
-                    return None
-                
-                result = await response.json()
-                content = result["choices"][0]["message"]["content"]
-                
-                try:
-                    analysis = json.loads(content)
-                    return analysis
-                except json.JSONDecodeError:
-                    logger.error("Ошибка парсинга JSON ответа")
-                    return None
-                
+        prompt = f"""
+        Проанализируй следующую новость и определи:
+        1. Тематику (из списка: {', '.join(settings.TRADFI_TOPICS + settings.CRYPTO_TOPICS)})
+        2. Уровень уверенности в определении темы (от 0 до 1)
+        3. Важность новости (от 1 до 5, где 5 - максимально важная)
+        4. Является ли новость катализатором рынка (True/False)
+        5. Целевая рыночная область (TradFi/Crypto/Both)
+
+        Текст новости:
+        {text}
+
+        Ответ должен быть в формате JSON:
+        {{
+            "topic": "тема",
+            "confidence": 0.95,
+            "importance": 4,
+            "is_catalyst": true,
+            "market_target": "TradFi"
+        }}
+        """
+
+        data = {
+            "model": settings.OPENROUTER_MODEL,
+            "messages": [{"role": "user", "content": prompt}]
+        }
+
+        result = await chat_completion(data)
+        if result is None:
+            return None
+
+        content = result["choices"][0]["message"]["content"]
+
+        analysis = validate_analysis(parse_json_content(content))
+        if not analysis:
+            logger.error("Ошибка парсинга JSON ответа")
+        return analysis
+
+    except ProviderUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"Ошибка при анализе новости: {e}")
         return None
 
+def _translation_prompt(text: str, style: str) -> str:
+    """Промпт для перевода новости"""
+    return f"""
+        Переведи следующий текст на русский язык, используя {style} стиль.
+        Сохрани все термины и специфические выражения.
+
+        Текст:
+        {text}
+        """
+
+@traced("translation")
 async def translate_news(text: str, style: str = "business") -> Optional[str]:
     """
     Переводит новость на русский язык с учетом стиля
-    
+
     Args:
         text: Текст для перевода
         style: Стиль перевода (business, technical, journalistic)
     """
     try:
-        async with aiohttp.ClientSession() as session:
-            headers = {
-                "Authorization": f"Bearer {settings.OPENROUTER_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            
-            prompt = f"""
-            Переведи следующий текст на русский язык, используя {style} стиль.
-            Сохрани все термины и специфические выражения.
-            
-            Текст:
-            {text}
-            """
-            
-            data = {
-                "model": settings.OPENROUTER_MODEL,
-                "messages": [{"role": "user", "content": prompt}]
-            }
-            
-            async with session.post(
-                f"{settings.OPENROUTER_API_URL}/chat/completions",
-                headers=headers,
-                json=data
-            ) as response:
-                if response.status != 200:
-                    logger.error(f"Ошибка API OpenRouter при переводе: {response.status}")
-                    return None
-                
-                result = await response.json()
-                return result["choices"][0]["message"]["content"]
-                
+        data = {
+            "model": settings.OPENROUTER_MODEL,
+            "messages": [{"role": "user", "content": _translation_prompt(text, style)}]
+        }
+
+        result = await chat_completion(data)
+        if result is None:
+            return None
+
+        return result["choices"][0]["message"]["content"]
+
+    except ProviderUnavailableError:
+        raise
     except Exception as e:
         logger.error(f"Ошибка при переводе новости: {e}")
-        return None 
\ No newline at end of file
+        return None
+
+async def translate_news_stream(text: str, style: str = "business") -> AsyncIterator[str]:
+    """
+    Переводит новость в потоковом режиме (SSE, stream: true)
+
+    Yields:
+        Фрагменты перевода по мере их генерации
+
+    Raises:
+        ProviderUnavailableError: OpenRouter недоступен или поток прервался
+    """
+    if not circuit_breaker.allow():
+        raise ProviderUnavailableError(
+            f"Выключатель разомкнут, повтор через {circuit_breaker.retry_in():.0f} с"
+        )
+
+    data = {
+        "model": settings.OPENROUTER_MODEL,
+        "messages": [{"role": "user", "content": _translation_prompt(text, style)}],
+        "stream": True
+    }
+    session = await get_session()
+    await rate_limiter.acquire(_estimate_tokens(data))
+
+    try:
+        async with session.post(
+            f"{settings.OPENROUTER_API_URL}/chat/completions",
+            json=data
+        ) as response:
+            OPENROUTER_REQUESTS.inc(model=data["model"], status=response.status)
+            if response.status != 200:
+                if response.status == 429:
+                    rate_limiter.on_rate_limited(response.headers)
+                if response.status in RETRYABLE_STATUSES:
+                    raise ProviderUnavailableError(f"HTTP {response.status}")
+                logger.error(f"Ошибка API OpenRouter при потоковом переводе: {response.status}")
+                return
+
+            rate_limiter.on_success(response.headers)
+            async for raw_line in response.content:
+                line = raw_line.decode("utf-8").strip()
+                # Пропускаем пустые строки и комментарии SSE (": OPENROUTER PROCESSING")
+                if not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(payload)
+                except json.JSONDecodeError:
+                    continue
+                choices = chunk.get("choices") or [{}]
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    yield delta
+
+        circuit_breaker.record_success()
+
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        circuit_breaker.record_failure()
+        raise ProviderUnavailableError(f"Потоковый перевод прерван: {e or type(e).__name__}")
+
+async def analyze_news_batch(texts: List[str]) -> List[Optional[Dict]]:
+    """
+    Расширенный анализ нескольких новостей одним запросом
+
+    Новости передаются модели нумерованным списком, ответ ожидается
+    JSON-массивом. Новости, для которых ответ не прошел проверку,
+    анализируются отдельными запросами.
+
+    Returns:
+        Список результатов анализа в порядке входных текстов
+    """
+    if len(texts) == 1:
+        return [await analyze_news_full(texts[0])]
+
+    results: List[Optional[Dict]] = [None] * len(texts)
+    try:
+        numbered = "\n\n".join(
+            f"### Новость {index}\n{text}" for index, text in enumerate(texts, 1)
+        )
+        prompt = f"""
+        Проанализируй каждую из следующих новостей и для каждой определи:
+        1. Тематику (из списка: {', '.join(settings.TRADFI_TOPICS + settings.CRYPTO_TOPICS)})
+        2. Уровень уверенности в определении темы (от 0 до 1)
+        3. Важность новости (от 1 до 5, где 5 - максимально важная)
+        4. Является ли новость катализатором рынка (True/False)
+        5. Целевая рыночная область (TradFi/Crypto/Both)
+
+        {numbered}
+
+        Ответ должен быть только JSON-массивом из {len(texts)} объектов
+        в порядке новостей:
+        [
+            {{
+                "index": 1,
+                "topic": "тема",
+                "confidence": 0.95,
+                "importance": 4,
+                "is_catalyst": true,
+                "market_target": "TradFi"
+            }}
+        ]
+        """
+
+        data = {
+            "model": settings.OPENROUTER_MODEL,
+            "messages": [{"role": "user", "content": prompt}]
+        }
+
+        result = await chat_completion(data)
+        if result is not None:
+            items = parse_json_content(result["choices"][0]["message"]["content"])
+            if isinstance(items, list):
+                for position, item in enumerate(items):
+                    index = item.get("index", position + 1) if isinstance(item, dict) else position + 1
+                    try:
+                        index = int(index) - 1
+                    except (TypeError, ValueError):
+                        continue
+                    if 0 <= index < len(texts) and results[index] is None:
+                        results[index] = validate_analysis(item)
+
+    except ProviderUnavailableError:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка при пакетном анализе новостей: {e}")
+
+    # Новости без корректного результата анализируем по одной
+    failed = [index for index, analysis in enumerate(results) if analysis is None]
+    if failed:
+        logger.warning(f"Пакетный анализ: {len(failed)} из {len(texts)} новостей анализируются отдельно")
+        retried = await asyncio.gather(*(analyze_news_full(texts[index]) for index in failed))
+        for index, analysis in zip(failed, retried):
+            results[index] = analysis
+
+    return results
+
+# Пакетный анализ новостей во время всплесков
+analysis_batcher = MicroBatcher(
+    analyze_news_batch,
+    max_size=settings.ANALYSIS_BATCH_MAX_SIZE,
+    max_wait_ms=settings.ANALYSIS_BATCH_MAX_WAIT_MS,
+    name="analysis"
+)
+
+@traced("analysis_translation")
+async def _analyze_and_translate_combined(text: str, style: str) -> Optional[Tuple[Dict, str]]:
+    """Анализ и перевод новости одним запросом к модели"""
+    try:
+        prompt = f"""
+        Проанализируй следующую новость и переведи её на русский язык.
+        Определи:
+        1. Тематику (из списка: {', '.join(settings.TRADFI_TOPICS + settings.CRYPTO_TOPICS)})
+        2. Уровень уверенности в определении темы (от 0 до 1)
+        3. Важность новости (от 1 до 5, где 5 - максимально важная)
+        4. Является ли новость катализатором рынка (True/False)
+        5. Целевая рыночная область (TradFi/Crypto/Both)
+        6. Перевод текста на русский язык в стиле {style}, сохранив все термины
+           и специфические выражения
+
+        Текст новости:
+        {text}
+
+        Ответ должен быть только в формате JSON:
+        {{
+            "topic": "тема",
+            "confidence": 0.95,
+            "importance": 4,
+            "is_catalyst": true,
+            "market_target": "TradFi",
+            "translation": "перевод"
+        }}
+        """
+
+        data = {
+            "model": settings.OPENROUTER_MODEL,
+            "messages": [{"role": "user", "content": prompt}],
+            "response_format": {"type": "json_object"}
+        }
+
+        result = await chat_completion(data)
+        if result is None:
+            return None
+
+        content = result["choices"][0]["message"]["content"]
+        parsed = parse_json_content(content)
+        analysis = validate_analysis(parsed)
+        translated = parsed.get("translation") if isinstance(parsed, dict) else None
+        if not analysis or not isinstance(translated, str) or not translated.strip():
+            return None
+
+        return analysis, translated.strip()
+
+    except ProviderUnavailableError:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка при комбинированном анализе новости: {e}")
+        return None
+
+async def analyze_and_translate_news(
+    text: str,
+    style: str = "business"
+) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    Анализирует и переводит новость
+
+    В комбинированном режиме выполняется один запрос, который возвращает
+    и анализ, и перевод. Если ответ не прошел проверку (или режим выключен),
+    анализ и перевод запрашиваются параллельно отдельными запросами.
+    В пакетном режиме анализ объединяется с анализом других новостей,
+    пришедших в то же время, а перевод запрашивается отдельно.
+
+    Результаты кэшируются по хэшу нормализованного текста, модели и версии
+    промпта, поэтому повторы одной и той же новости не отправляются в API.
+
+    Returns:
+        Tuple[Optional[Dict], Optional[str]]: Результат анализа и перевод
+
+    Raises:
+        ProviderUnavailableError: OpenRouter временно недоступен
+    """
+    async def compute() -> Dict[str, Any]:
+        analysis, translated = await _analyze_and_translate(text, style)
+        return {"analysis": analysis, "translation": translated}
+
+    # Одновременные запросы одной и той же новости выполняются один раз
+    key = make_cache_key(text, settings.OPENROUTER_MODEL, PROMPT_VERSION, style)
+    result = await llm_cache.get_or_compute(
+        key,
+        compute,
+        cacheable=lambda value: bool(value["analysis"] and value["translation"])
+    )
+    return result["analysis"], result["translation"]
+
+async def _analyze_and_translate(text: str, style: str) -> Tuple[Optional[Dict], Optional[str]]:
+    """Анализ и перевод новости без использования кэша"""
+    if settings.ANALYSIS_BATCHING:
+        # Анализ идет общим пакетом, перевод — отдельным запросом параллельно
+        analysis, translated = await asyncio.gather(
+            analysis_batcher.submit(text),
+            translate_news(text, style)
+        )
+        return analysis, translated
+
+    if settings.OPENROUTER_COMBINED_ANALYSIS:
+        combined = await _analyze_and_translate_combined(text, style)
+        if combined:
+            return combined
+        logger.warning("Комбинированный ответ не прошел проверку, выполняем раздельные запросы")
+
+    analysis, translated = await asyncio.gather(
+        analyze_news_full(text),
+        translate_news(text, style)
+    )
+    return analysis, translated
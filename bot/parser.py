@@ -1,36 +1,134 @@
+import functools
+import json
 import logging
 import asyncio
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Set, Union
 from telethon import TelegramClient, events
 from telethon.tl.types import PeerChannel, MessageMediaPhoto, MessageMediaDocument
 from .config import settings
-from .database import async_session
-from .models import News
-from .openrouter_client import analyze_news_full, translate_news
+from .database import save_news, news_exists
+from .openrouter_client import (
+    analyze_and_translate_news,
+    analyze_news_full,
+    translate_news,
+    circuit_breaker,
+    ProviderUnavailableError
+)
+from .formatting import (
+    TELEGRAM_ALBUM_LIMIT,
+    TELEGRAM_TEXT_LIMIT,
+    format_news_post,
+    split_caption,
+    split_text
+)
+from .progressive import ProgressivePublisher, stream_translation
+from .publisher import publisher, publish_priority
+from .dedup import dedup_index
+from .ingest import IngestionQueue
+from .backfill import BackfillEngine, ChannelCheckpoints
+from .albums import AlbumAggregator, album_primary
+from .media_handler import media_handler
+from .metrics import registry, STAGE_SECONDS, NEWS_ITEMS, QUEUE_DEPTH
+from .tracing import tracer, traced, message_key
+from .cluster import WorkerRegistry, rendezvous_owner, MODE_WORKER
+from .work_queue import (
+    work_queue,
+    WorkQueueRunner,
+    WORK_RECEIVED,
+    WORK_ANALYZED,
+    WORK_TRANSLATED,
+    WORK_SKIPPED
+)
 
 logger = logging.getLogger(__name__)
 
+def media_type(media) -> Optional[str]:
+    """Тип медиа сообщения для сохранения в базе"""
+    if isinstance(media, MessageMediaPhoto):
+        return "photo"
+    if isinstance(media, MessageMediaDocument):
+        return "document"
+    return None
+
 class NewsParser:
     def __init__(self):
         self.client = TelegramClient(
-            "news_parser_session",
+            settings.parser_session,
             settings.api_id,
             settings.TELEGRAM_API_HASH
         )
-        self.source_channels = settings.SOURCE_CHANNEL_IDS
+        self.source_channels = settings.source_peers
         self.target_channel = settings.TARGET_CHANNEL_ID
-        self.last_check = datetime.utcnow() - timedelta(hours=1)
+        self.last_check = datetime.now(timezone.utc) - timedelta(hours=settings.BACKFILL_MAX_HOURS)
+        self.ingest = IngestionQueue(
+            self.handle_queued,
+            workers=settings.INGEST_WORKERS,
+            max_size=settings.INGEST_QUEUE_SIZE,
+            overflow=settings.INGEST_OVERFLOW,
+            fetch_messages=self.fetch_messages,
+            on_drop=self.handle_dropped,
+            on_missing=self.handle_missing
+        )
+        self.work_runner = WorkQueueRunner(
+            work_queue,
+            self.handle_work_item,
+            workers=settings.INGEST_WORKERS,
+            poll_interval=settings.WORK_QUEUE_POLL_INTERVAL,
+            retention=timedelta(hours=settings.WORK_QUEUE_RETENTION_HOURS)
+        )
+        self.albums = AlbumAggregator(self.handle_album, wait=settings.ALBUM_WAIT_MS / 1000)
+        self.checkpoints = ChannelCheckpoints(settings.BACKFILL_CHECKPOINT_INTERVAL)
+        self.backfill = BackfillEngine(
+            self.client,
+            self.enqueue,
+            self.checkpoints,
+            concurrency=settings.BACKFILL_CONCURRENCY,
+            initial_hours=settings.BACKFILL_INITIAL_HOURS,
+            max_hours=settings.BACKFILL_MAX_HOURS,
+            report_interval=settings.BACKFILL_REPORT_INTERVAL
+        )
+        self.registry = WorkerRegistry(
+            settings.worker_id,
+            heartbeat_interval=settings.WORKER_HEARTBEAT_INTERVAL,
+            timeout=settings.WORKER_TIMEOUT
+        )
+        # Каналы-источники по ключу (ID канала строкой) и каналы этого обработчика
+        self.channels: Dict[str, Union[int, str]] = {}
+        self.owned: Set[str] = set()
+        self._rebalance_task: Optional[asyncio.Task] = None
+        registry.add_collector(self.collect_metrics)
     
     async def start(self):
         """Запуск парсера"""
         try:
             await self.client.start()
+            await self.checkpoints.load()
+            self.checkpoints.start()
+            await publisher.start()
+            if settings.WORK_QUEUE_ENABLED:
+                await self.work_runner.start()
+            else:
+                await self.ingest.start()
+            for channel in self.source_channels:
+                self.channels[str(await self.client.get_peer_id(channel))] = channel
             logger.info("Парсер запущен")
             
-            # Регистрируем обработчик новых сообщений
+            # Регистрируем обработчик новых сообщений: сообщение только
+            # ставится в очередь, обработка идет в обработчиках очереди
             @self.client.on(events.NewMessage(chats=self.source_channels))
             async def handle_new_message(event):
-                await self.process_message(event.message)
+                await self.enqueue(event.message)
+            
+            if settings.BOT_MODE == MODE_WORKER:
+                # Каналы распределяются между обработчиками и догружаются
+                # по мере перехода к этому обработчику
+                await self.rebalance()
+                self._rebalance_task = asyncio.create_task(self._rebalance_loop())
+            else:
+                # Догружаем пропущенные сообщения параллельно с приемом новых
+                self.owned = set(self.channels)
+                asyncio.create_task(self.backfill.run(self.source_channels))
             
             # Запускаем клиент
             await self.client.run_until_disconnected()
@@ -39,33 +137,232 @@ class NewsParser:
             logger.error(f"Ошибка при запуске парсера: {e}")
             raise
     
-    async def process_message(self, message):
-        """Обработка нового сообщения"""
+    async def rebalance(self):
+        """
+        Отмечает работу обработчика и пересчитывает его каналы
+        
+        Каждый канал закрепляется за одним из работающих обработчиков
+        по rendezvous hashing, поэтому при появлении или остановке
+        обработчика переходят только каналы, которые ему достаются
+        или принадлежали. Канал, перешедший к другому обработчику,
+        освобождается, а принятый канал догружается с его контрольной точки.
+        """
+        await self.registry.heartbeat()
+        workers = await self.registry.live_workers()
+        if self.registry.worker_id not in workers:
+            workers.append(self.registry.worker_id)
+        
+        owned = {
+            key for key in self.channels
+            if rendezvous_owner(key, workers) == self.registry.worker_id
+        }
+        lost = self.owned - owned
+        acquired = owned - self.owned
+        if lost:
+            self.owned -= lost
+            await self.checkpoints.release(list(lost))
+        if acquired:
+            await self.checkpoints.acquire(list(acquired))
+            self.owned |= acquired
+            asyncio.create_task(self.backfill.run([self.channels[key] for key in acquired]))
+        if lost or acquired:
+            logger.info(
+                f"Обработчик {self.registry.worker_id}: {len(self.owned)} из {len(self.channels)} каналов "
+                f"(принято {len(acquired)}, передано {len(lost)}), обработчиков: {len(workers)}"
+            )
+    
+    async def _rebalance_loop(self):
+        while True:
+            await asyncio.sleep(self.registry.heartbeat_interval)
+            try:
+                await self.rebalance()
+            except Exception as e:
+                logger.error(f"Ошибка при распределении каналов: {e}")
+    
+    def collect_metrics(self):
+        """Передает глубины очередей парсера в метрики"""
+        QUEUE_DEPTH.set(self.ingest.depth, queue="ingest")
+        QUEUE_DEPTH.set(self.albums.pending, queue="albums")
+        QUEUE_DEPTH.set(self.work_runner.active, queue="work_queue_active")
+    
+    async def enqueue(self, message):
+        """Ставит сообщение в очередь обработки"""
+        # Сообщения каналов другого обработчика пропускаем
+        if str(message.chat_id) not in self.owned:
+            return
+        NEWS_ITEMS.inc(result="received")
+        tracer.begin(
+            message_key(message),
+            "news",
+            channel=str(message.chat_id),
+            message_id=message.id,
+            delivery_delay_ms=round((datetime.now(timezone.utc) - message.date).total_seconds() * 1000)
+        )
+        self.checkpoints.track(str(message.chat_id), message.id)
+        if settings.WORK_QUEUE_ENABLED:
+            # Альбом сохраняется целиком, когда собраны все его части
+            if self.albums.add(message):
+                return
+            # Сообщение считается принятым, как только оно сохранено в очереди;
+            # если сохранить не удалось, оно остается незавершенным, и контрольная
+            # точка не сдвигается за него до повторной догрузки истории
+            await self.persist_message(message)
+            self.mark_done(message)
+            return
+        await self.ingest.put(message)
+    
+    async def persist_message(self, message, album=None):
+        """Сохраняет сообщение (или альбом с подписью message) в устойчивой очереди обработки"""
+        text = message.text or ""
+        if not text or message.date < self.last_check:
+            return
+        
+        item_id = await work_queue.put(
+            source_channel_id=str(message.chat_id),
+            message_id=message.id,
+            text=text,
+            media_type="album" if album else media_type(message.media),
+            album_message_ids=json.dumps([part.id for part in album]) if album else None,
+            message_date=message.date.astimezone(timezone.utc).replace(tzinfo=None)
+        )
+        if item_id is not None:
+            self.work_runner.notify()
+    
+    def mark_done(self, message):
+        """Отмечает сообщение канала как обработанное"""
+        self.checkpoints.done(str(message.chat_id), message.id)
+    
+    def handle_dropped(self, message):
+        """Учитывает сообщение, вытесненное из переполненной очереди"""
+        NEWS_ITEMS.inc(result="dropped")
+        tracer.finish(message_key(message), outcome="dropped")
+        self.mark_done(message)
+    
+    def handle_missing(self, channel_id: str, message_id: int):
+        """Учитывает отложенное сообщение, которое больше недоступно в канале"""
+        NEWS_ITEMS.inc(result="dropped")
+        tracer.finish((channel_id, message_id), outcome="missing")
+        self.checkpoints.done(channel_id, message_id)
+    
+    def mark_done_after(self, future, messages):
+        """
+        Отмечает сообщения обработанными после отправки публикации
+        
+        Публикация только ставится в очередь, поэтому контрольная точка
+        продвигается, когда завершится future публикации; если публиковать
+        нечего (future is None) — сразу.
+        """
+        if future is None:
+            for message in messages:
+                self.mark_done(message)
+            return
+        future.add_done_callback(lambda _: [self.mark_done(message) for message in messages])
+    
+    async def handle_queued(self, message):
+        """Обрабатывает сообщение из очереди и продвигает контрольную точку канала"""
+        # Части альбома обрабатываются вместе, когда собраны все части;
+        # до этого они удерживают контрольную точку канала
+        if self.albums.add(message):
+            return
+        future = None
+        try:
+            with STAGE_SECONDS.time(stage="total"), tracer.resume(message_key(message), "news"):
+                future = await self.process_message(message)
+        finally:
+            self.mark_done_after(future, [message])
+    
+    async def handle_album(self, messages):
+        """Обрабатывает собранный альбом как одну новость"""
+        primary = album_primary(messages)
+        # Альбом обрабатывается в трассе части с подписью
+        for message in messages:
+            if message is not primary:
+                tracer.discard(message_key(message))
+        if settings.WORK_QUEUE_ENABLED:
+            # Части несохраненного альбома остаются незавершенными, как в enqueue
+            await self.persist_message(primary, album=messages)
+            for message in messages:
+                self.mark_done(message)
+            return
+        future = None
         try:
-            # Проверяем, что сообщение не старше последней проверки
-            if message.date < self.last_check:
+            with STAGE_SECONDS.time(stage="total"), tracer.resume(message_key(primary), "news", album_size=len(messages)):
+                future = await self.process_message(primary, album=messages)
+        finally:
+            self.mark_done_after(future, messages)
+    
+    async def process_message(self, message, album=None):
+        """
+        Обработка нового сообщения
+        
+        Для альбома message — часть с подписью, album — все части:
+        анализируется одна подпись, публикуется весь альбом.
+        
+        Returns:
+            future публикации или None, если новость не поставлена в очередь публикаций
+        """
+        media = [part.media for part in album if part.media] if album else message.media
+        store_task = None
+        try:
+            with tracer.span("filter"):
+                # Проверяем, что сообщение не старше последней проверки
+                is_new = message.date >= self.last_check
+                
+                # Получаем текст сообщения
+                text = message.text or ""
+            if not is_new or not text:
+                tracer.annotate(outcome="filtered")
                 return
             
-            # Получаем текст сообщения
-            text = message.text or message.caption or ""
-            if not text:
+            # Почти-дубликаты недавних новостей не анализируем и не публикуем,
+            # а связываем с исходной новостью
+            with STAGE_SECONDS.time(stage="dedup"), tracer.span("dedup"):
+                original_id = dedup_index.find_duplicate(text)
+            if original_id is not None:
+                tracer.annotate(outcome="duplicate")
+                await save_news(
+                    source_channel_id=str(message.chat_id),
+                    message_id=message.id,
+                    original_text=text,
+                    duplicate_of_id=original_id,
+                    timestamp=message.date
+                )
+                NEWS_ITEMS.inc(result="duplicate")
+                logger.info(f"Сообщение {message.id} является дубликатом новости {original_id}")
                 return
             
-            # Анализируем новость
-            analysis = await analyze_news_full(text)
+            # Длинные текстовые новости переводим потоком и публикуем по мере перевода
+            if (
+                settings.STREAMING_TRANSLATION
+                and not media
+                and len(text) >= settings.STREAMING_MIN_LENGTH
+            ):
+                await self.process_streaming(message, text)
+                return
+            
+            # Медиа сохраняем в хранилище параллельно с анализом
+            if settings.MEDIA_STORE_ENABLED and media:
+                store_task = asyncio.create_task(self.store_media(album or [message]))
+            
+            # Анализируем и переводим новость
+            with STAGE_SECONDS.time(stage="analyze"):
+                analysis, translated = await analyze_and_translate_news(text)
             if not analysis:
+                NEWS_ITEMS.inc(result="failed")
                 logger.error("Не удалось проанализировать новость")
                 return
             
-            # Переводим новость
-            translated = await translate_news(text)
             if not translated:
+                NEWS_ITEMS.inc(result="failed")
                 logger.error("Не удалось перевести новость")
                 return
             
+            with STAGE_SECONDS.time(stage="media"):
+                media_path = await store_task if store_task is not None else None
+            
             # Сохраняем новость в базу
-            async with async_session() as session:
-                news = News(
+            with STAGE_SECONDS.time(stage="db"):
+                news_id = await save_news(
                     source_channel_id=str(message.chat_id),
                     message_id=message.id,
                     original_text=text,
@@ -75,62 +372,294 @@ class NewsParser:
                     importance=analysis["importance"],
                     is_catalyst=analysis["is_catalyst"],
                     market_target=analysis["market_target"],
+                    media_path=media_path or ("album" if album else media_type(message.media)),
                     timestamp=message.date
                 )
-                
-                # Если есть медиа, сохраняем его
-                if message.media:
-                    if isinstance(message.media, MessageMediaPhoto):
-                        news.media_path = "photo"
-                    elif isinstance(message.media, MessageMediaDocument):
-                        news.media_path = "document"
-                
-                session.add(news)
-                await session.commit()
-                
-                # Публикуем в целевой канал
-                if translated:
-                    # Отправляем текст
-                    await self.client.send_message(
-                        self.target_channel,
-                        f"📰 {translated}\n\n"
-                        f"Тема: {analysis['topic']}\n"
-                        f"Важность: {analysis['importance']}/5\n"
-                        f"Катализатор: {'Да' if analysis['is_catalyst'] else 'Нет'}"
-                    )
-                    
-                    # Если есть медиа, отправляем его
-                    if message.media:
-                        await self.client.send_file(
-                            self.target_channel,
-                            message.media,
-                            caption=f"📰 {translated}"
-                        )
             
+            # Повторно обработанное сообщение уже было опубликовано
+            if news_id is None:
+                NEWS_ITEMS.inc(result="skipped")
+                logger.info(f"Сообщение {message.id} из {message.chat_id} уже обработано")
+                return
+            dedup_index.add(news_id, text)
+            
+            # Публикуем в целевой канал через очередь публикаций, не дожидаясь отправки
+            future = self.publish(translated, analysis, media)
+            NEWS_ITEMS.inc(result="published")
+            return future
+            
+        except ProviderUnavailableError as e:
+            # OpenRouter недоступен: откладываем сообщение до пробного запроса
+            delay = max(circuit_breaker.retry_in(), settings.OPENROUTER_BACKOFF_MAX)
+            logger.warning(f"Сообщение {message.id} отложено на {delay:.0f} с: {e}")
+            # Отложенное сообщение удерживает контрольную точку канала;
+            # части альбома возвращаются в очередь и собираются заново
+            NEWS_ITEMS.inc(result="deferred")
+            for part in album or [message]:
+                self.checkpoints.track(str(part.chat_id), part.id)
+                self.ingest.park(part, delay)
         except Exception as e:
+            NEWS_ITEMS.inc(result="failed")
             logger.error(f"Ошибка при обработке сообщения: {e}")
+        finally:
+            # Медиа новости, которая не будет сохранена, не нужно
+            if store_task is not None and not store_task.done():
+                store_task.cancel()
+    
+    @traced("media_store")
+    async def store_media(self, messages) -> Optional[str]:
+        """
+        Сохраняет медиа сообщений в хранилище, части альбома — параллельно
+        
+        Returns:
+            Путь к файлу, JSON-список путей для альбома или None
+        """
+        paths = await asyncio.gather(*(
+            media_handler.store_from_client(self.client, message.media)
+            for message in messages
+            if message.media
+        ))
+        paths = [path for path in paths if path]
+        if not paths:
+            return None
+        return paths[0] if len(paths) == 1 else json.dumps(paths)
+    
+    def publish(self, translated: str, analysis, media=None) -> asyncio.Future:
+        """
+        Ставит публикацию новости в целевом канале в очередь
+        
+        Медиа отправляется одним сообщением с текстом в подписи, альбом
+        (список медиа) — одной группой. Текст, не поместившийся в подпись,
+        отправляется следующими сообщениями.
+        """
+        text = format_news_post(translated, analysis)
+        steps = []
+        if media:
+            files = media if isinstance(media, list) else [media]
+            caption, rest = split_caption(text)
+            for index in range(0, len(files), TELEGRAM_ALBUM_LIMIT):
+                chunk = files[index:index + TELEGRAM_ALBUM_LIMIT]
+                steps.append(functools.partial(
+                    self.client.send_file,
+                    self.target_channel,
+                    chunk if len(chunk) > 1 else chunk[0],
+                    caption=caption if index == 0 else ""
+                ))
+        else:
+            rest = split_text(text, TELEGRAM_TEXT_LIMIT)
+        for part in rest:
+            steps.append(functools.partial(self.client.send_message, self.target_channel, part))
+        return publisher.submit(self.target_channel, steps, publish_priority(analysis))
     
-    async def fetch_history(self, hours: int = 1):
-        """Получение истории сообщений за последние N часов"""
+    async def handle_work_item(self, item):
+        """Обработка сообщения из устойчивой очереди с учетом длительности"""
         try:
-            time_ago = datetime.utcnow() - timedelta(hours=hours)
-            
-            for channel in self.source_channels:
-                async for message in self.client.iter_messages(
-                    channel,
-                    offset_date=time_ago,
-                    reverse=True
+            with STAGE_SECONDS.time(stage="total"), tracer.resume(
+                (item["source_channel_id"], item["message_id"]),
+                "news",
+                work_item_id=item["id"],
+                attempt=item["attempts"]
+            ):
+                await self.process_work_item(item)
+        except Exception:
+            NEWS_ITEMS.inc(result="failed")
+            raise
+    
+    async def process_work_item(self, item):
+        """
+        Обработка сообщения из устойчивой очереди
+        
+        Результат каждого шага сохраняется в очереди, поэтому после сбоя
+        обработка продолжается с последнего завершенного шага. Потоковая
+        публикация в этом режиме не используется: новость публикуется
+        только после сохранения.
+        """
+        owner = self.work_runner.owner
+        text = item["text"]
+        analysis = json.loads(item["analysis"]) if item["analysis"] else None
+        translated = item["translated_text"]
+        
+        try:
+            if item["state"] == WORK_RECEIVED:
+                # Почти-дубликаты недавних новостей связываем с исходной новостью
+                with STAGE_SECONDS.time(stage="dedup"), tracer.span("dedup"):
+                    original_id = dedup_index.find_duplicate(text)
+                if original_id is not None:
+                    tracer.annotate(outcome="duplicate")
+                    await save_news(
+                        source_channel_id=item["source_channel_id"],
+                        message_id=item["message_id"],
+                        original_text=text,
+                        duplicate_of_id=original_id,
+                        timestamp=item["message_date"]
+                    )
+                    await work_queue.complete(item["id"], owner, WORK_SKIPPED)
+                    NEWS_ITEMS.inc(result="duplicate")
+                    return
+                
+                with STAGE_SECONDS.time(stage="analyze"):
+                    analysis, translated = await analyze_and_translate_news(text)
+                if not analysis:
+                    raise ValueError("Не удалось проанализировать новость")
+                state = WORK_TRANSLATED if translated else WORK_ANALYZED
+                if not await work_queue.advance(
+                    item["id"], owner,
+                    state=state,
+                    analysis=json.dumps(analysis, ensure_ascii=False),
+                    translated_text=translated
                 ):
-                    await self.process_message(message)
+                    return
+                item["state"] = state
             
-            self.last_check = datetime.utcnow()
+            if item["state"] == WORK_ANALYZED:
+                with STAGE_SECONDS.time(stage="translate"):
+                    translated = await translate_news(text)
+                if not translated:
+                    raise ValueError("Не удалось перевести новость")
+                if not await work_queue.advance(item["id"], owner, state=WORK_TRANSLATED, translated_text=translated):
+                    return
+                item["state"] = WORK_TRANSLATED
             
-        except Exception as e:
-            logger.error(f"Ошибка при получении истории: {e}")
+            if item["state"] == WORK_TRANSLATED:
+                # Медиа получаем из исходных сообщений заново, части альбома — одним запросом
+                media = None
+                media_path = item["media_type"]
+                if item["media_type"]:
+                    message_ids = json.loads(item["album_message_ids"]) if item["album_message_ids"] else [item["message_id"]]
+                    messages = [
+                        message
+                        for message in await self.fetch_messages(item["source_channel_id"], message_ids)
+                        if message is not None and message.media
+                    ]
+                    media = [message.media for message in messages]
+                    if not item["album_message_ids"]:
+                        media = media[0] if media else None
+                    if settings.MEDIA_STORE_ENABLED and item["news_id"] is None:
+                        with STAGE_SECONDS.time(stage="media"):
+                            media_path = await self.store_media(messages) or media_path
+                
+                if item["news_id"] is None:
+                    with STAGE_SECONDS.time(stage="db"):
+                        news_id = await save_news(
+                            source_channel_id=item["source_channel_id"],
+                            message_id=item["message_id"],
+                            original_text=text,
+                            translated_text=translated,
+                            topic=analysis["topic"],
+                            confidence=analysis["confidence"],
+                            importance=analysis["importance"],
+                            is_catalyst=analysis["is_catalyst"],
+                            market_target=analysis["market_target"],
+                            media_path=media_path,
+                            timestamp=item["message_date"]
+                        )
+                    if news_id is None:
+                        logger.info(f"Сообщение {item['message_id']} из {item['source_channel_id']} уже обработано")
+                        await work_queue.complete(item["id"], owner, WORK_SKIPPED)
+                        NEWS_ITEMS.inc(result="skipped")
+                        return
+                    dedup_index.add(news_id, text)
+                    if not await work_queue.advance(item["id"], owner, news_id=news_id):
+                        return
+                
+                # Сообщение считается опубликованным только после отправки
+                await self.publish(translated, analysis, media)
+                await work_queue.complete(item["id"], owner)
+                NEWS_ITEMS.inc(result="published")
+            
+        except ProviderUnavailableError as e:
+            # OpenRouter недоступен: возвращаем сообщение в очередь, не расходуя попытку
+            NEWS_ITEMS.inc(result="deferred")
+            delay = max(circuit_breaker.retry_in(), settings.OPENROUTER_BACKOFF_MAX)
+            logger.warning(f"Сообщение {item['message_id']} отложено на {delay:.0f} с: {e}")
+            await work_queue.release(item["id"], owner, delay, error=str(e), count_attempt=False)
+    
+    async def process_streaming(self, message, text: str):
+        """
+        Обработка длинной новости с потоковым переводом
+        
+        Анализ выполняется параллельно с переводом, перевод публикуется
+        в целевом канале по мере генерации и дополняется результатами
+        анализа в конце.
+        """
+        # Публикация идет до сохранения новости, поэтому повторно
+        # обработанное сообщение проверяется заранее
+        if await news_exists(str(message.chat_id), message.id):
+            NEWS_ITEMS.inc(result="skipped")
+            logger.info(f"Сообщение {message.id} из {message.chat_id} уже обработано")
+            return
+        
+        analysis_task = asyncio.create_task(analyze_news_full(text))
+        progressive = ProgressivePublisher(
+            send=lambda content: publisher.call(
+                self.target_channel,
+                lambda: self.client.send_message(self.target_channel, content)
+            ),
+            edit=lambda sent, content: self.client.edit_message(self.target_channel, sent, content)
+        )
+        
+        try:
+            translated = await stream_translation(text, progressive)
+        except BaseException:
+            analysis_task.cancel()
+            raise
+        
+        if not translated:
+            analysis_task.cancel()
+            NEWS_ITEMS.inc(result="failed")
+            logger.error("Не удалось перевести новость")
+            return
+        
+        # Перевод уже в канале: без анализа публикация завершается как есть
+        try:
+            analysis = await analysis_task
+        except ProviderUnavailableError as e:
+            logger.warning(f"OpenRouter недоступен для анализа: {e}")
+            analysis = None
+        if not analysis:
+            logger.error("Не удалось проанализировать новость, публикуем без анализа")
+        
+        await progressive.finish(format_news_post(translated, analysis))
+        NEWS_ITEMS.inc(result="published")
+        
+        # Новость сохраняется и без анализа, чтобы не опубликовать ее повторно
+        analysis = analysis or {}
+        news_id = await save_news(
+            source_channel_id=str(message.chat_id),
+            message_id=message.id,
+            original_text=text,
+            translated_text=translated,
+            topic=analysis.get("topic"),
+            confidence=analysis.get("confidence"),
+            importance=analysis.get("importance"),
+            is_catalyst=analysis.get("is_catalyst", False),
+            market_target=analysis.get("market_target"),
+            timestamp=message.date
+        )
+        if news_id is not None:
+            dedup_index.add(news_id, text)
+    
+    async def fetch_messages(self, channel_id: str, message_ids):
+        """Повторно получает сообщения канала по их ID"""
+        return await self.client.get_messages(int(channel_id), ids=message_ids)
     
     async def stop(self):
         """Остановка парсера"""
         try:
+            if self._rebalance_task is not None:
+                self._rebalance_task.cancel()
+                await asyncio.gather(self._rebalance_task, return_exceptions=True)
+                self._rebalance_task = None
+            await self.albums.flush()
+            await self.ingest.stop()
+            await self.work_runner.stop()
+            # Даем отправить уже поставленные публикации до сохранения
+            # контрольных точек: они продвигаются после отправки
+            await publisher.join(timeout=settings.OPENROUTER_TIMEOUT)
+            await publisher.stop()
+            await self.checkpoints.stop()
+            if settings.BOT_MODE == MODE_WORKER:
+                await self.registry.leave()
             await self.client.disconnect()
             logger.info("Парсер остановлен")
         except Exception as e:
@@ -142,8 +671,8 @@ parser = NewsParser()
 async def start_parser():
     """Запуск парсера"""
     try:
-        # Получаем историю за последний час
-        await parser.fetch_history(hours=1)
+        # Восстанавливаем индекс дубликатов из базы
+        await dedup_index.load_from_db()
         
         # Запускаем парсер
         await parser.start()
@@ -0,0 +1,106 @@
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional
+from .config import settings
+from .tracing import traced
+from .formatting import TELEGRAM_TEXT_LIMIT, complete_sentences, split_text
+from .openrouter_client import (
+    translate_news,
+    translate_news_stream,
+    ProviderUnavailableError
+)
+
+logger = logging.getLogger(__name__)
+
+class ProgressivePublisher:
+    """
+    Постепенная публикация текста, который генерируется потоком
+
+    Первое сообщение отправляется, как только набрано first_chars символов
+    законченных предложений, затем оно редактируется не чаще раза
+    в min_interval секунд (ограничение Telegram на редактирование),
+    пока не будет вызван finish с итоговым текстом.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str], Awaitable[Any]],
+        edit: Callable[[Any, str], Awaitable[Any]],
+        min_interval: float = settings.STREAMING_EDIT_INTERVAL,
+        first_chars: int = settings.STREAMING_FIRST_CHARS,
+        limit: int = TELEGRAM_TEXT_LIMIT
+    ):
+        self.send = send
+        self.edit = edit
+        self.min_interval = min_interval
+        self.first_chars = first_chars
+        self.limit = limit
+        self.message: Optional[Any] = None
+        self._last_text = ""
+        self._last_edit = 0.0
+
+    @property
+    def published(self) -> bool:
+        """Отправлено ли уже первое сообщение"""
+        return self.message is not None
+
+    def _render(self, preview: str) -> str:
+        text = f"📰 {preview} ⏳"
+        if len(text) > self.limit:
+            text = f"{text[:self.limit - 2]}…"
+        return text
+
+    async def update(self, text: str):
+        """Обновляет опубликованный текст по мере генерации"""
+        preview = complete_sentences(text)
+        if not preview or preview == self._last_text:
+            return
+
+        now = time.monotonic()
+        try:
+            if self.message is None:
+                if len(preview) < self.first_chars:
+                    return
+                self.message = await self.send(self._render(preview))
+            elif now - self._last_edit >= self.min_interval and len(self._last_text) < self.limit:
+                await self.edit(self.message, self._render(preview))
+            else:
+                return
+            self._last_text = preview
+            self._last_edit = now
+        except Exception as e:
+            logger.error(f"Ошибка при промежуточной публикации: {e}")
+
+    async def finish(self, text: str):
+        """Публикует итоговый текст, при необходимости разбивая его на части"""
+        parts = split_text(text, self.limit)
+        if self.message is None:
+            self.message = await self.send(parts[0])
+        else:
+            await self.edit(self.message, parts[0])
+        for part in parts[1:]:
+            await self.send(part)
+
+@traced("translation")
+async def stream_translation(text: str, publisher: ProgressivePublisher) -> Optional[str]:
+    """
+    Переводит новость потоком, передавая промежуточный текст в publisher
+
+    Если поток прервался после первой публикации, перевод запрашивается
+    целиком обычным запросом, чтобы завершить уже опубликованное сообщение.
+
+    Raises:
+        ProviderUnavailableError: OpenRouter недоступен и ничего не опубликовано
+    """
+    chunks = []
+    try:
+        async for delta in translate_news_stream(text):
+            chunks.append(delta)
+            await publisher.update("".join(chunks))
+    except ProviderUnavailableError as e:
+        if not publisher.published:
+            raise
+        logger.warning(f"Потоковый перевод прерван, запрашиваем полный перевод: {e}")
+        return await translate_news(text)
+
+    return "".join(chunks).strip() or None
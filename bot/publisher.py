@@ -0,0 +1,276 @@
+import asyncio
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+from aiogram.exceptions import TelegramRetryAfter, TelegramBadRequest, TelegramForbiddenError
+from telethon.errors import FloodError, BadRequestError, ForbiddenError
+from .config import settings
+from .rate_limiter import TokenBucket, backoff_delay
+from .metrics import registry, STAGE_SECONDS, QUEUE_DEPTH
+from .tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты публикации: меньше — раньше
+PRIORITY_HIGH = 0  # катализаторы и новости важности 5
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2  # малозначимые новости
+
+def publish_priority(analysis: Optional[Dict[str, Any]]) -> int:
+    """Приоритет публикации новости по результатам анализа"""
+    if not analysis:
+        return PRIORITY_NORMAL
+    importance = analysis.get("importance") or 0
+    if analysis.get("is_catalyst") or importance >= 5:
+        return PRIORITY_HIGH
+    if importance and importance <= 2:
+        return PRIORITY_LOW
+    return PRIORITY_NORMAL
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Время ожидания из ответа Telegram о превышении лимита (FloodWait) или None"""
+    if isinstance(error, FloodError):
+        return float(getattr(error, "seconds", 0) or 0)
+    if isinstance(error, TelegramRetryAfter):
+        return float(error.retry_after)
+    return None
+
+def is_permanent(error: Exception) -> bool:
+    """Ошибка, которую повтор отправки не исправит"""
+    if isinstance(error, FloodError):
+        return False
+    return isinstance(error, (BadRequestError, ForbiddenError, TelegramBadRequest, TelegramForbiddenError))
+
+class Publisher:
+    """
+    Очередь исходящих публикаций в Telegram
+
+    Публикация ставится в очередь с приоритетом и выполняется отдельными
+    обработчиками, поэтому медленная отправка не задерживает анализ
+    входящих сообщений. Частота отправки ограничивается token bucket
+    для каждого чата (лимит Telegram на сообщения в один чат) и общим
+    token bucket (лимит на аккаунт). При FloodWait отправка в чат
+    приостанавливается на указанное Telegram время, при прочих временных
+    ошибках публикация повторяется с экспоненциальной задержкой.
+
+    Публикация состоит из шагов (например, текст и медиа), шаги одной
+    публикации выполняются по порядку, а повтор продолжается с шага,
+    на котором произошла ошибка.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        chat_messages_per_minute: float,
+        chat_burst: int,
+        global_rate: float,
+        max_retries: int
+    ):
+        self.workers = workers
+        self.chat_rate = chat_messages_per_minute / 60
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.global_bucket = TokenBucket(global_rate, max(1.0, global_rate))
+        self._chat_buckets: Dict[str, TokenBucket] = {}
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._sequence = itertools.count()
+        self._tasks: List[asyncio.Task] = []
+        self._retry_tasks = set()
+
+        # Статистика публикаций
+        self.submitted = 0
+        self.sent = 0
+        self.messages = 0
+        self.retries = 0
+        self.flood_waits = 0
+        self.flood_wait_seconds = 0.0
+        self.failed = 0
+        self.max_depth = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    @property
+    def depth(self) -> int:
+        """Количество публикаций, ожидающих отправки"""
+        return self._queue.qsize() + len(self._retry_tasks)
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        """Статистика публикаций: очередь, отправки, повторы и задержка"""
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "submitted": self.submitted,
+            "sent": self.sent,
+            "messages": self.messages,
+            "retries": self.retries,
+            "flood_waits": self.flood_waits,
+            "flood_wait_seconds": self.flood_wait_seconds,
+            "failed": self.failed,
+            "avg_latency": self.total_latency / self.sent if self.sent else 0.0,
+            "max_latency": self.max_latency
+        }
+
+    def collect_metrics(self):
+        """Передает глубину очереди публикаций в метрики"""
+        QUEUE_DEPTH.set(self.depth, queue="publish")
+
+    def _bucket(self, chat_id: str) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def submit(
+        self,
+        chat_id: Any,
+        steps: Sequence[Callable[[], Awaitable[Any]]],
+        priority: int = PRIORITY_NORMAL
+    ) -> asyncio.Future:
+        """
+        Ставит публикацию в очередь
+
+        Args:
+            chat_id: чат, в который отправляются сообщения
+            steps: отправки публикации, каждая — одно сообщение
+            priority: один из PRIORITY_*
+
+        Returns:
+            Future с результатом последнего шага; ожидать его не обязательно
+        """
+        job = {
+            "chat_id": str(chat_id),
+            "steps": list(steps),
+            "step": 0,
+            "result": None,
+            "priority": priority,
+            "attempts": 0,
+            "submitted_at": time.monotonic(),
+            "trace": tracer.current(),
+            "future": asyncio.get_running_loop().create_future()
+        }
+        # Ошибку публикации, результат которой не ожидают, считаем полученной
+        job["future"].add_done_callback(lambda future: future.cancelled() or future.exception())
+        # Трасса новости завершается после публикации
+        tracer.hold(job["future"])
+        self._put(job)
+        self.submitted += 1
+        return job["future"]
+
+    async def call(self, chat_id: Any, send: Callable[[], Awaitable[Any]], priority: int = PRIORITY_NORMAL) -> Any:
+        """Отправляет одно сообщение через очередь и возвращает результат"""
+        return await self.submit(chat_id, [send], priority)
+
+    def _put(self, job: Dict[str, Any]):
+        # Порядковый номер сохраняет очередность публикаций одного приоритета
+        self._queue.put_nowait((job["priority"], next(self._sequence), job))
+        self.max_depth = max(self.max_depth, self.depth)
+
+    def _retry_later(self, job: Dict[str, Any], delay: float):
+        async def requeue():
+            await asyncio.sleep(delay)
+            self._put(job)
+
+        task = asyncio.create_task(requeue())
+        self._retry_tasks.add(task)
+        task.add_done_callback(self._retry_tasks.discard)
+
+    async def start(self):
+        """Запускает обработчики очереди публикаций"""
+        if self._tasks:
+            return
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+        logger.info(f"Очередь публикаций запущена: {self.workers} обработчиков")
+
+    async def join(self, timeout: Optional[float] = None):
+        """Ожидает отправки поставленных в очередь публикаций"""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Не отправлено публикаций: {self.depth}")
+
+    async def stop(self):
+        """Останавливает обработчики очереди публикаций"""
+        tasks = [*self._tasks, *self._retry_tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._retry_tasks.clear()
+
+    async def _worker(self):
+        while True:
+            _, _, job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Dict[str, Any]):
+        bucket = self._bucket(job["chat_id"])
+        try:
+            while job["step"] < len(job["steps"]):
+                await bucket.acquire()
+                await self.global_bucket.acquire()
+                job["result"] = await job["steps"][job["step"]]()
+                job["step"] += 1
+                self.messages += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._on_error(job, bucket, e)
+            return
+
+        latency = time.monotonic() - job["submitted_at"]
+        self.sent += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        STAGE_SECONDS.observe(latency, stage="publish")
+        tracer.record("publish", latency, job["trace"], attempts=job["attempts"] + 1, messages=len(job["steps"]))
+        if not job["future"].done():
+            job["future"].set_result(job["result"])
+
+    def _on_error(self, job: Dict[str, Any], bucket: TokenBucket, error: Exception):
+        job["attempts"] += 1
+        wait = retry_after(error)
+        if wait is not None:
+            # Лимит Telegram не расходует попытки: ждем сколько сказано
+            self.flood_waits += 1
+            self.flood_wait_seconds += wait
+            bucket.pause(wait)
+            logger.warning(f"FloodWait при публикации в {job['chat_id']}: пауза {wait:.0f} с")
+            self._put(job)
+            return
+
+        if is_permanent(error) or job["attempts"] > self.max_retries:
+            self.failed += 1
+            logger.error(
+                f"Публикация в {job['chat_id']} не отправлена после {job['attempts']} попыток: {error}"
+            )
+            tracer.record(
+                "publish",
+                time.monotonic() - job["submitted_at"],
+                job["trace"],
+                error=str(error),
+                attempts=job["attempts"]
+            )
+            if not job["future"].done():
+                job["future"].set_exception(error)
+            return
+
+        self.retries += 1
+        delay = backoff_delay(job["attempts"], 1.0, 60.0)
+        logger.warning(f"Ошибка публикации в {job['chat_id']}, повтор через {delay:.1f} с: {error}")
+        self._retry_later(job, delay)
+
+# Создаем экземпляр очереди публикаций
+publisher = Publisher(
+    workers=settings.PUBLISH_WORKERS,
+    chat_messages_per_minute=settings.PUBLISH_CHAT_MESSAGES_PER_MINUTE,
+    chat_burst=settings.PUBLISH_CHAT_BURST,
+    global_rate=settings.PUBLISH_GLOBAL_RATE,
+    max_retries=settings.PUBLISH_MAX_RETRIES
+)
+registry.add_collector(publisher.collect_metrics)
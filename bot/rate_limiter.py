@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """
+    Асинхронный token bucket
+
+    Емкость пополняется со скоростью rate единиц в секунду до capacity.
+    Баланс может уйти в минус (например, при корректировке по фактическому
+    расходу), тогда следующие запросы ждут, пока он восстановится.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1):
+        """Ожидает, пока в корзине не окажется amount единиц, и списывает их"""
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((amount - self._tokens) / self.rate)
+
+    def consume(self, amount: float):
+        """Списывает amount единиц без ожидания (баланс может стать отрицательным)"""
+        self._refill()
+        self._tokens -= amount
+
+    def pause(self, seconds: float):
+        """Приостанавливает выдачу на seconds секунд"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+class AdaptiveRateLimiter:
+    """
+    Ограничитель частоты запросов к API с подстройкой под ответы сервера
+
+    Ограничивает число запросов в секунду и токенов в минуту. При 429
+    скорость запросов снижается вдвое и выдача приостанавливается на время
+    из Retry-After, после успешных ответов скорость постепенно
+    восстанавливается до настроенного максимума.
+    """
+
+    def __init__(self, requests_per_second: float, tokens_per_minute: float, min_rate: float = 0.1):
+        self.max_rate = requests_per_second
+        self.min_rate = min_rate
+        self.requests = TokenBucket(requests_per_second, max(1.0, requests_per_second))
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute)
+
+    async def acquire(self, estimated_tokens: int = 0):
+        """Ожидает разрешения на запрос"""
+        await self.requests.acquire()
+        if estimated_tokens:
+            await self.tokens.acquire(estimated_tokens)
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int):
+        """Корректирует баланс токенов по фактическому расходу"""
+        self.tokens.consume(actual_tokens - estimated_tokens)
+
+    def on_success(self, headers: Mapping[str, str]):
+        """Обрабатывает успешный ответ: плавно повышает скорость"""
+        if self.requests.rate < self.max_rate:
+            self.requests.rate = min(self.max_rate, self.requests.rate + self.max_rate * 0.05)
+        self._apply_headers(headers)
+
+    def on_rate_limited(self, headers: Mapping[str, str]) -> float:
+        """
+        Обрабатывает ответ 429: снижает скорость и приостанавливает запросы
+
+        Returns:
+            Время ожидания в секундах, рекомендованное сервером (или 0)
+        """
+        self.requests.rate = max(self.min_rate, self.requests.rate / 2)
+        retry_after = self._apply_headers(headers)
+        logger.warning(
+            f"Превышен лимит запросов OpenRouter, скорость снижена до "
+            f"{self.requests.rate:.2f} запросов/с"
+        )
+        return retry_after
+
+    def _apply_headers(self, headers: Mapping[str, str]) -> float:
+        """Учитывает заголовки Retry-After и X-RateLimit-*"""
+        wait = parse_retry_after(headers.get("Retry-After"))
+
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is not None and reset is not None:
+            try:
+                if int(float(remaining)) <= 0:
+                    # OpenRouter передает время сброса в миллисекундах от эпохи
+                    wait = max(wait, float(reset) / 1000 - time.time())
+            except ValueError:
+                pass
+
+        if wait > 0:
+            self.requests.pause(wait)
+        return max(wait, 0.0)
+
+def parse_retry_after(value: Optional[str]) -> float:
+    """Разбирает заголовок Retry-After (в секундах)"""
+    if not value:
+        return 0.0
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return 0.0
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Экспоненциальная задержка с полным джиттером"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель для внешнего сервиса
+
+    После failure_threshold подряд неудачных запросов выключатель
+    размыкается на reset_timeout секунд: запросы не отправляются.
+    Затем пропускается пробный запрос, и при успехе выключатель замыкается.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at = 0.0
+        self._state = self.CLOSED
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+
+    def retry_in(self) -> float:
+        """Через сколько секунд выключатель пропустит пробный запрос"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос"""
+        return self.state != self.OPEN
+
+    def record_success(self):
+        if self._state != self.CLOSED:
+            logger.info("Выключатель OpenRouter замкнут, запросы возобновлены")
+        self.failures = 0
+        self._state = self.CLOSED
+
+    def record_failure(self):
+        self.failures += 1
+        if self._state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                logger.error(
+                    f"Выключатель OpenRouter разомкнут на {self.reset_timeout:.0f} с "
+                    f"после {self.failures} ошибок подряд"
+                )
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
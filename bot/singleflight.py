@@ -0,0 +1,32 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+class SingleFlight:
+    """
+    Объединение одновременных вычислений с одинаковым ключом
+
+    Пока вычисление по ключу выполняется, повторные вызовы do с тем же
+    ключом не запускают его заново, а ожидают и получают тот же результат.
+    Отмена одного из ожидающих не прерывает вычисление для остальных.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.shared = 0
+
+    def in_flight(self, key: Hashable) -> bool:
+        """Выполняется ли сейчас вычисление по ключу"""
+        return key in self._calls
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Выполняет fn или присоединяется к уже идущему вычислению по ключу"""
+        self.calls += 1
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
@@ -0,0 +1,382 @@
+import asyncio
+import functools
+import json
+import logging
+import os
+import secrets
+import time
+import structlog
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Hashable, List, Optional
+from .config import settings
+
+logger = structlog.get_logger()
+
+# Текущий спан обработки (новость, которую обрабатывает задача)
+_current_span: ContextVar[Optional[Dict[str, Any]]] = ContextVar("current_span", default=None)
+
+# Максимум трасс, начатых при получении сообщения и ожидающих обработки
+MAX_PENDING_TRACES = 10000
+
+# Коды статуса спана OTLP
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+def current_trace_id() -> Optional[str]:
+    """ID трассы обрабатываемой новости или None"""
+    span = _current_span.get()
+    return span["trace_id"] if span else None
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def otlp_span(span: Dict[str, Any]) -> Dict[str, Any]:
+    """Спан в формате OTLP JSON"""
+    item = {
+        "traceId": span["trace_id"],
+        "spanId": span["span_id"],
+        "name": span["name"],
+        "kind": 1,
+        "startTimeUnixNano": str(int(span["start"] * 1e9)),
+        "endTimeUnixNano": str(int(span["end"] * 1e9)),
+        "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in span["attributes"].items()],
+        "status": {"code": span["status"]}
+    }
+    if span["parent_id"]:
+        item["parentSpanId"] = span["parent_id"]
+    if span.get("error"):
+        item["status"]["message"] = span["error"]
+    return item
+
+class OtlpFileExporter:
+    """
+    Выгрузка спанов в файл в формате OTLP JSON
+
+    Каждая строка файла — объект ExportTraceServiceRequest
+    ({"resourceSpans": [...]}) с накопленными за flush_interval спанами,
+    как в файловом экспортере OpenTelemetry Collector. Запись выполняется
+    в отдельном потоке и не блокирует цикл событий.
+    """
+
+    def __init__(self, path: str, flush_interval: float, service_name: str = "telegram-news-bot"):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.service_name = service_name
+        self._spans: List[Dict[str, Any]] = []
+        self._task: Optional[asyncio.Task] = None
+        self.exported = 0
+
+    def export(self, span: Dict[str, Any]):
+        self._spans.append(otlp_span(span))
+
+    def _request(self, spans: List[Dict[str, Any]]) -> str:
+        return json.dumps({
+            "resourceSpans": [{
+                "resource": {
+                    "attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]
+                },
+                "scopeSpans": [{"scope": {"name": "bot.tracing"}, "spans": spans}]
+            }]
+        }, ensure_ascii=False)
+
+    def _write(self, line: str):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(line + "\n")
+
+    async def flush(self):
+        """Записывает накопленные спаны"""
+        spans, self._spans = self._spans, []
+        if not spans:
+            return
+        await asyncio.to_thread(self._write, self._request(spans))
+        self.exported += len(spans)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("trace_export_failed", path=self.path, error=str(e))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+class Tracer:
+    """
+    Трассировка обработки новостей
+
+    Каждое входящее сообщение получает трассу с корневым спаном, этапы
+    обработки (фильтрация, поиск дубликатов, анализ, перевод, запись
+    в базу, обновление прогноза, публикация) записываются дочерними
+    спанами. Текущий спан хранится в contextvar, поэтому спаны этапов
+    привязываются к трассе без передачи ее через аргументы. Спаны
+    выводятся в журнал structlog с trace_id (если включен log_spans);
+    завершенная трасса выводится одной записью с длительностью этапов,
+    медленная — с уровнем warning.
+
+    Сообщение Telethon обрабатывается не той задачей, которая его
+    получила, поэтому трасса начинается в begin при получении
+    и продолжается в resume при обработке; время в очереди
+    записывается отдельным спаном.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        slow_threshold: float,
+        log_spans: bool = False,
+        exporter: Optional[OtlpFileExporter] = None
+    ):
+        self.enabled = enabled
+        self.slow_threshold = slow_threshold
+        self.log_spans = log_spans
+        self.exporter = exporter
+        self._pending: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+
+    def start(self):
+        """Запускает выгрузку спанов в файл, если она настроена"""
+        if self.exporter is not None:
+            self.exporter.start()
+
+    async def stop(self):
+        """Записывает оставшиеся спаны"""
+        if self.exporter is not None:
+            await self.exporter.stop()
+
+    def _new_span(self, name: str, parent: Optional[Dict[str, Any]], attributes: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "trace_id": parent["trace_id"] if parent else secrets.token_hex(16),
+            "span_id": secrets.token_hex(8),
+            "parent_id": parent["span_id"] if parent else None,
+            "root": (parent["root"] or parent) if parent else None,
+            "name": name,
+            "start": time.time(),
+            "started": time.perf_counter(),
+            "attributes": dict(attributes),
+            "stages": {},
+            "holds": 0,
+            "closed": False,
+            "status": STATUS_OK
+        }
+
+    def _end(self, span: Dict[str, Any], duration: Optional[float] = None):
+        if duration is None:
+            duration = time.perf_counter() - span["started"]
+        span["end"] = span["start"] + duration
+        duration_ms = round(duration * 1000, 1)
+        root = span["root"]
+        if root is not None:
+            root["stages"][span["name"]] = round(root["stages"].get(span["name"], 0.0) + duration_ms, 1)
+            if self.log_spans:
+                logger.debug(
+                    "span",
+                    trace_id=span["trace_id"],
+                    span=span["name"],
+                    duration_ms=duration_ms,
+                    **span["attributes"]
+                )
+        else:
+            log = logger.warning if duration >= self.slow_threshold else logger.info
+            log(
+                "slow_trace" if duration >= self.slow_threshold else "trace",
+                trace_id=span["trace_id"],
+                span=span["name"],
+                duration_ms=duration_ms,
+                stages=span["stages"],
+                **span["attributes"]
+            )
+        if self.exporter is not None:
+            self.exporter.export(span)
+
+    @contextmanager
+    def _activate(self, span: Dict[str, Any]):
+        token = _current_span.set(span)
+        try:
+            with structlog.contextvars.bound_contextvars(trace_id=span["trace_id"]):
+                yield span
+        except BaseException as e:
+            span["status"] = STATUS_ERROR
+            span["error"] = str(e) or type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            span["closed"] = True
+            if not span["holds"]:
+                self._end(span)
+
+    @contextmanager
+    def trace(self, name: str, **attributes):
+        """Начинает новую трассу с корневым спаном name"""
+        if not self.enabled:
+            yield None
+            return
+        with self._activate(self._new_span(name, None, attributes)) as span:
+            yield span
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Спан этапа обработки; вне трассы не записывается"""
+        parent = _current_span.get()
+        if not self.enabled or parent is None:
+            yield None
+            return
+        with self._activate(self._new_span(name, parent, attributes)) as span:
+            yield span
+
+    def record(
+        self,
+        name: str,
+        duration: float,
+        parent: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+        **attributes
+    ):
+        """
+        Записывает завершившийся только что спан длительностью duration секунд
+
+        Используется, когда этап выполняется в другой задаче и его начало
+        измерено без трассировки (например, публикация из очереди).
+        """
+        parent = parent or _current_span.get()
+        if not self.enabled or parent is None:
+            return
+        span = self._new_span(name, parent, attributes)
+        span["start"] -= duration
+        if error:
+            span["status"] = STATUS_ERROR
+            span["error"] = error
+        self._end(span, duration)
+
+    def hold(self, future: asyncio.Future):
+        """
+        Откладывает завершение текущей трассы до завершения future
+
+        Публикация выполняется очередью после окончания обработки
+        сообщения, а трасса должна покрывать путь новости до публикации.
+        """
+        span = _current_span.get()
+        if not self.enabled or span is None:
+            return
+        root = span["root"] or span
+        root["holds"] += 1
+
+        def release(_):
+            root["holds"] -= 1
+            if root["holds"] == 0 and root["closed"]:
+                self._end(root)
+
+        future.add_done_callback(release)
+
+    def annotate(self, **attributes):
+        """Добавляет атрибуты текущему спану"""
+        span = _current_span.get()
+        if span is not None:
+            span["attributes"].update(attributes)
+
+    def current(self) -> Optional[Dict[str, Any]]:
+        """Текущий спан для передачи в другую задачу"""
+        return _current_span.get()
+
+    def begin(self, key: Hashable, name: str, **attributes):
+        """Начинает трассу сообщения при получении, не делая ее текущей"""
+        if not self.enabled or key in self._pending:
+            return
+        self._pending[key] = self._new_span(name, None, attributes)
+        while len(self._pending) > MAX_PENDING_TRACES:
+            self._pending.popitem(last=False)
+
+    @contextmanager
+    def resume(self, key: Hashable, name: str, **attributes):
+        """
+        Продолжает трассу, начатую begin, на время обработки сообщения
+
+        Время от получения до начала обработки записывается спаном queue.
+        Если трасса не начиналась (или уже завершена), начинается новая.
+        """
+        if not self.enabled:
+            yield None
+            return
+        span = self._pending.pop(key, None)
+        if span is None:
+            with self.trace(name, **attributes) as span:
+                yield span
+            return
+        span["attributes"].update(attributes)
+        self.record("queue", time.perf_counter() - span["started"], parent=span)
+        with self._activate(span):
+            yield span
+
+    def finish(self, key: Hashable, **attributes):
+        """Завершает трассу сообщения, которое не будет обработано"""
+        span = self._pending.pop(key, None)
+        if span is not None:
+            span["attributes"].update(attributes)
+            self._end(span)
+
+    def discard(self, key: Hashable):
+        """Отбрасывает трассу сообщения, обработанного в составе другой трассы"""
+        self._pending.pop(key, None)
+
+class TraceIdFilter(logging.Filter):
+    """Добавляет trace_id обрабатываемой новости в записи logging"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = current_trace_id() or "-"
+        return True
+
+def traced(name: str):
+    """Декоратор: выполнение функции (обычной или асинхронной) записывается спаном name"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def message_key(message) -> tuple:
+    """Ключ трассы сообщения канала"""
+    chat_id = getattr(message, "chat_id", None)
+    if chat_id is None:
+        chat_id = message.chat.id
+    return str(chat_id), getattr(message, "id", None) or message.message_id
+
+async def trace_message(handler, event, data):
+    """Промежуточный обработчик aiogram: входящее сообщение обрабатывается в своей трассе"""
+    with tracer.trace("bot_message", chat_id=str(event.chat.id), message_id=event.message_id):
+        return await handler(event, data)
+
+# Создаем экземпляр трассировщика
+tracer = Tracer(
+    settings.TRACING_ENABLED,
+    settings.TRACE_SLOW_SECONDS,
+    settings.TRACE_LOG_SPANS,
+    OtlpFileExporter(settings.TRACE_EXPORT_PATH, settings.TRACE_EXPORT_INTERVAL) if settings.TRACE_EXPORT_PATH else None
+)
@@ -0,0 +1,317 @@
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from sqlalchemy import select, update, delete, func, or_
+from .database import async_session, upsert_insert
+from .models import WorkItem
+from .rate_limiter import backoff_delay
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Состояния сообщения в очереди
+WORK_RECEIVED = "received"  # сохранено, ожидает анализа
+WORK_ANALYZED = "analyzed"  # проанализировано, ожидает перевода
+WORK_TRANSLATED = "translated"  # переведено, ожидает сохранения и публикации
+WORK_PUBLISHED = "published"  # опубликовано
+WORK_SKIPPED = "skipped"  # не требует публикации (дубликат, уже обработано)
+WORK_FAILED = "failed"  # исчерпаны попытки обработки
+ACTIVE_STATES = (WORK_RECEIVED, WORK_ANALYZED, WORK_TRANSLATED)
+FINAL_STATES = (WORK_PUBLISHED, WORK_SKIPPED, WORK_FAILED)
+
+def default_owner() -> str:
+    """Идентификатор текущего процесса-обработчика"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class WorkQueue:
+    """
+    Устойчивая очередь обработки сообщений в базе данных
+
+    Сообщение сохраняется в таблицу work_items сразу после получения
+    и проходит состояния ACTIVE_STATES до одного из FINAL_STATES.
+    Обработчик берет сообщение в аренду на lease секунд; если процесс
+    упал, после истечения аренды сообщение выдается другому обработчику
+    и продолжает обработку с последнего сохраненного состояния
+    (доставка «хотя бы один раз»).
+
+    В PostgreSQL сообщения выдаются через SELECT ... FOR UPDATE SKIP LOCKED,
+    поэтому несколько процессов могут работать с одной очередью.
+    SQLite не поддерживает FOR UPDATE, но выполняет запись одной транзакцией
+    за раз, поэтому выдача остается атомарной.
+    """
+
+    def __init__(self, lease: float, max_attempts: int):
+        self.lease = timedelta(seconds=lease)
+        self.max_attempts = max_attempts
+
+    async def put(self, **values) -> Optional[int]:
+        """
+        Сохраняет сообщение в очереди
+
+        Returns:
+            ID записи или None, если сообщение уже в очереди
+        """
+        async with async_session() as session:
+            result = await session.execute(
+                upsert_insert(WorkItem)
+                .values(state=WORK_RECEIVED, attempts=0, available_at=datetime.utcnow(), **values)
+                .on_conflict_do_nothing(index_elements=["source_channel_id", "message_id"])
+                .returning(WorkItem.id)
+            )
+            item_id = result.scalar_one_or_none()
+            await session.commit()
+        return item_id
+
+    async def claim(self, owner: str, limit: int = 1) -> List[Dict[str, Any]]:
+        """Берет в аренду до limit доступных сообщений"""
+        now = datetime.utcnow()
+        candidates = (
+            select(WorkItem.id)
+            .where(
+                WorkItem.state.in_(ACTIVE_STATES),
+                WorkItem.available_at <= now,
+                WorkItem.attempts < self.max_attempts,
+                or_(WorkItem.lease_expires_at.is_(None), WorkItem.lease_expires_at < now)
+            )
+            .order_by(WorkItem.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        async with async_session() as session:
+            result = await session.execute(
+                update(WorkItem)
+                .where(WorkItem.id.in_(candidates.scalar_subquery()))
+                .values(
+                    lease_owner=owner,
+                    lease_expires_at=now + self.lease,
+                    attempts=WorkItem.attempts + 1,
+                    updated_at=now
+                )
+                .returning(*WorkItem.__table__.c)
+                .execution_options(synchronize_session=False)
+            )
+            items = [dict(row) for row in result.mappings()]
+            await session.commit()
+        return sorted(items, key=lambda item: item["id"])
+
+    async def _update(self, item_id: int, owner: str, **values) -> bool:
+        values["updated_at"] = datetime.utcnow()
+        async with async_session() as session:
+            result = await session.execute(
+                update(WorkItem)
+                .where(WorkItem.id == item_id, WorkItem.lease_owner == owner)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        if not result.rowcount:
+            logger.warning(f"Аренда сообщения {item_id} потеряна обработчиком {owner}")
+            return False
+        return True
+
+    async def advance(self, item_id: int, owner: str, **values) -> bool:
+        """
+        Сохраняет промежуточный результат обработки
+
+        Returns:
+            False, если аренда истекла и сообщение передано другому обработчику
+        """
+        return await self._update(item_id, owner, **values)
+
+    async def complete(self, item_id: int, owner: str, state: str = WORK_PUBLISHED) -> bool:
+        """Завершает обработку сообщения"""
+        return await self._update(
+            item_id, owner,
+            state=state,
+            lease_owner=None,
+            lease_expires_at=None
+        )
+
+    async def release(self, item_id: int, owner: str, delay: float, error: Optional[str] = None, count_attempt: bool = True) -> bool:
+        """Возвращает сообщение в очередь, оно станет доступно через delay секунд"""
+        values = {
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "available_at": datetime.utcnow() + timedelta(seconds=delay),
+            "last_error": error
+        }
+        if not count_attempt:
+            values["attempts"] = WorkItem.attempts - 1
+        return await self._update(item_id, owner, **values)
+
+    async def fail(self, item: Dict[str, Any], owner: str, error: str) -> bool:
+        """Возвращает сообщение в очередь с задержкой или помечает его неудачным"""
+        if item["attempts"] >= self.max_attempts:
+            logger.error(f"Сообщение {item['id']} не обработано за {item['attempts']} попыток: {error}")
+            return await self._update(
+                item["id"], owner,
+                state=WORK_FAILED,
+                lease_owner=None,
+                lease_expires_at=None,
+                last_error=error
+            )
+        delay = backoff_delay(item["attempts"], settings.OPENROUTER_BACKOFF_BASE, settings.OPENROUTER_BACKOFF_MAX)
+        return await self.release(item["id"], owner, delay, error=error)
+
+    async def renew(self, item_ids: List[int], owner: str):
+        """Продлевает аренду сообщений, которые еще обрабатываются"""
+        if not item_ids:
+            return
+        async with async_session() as session:
+            await session.execute(
+                update(WorkItem)
+                .where(WorkItem.id.in_(item_ids), WorkItem.lease_owner == owner)
+                .values(lease_expires_at=datetime.utcnow() + self.lease)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+
+    async def counts(self) -> Dict[str, int]:
+        """Количество сообщений в очереди по состояниям"""
+        async with async_session() as session:
+            rows = (await session.execute(
+                select(WorkItem.state, func.count(WorkItem.id)).group_by(WorkItem.state)
+            )).all()
+        return {state: count for state, count in rows}
+
+    async def purge(self, retention: timedelta):
+        """Удаляет завершенные сообщения старше retention и помечает зависшие"""
+        now = datetime.utcnow()
+        async with async_session() as session:
+            # Сообщения, на которых процесс падал max_attempts раз подряд
+            await session.execute(
+                update(WorkItem)
+                .where(
+                    WorkItem.state.in_(ACTIVE_STATES),
+                    WorkItem.attempts >= self.max_attempts,
+                    or_(WorkItem.lease_expires_at.is_(None), WorkItem.lease_expires_at < now)
+                )
+                .values(state=WORK_FAILED, lease_owner=None, lease_expires_at=None, updated_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            result = await session.execute(
+                delete(WorkItem).where(
+                    WorkItem.state.in_(FINAL_STATES),
+                    WorkItem.updated_at < now - retention
+                )
+            )
+            await session.commit()
+        if result.rowcount:
+            logger.info(f"Удалено {result.rowcount} завершенных сообщений очереди")
+
+class WorkQueueRunner:
+    """
+    Пул обработчиков устойчивой очереди
+
+    Каждый из workers обработчиков берет сообщения из очереди по одному
+    и передает их в handler. Пока сообщение обрабатывается, его аренда
+    продлевается. Если handler завершился исключением, сообщение
+    возвращается в очередь с экспоненциальной задержкой.
+    """
+
+    def __init__(
+        self,
+        queue: WorkQueue,
+        handler: Callable[[Dict[str, Any]], Awaitable[None]],
+        workers: int,
+        poll_interval: float,
+        retention: timedelta,
+        owner: Optional[str] = None
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.owner = owner or default_owner()
+        self._active = set()
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self.processed = 0
+        self.failed = 0
+
+    @property
+    def active(self) -> int:
+        """Количество сообщений, обрабатываемых в данный момент"""
+        return len(self._active)
+
+    def notify(self):
+        """Сообщает обработчикам, что в очереди появились сообщения"""
+        self._wakeup.set()
+
+    async def start(self):
+        """Запускает обработчики очереди"""
+        if self._tasks:
+            return
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+        self._tasks.append(asyncio.create_task(self._maintenance()))
+        logger.info(f"Устойчивая очередь запущена: {self.workers} обработчиков ({self.owner})")
+
+    async def stop(self):
+        """Останавливает обработчики, незавершенные сообщения вернутся в очередь по истечении аренды"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _wait(self):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _worker(self):
+        while True:
+            try:
+                items = await self.queue.claim(self.owner)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка при получении сообщений из очереди: {e}")
+                await asyncio.sleep(self.poll_interval)
+                continue
+            if not items:
+                await self._wait()
+                continue
+
+            item = items[0]
+            self._active.add(item["id"])
+            try:
+                await self.handler(item)
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Ошибка при обработке сообщения {item['id']} из очереди: {e}")
+                try:
+                    await self.queue.fail(item, self.owner, str(e))
+                except Exception as fail_error:
+                    logger.error(f"Ошибка при возврате сообщения {item['id']} в очередь: {fail_error}")
+            finally:
+                self._active.discard(item["id"])
+
+    async def _maintenance(self):
+        # Аренду продлеваем заметно раньше ее истечения
+        interval = self.queue.lease.total_seconds() / 3
+        last_purge = None
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.queue.renew(list(self._active), self.owner)
+                now = datetime.utcnow()
+                if last_purge is None or now - last_purge >= timedelta(hours=1):
+                    await self.queue.purge(self.retention)
+                    last_purge = now
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка при обслуживании очереди: {e}")
+
+# Создаем экземпляр устойчивой очереди
+work_queue = WorkQueue(settings.WORK_QUEUE_LEASE, settings.WORK_QUEUE_MAX_ATTEMPTS)
@@ -0,0 +1,27 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+# Настройки задаются до импорта bot: тесты работают с временной базой SQLite
+# и не трогают базу из .env
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix="newsbot-tests-")
+atexit.register(shutil.rmtree, WORKDIR, ignore_errors=True)
+
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(WORKDIR, 'tests.db')}"
+os.environ["METRICS_PORT"] = "0"
+os.environ["MEDIA_DIR"] = os.path.join(WORKDIR, "media")
+for name, value in {
+    "TELEGRAM_BOT_TOKEN": "tests",
+    "TELEGRAM_API_ID": "1",
+    "TELEGRAM_API_HASH": "tests",
+    "OPENROUTER_API_KEY": "tests",
+    "SOURCE_CHANNEL_IDS": "-1001,-1002"
+}.items():
+    os.environ.setdefault(name, value)
+
+sys.path.insert(0, REPO_ROOT)
+# Файл сессии Telethon создается в текущем каталоге
+os.chdir(WORKDIR)
@@ -0,0 +1,71 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+from sqlalchemy import select
+
+from bot.base import Base
+from bot.database import async_session, engine
+from bot.ingest import IngestionQueue, OVERFLOW_SPILL
+from bot.models import SpilledMessage
+
+class SpillDrainTest(unittest.IsolatedAsyncioTestCase):
+    """Возврат отложенных сообщений в очередь"""
+
+    async def asyncSetUp(self):
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.drop_all)
+            await connection.run_sync(Base.metadata.create_all)
+        self.handled = []
+        self.missing = []
+
+    async def asyncTearDown(self):
+        await engine.dispose()
+
+    async def spill(self, *rows):
+        async with async_session() as session:
+            for channel_id, message_id in rows:
+                session.add(SpilledMessage(source_channel_id=channel_id, message_id=message_id))
+            await session.commit()
+
+    async def remaining(self):
+        async with async_session() as session:
+            rows = (await session.execute(select(SpilledMessage))).scalars().all()
+        return [(row.source_channel_id, row.message_id) for row in rows]
+
+    async def handle(self, message):
+        self.handled.append((str(message.chat_id), message.id))
+
+    async def fetch_messages(self, channel_id, message_ids):
+        if channel_id == "-1002":
+            raise ConnectionError("channel unavailable")
+        # Сообщение 2 удалено из канала
+        return [
+            SimpleNamespace(chat_id=int(channel_id), id=message_id) if message_id != 2 else None
+            for message_id in message_ids
+        ]
+
+    async def test_drain_releases_missing_and_keeps_failed_channel(self):
+        await self.spill(("-1001", 1), ("-1001", 2), ("-1002", 3))
+        queue = IngestionQueue(
+            self.handle,
+            workers=1,
+            max_size=10,
+            overflow=OVERFLOW_SPILL,
+            fetch_messages=self.fetch_messages,
+            on_missing=lambda channel_id, message_id: self.missing.append((channel_id, message_id))
+        )
+
+        await queue.start()
+        try:
+            for _ in range(100):
+                if self.handled and self.missing:
+                    break
+                await asyncio.sleep(0.02)
+        finally:
+            await queue.stop()
+
+        self.assertEqual(self.handled, [("-1001", 1)])
+        self.assertEqual(self.missing, [("-1001", 2)])
+        # Строки канала с ошибкой остаются, строки обработанного канала удалены
+        self.assertEqual(await self.remaining(), [("-1002", 3)])
@@ -0,0 +1,144 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+
+from bot.base import Base
+from bot.database import engine
+from bot.work_queue import (
+    WorkQueue,
+    WORK_ANALYZED,
+    WORK_FAILED,
+    WORK_PUBLISHED,
+    WORK_RECEIVED
+)
+
+class WorkQueueTest(unittest.IsolatedAsyncioTestCase):
+    """Устойчивая очередь обработки на локальной SQLite"""
+
+    async def asyncSetUp(self):
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.drop_all)
+            await connection.run_sync(Base.metadata.create_all)
+        self.queue = WorkQueue(lease=60, max_attempts=3)
+
+    async def asyncTearDown(self):
+        # Соединения пула привязаны к циклу событий теста
+        await engine.dispose()
+
+    async def put(self, message_id: int = 1):
+        return await self.queue.put(
+            source_channel_id="-1001",
+            message_id=message_id,
+            text=f"news {message_id}",
+            message_date=datetime.utcnow()
+        )
+
+    async def test_put_ignores_repeated_message(self):
+        self.assertIsNotNone(await self.put())
+        self.assertIsNone(await self.put())
+        self.assertEqual(await self.queue.counts(), {WORK_RECEIVED: 1})
+
+    async def test_claim_leases_items_in_order(self):
+        first = await self.put(1)
+        second = await self.put(2)
+
+        items = await self.queue.claim("worker-a", limit=5)
+
+        self.assertEqual([item["id"] for item in items], [first, second])
+        for item in items:
+            self.assertEqual(item["lease_owner"], "worker-a")
+            self.assertEqual(item["attempts"], 1)
+        # Взятые в аренду сообщения другим обработчикам не выдаются
+        self.assertEqual(await self.queue.claim("worker-b"), [])
+
+    async def test_advance_requires_lease(self):
+        item_id = await self.put()
+        await self.queue.claim("worker-a")
+
+        self.assertTrue(await self.queue.advance(item_id, "worker-a", state=WORK_ANALYZED, analysis="{}"))
+        self.assertFalse(await self.queue.advance(item_id, "worker-b", state=WORK_RECEIVED))
+        self.assertEqual(await self.queue.counts(), {WORK_ANALYZED: 1})
+
+    async def test_complete_finishes_item(self):
+        item_id = await self.put()
+        await self.queue.claim("worker-a")
+
+        self.assertTrue(await self.queue.complete(item_id, "worker-a"))
+
+        self.assertEqual(await self.queue.counts(), {WORK_PUBLISHED: 1})
+        self.assertEqual(await self.queue.claim("worker-a"), [])
+
+    async def test_release_returns_item_after_delay(self):
+        delayed = await self.put(1)
+        released = await self.put(2)
+        await self.queue.claim("worker-a", limit=2)
+
+        self.assertTrue(await self.queue.release(delayed, "worker-a", delay=60, error="busy"))
+        self.assertTrue(await self.queue.release(released, "worker-a", delay=0))
+
+        items = await self.queue.claim("worker-b", limit=2)
+        self.assertEqual([item["id"] for item in items], [released])
+
+    async def test_release_without_counting_attempt(self):
+        item_id = await self.put()
+        await self.queue.claim("worker-a")
+
+        await self.queue.release(item_id, "worker-a", delay=0, count_attempt=False)
+
+        items = await self.queue.claim("worker-a")
+        self.assertEqual(items[0]["attempts"], 1)
+
+    async def test_fail_backs_off(self):
+        await self.put()
+        item = (await self.queue.claim("worker-a"))[0]
+
+        self.assertTrue(await self.queue.fail(item, "worker-a", "timeout"))
+
+        # Повтор откладывается, сообщение остается в очереди
+        self.assertEqual(await self.queue.claim("worker-a"), [])
+        self.assertEqual(await self.queue.counts(), {WORK_RECEIVED: 1})
+
+    async def test_fail_gives_up_after_max_attempts(self):
+        queue = WorkQueue(lease=60, max_attempts=1)
+        await self.put()
+        item = (await queue.claim("worker-a"))[0]
+
+        self.assertTrue(await queue.fail(item, "worker-a", "timeout"))
+
+        self.assertEqual(await queue.counts(), {WORK_FAILED: 1})
+
+    async def test_expired_lease_is_reclaimed(self):
+        queue = WorkQueue(lease=0.05, max_attempts=3)
+        item_id = await self.put()
+        await queue.claim("worker-a")
+
+        await asyncio.sleep(0.1)
+        items = await queue.claim("worker-b")
+
+        self.assertEqual([item["id"] for item in items], [item_id])
+        self.assertEqual(items[0]["lease_owner"], "worker-b")
+        self.assertEqual(items[0]["attempts"], 2)
+        # Прежний обработчик больше не может менять сообщение
+        self.assertFalse(await queue.advance(item_id, "worker-a", state=WORK_ANALYZED))
+        self.assertTrue(await queue.complete(item_id, "worker-b"))
+
+    async def test_renew_extends_lease(self):
+        queue = WorkQueue(lease=0.2, max_attempts=3)
+        item_id = await self.put()
+        await queue.claim("worker-a")
+
+        await asyncio.sleep(0.1)
+        await queue.renew([item_id], "worker-a")
+        await asyncio.sleep(0.15)
+
+        self.assertEqual(await queue.claim("worker-b"), [])
+
+    async def test_purge_fails_exhausted_items(self):
+        queue = WorkQueue(lease=0.05, max_attempts=1)
+        await self.put()
+        await queue.claim("worker-a")
+
+        await asyncio.sleep(0.1)
+        await queue.purge(timedelta(days=1))
+
+        self.assertEqual(await queue.counts(), {WORK_FAILED: 1})